@@ -0,0 +1,18 @@
+"""Benchmarks for the scraping hot paths.
+
+Run them from the repository root, e.g. `python -m benchmarks.bench_timezones`.
+"""
+import time
+
+
+def best_of(func, repeat=5, number=1):
+    """Best wall clock time in seconds of `number` calls of func"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
@@ -0,0 +1,71 @@
+"""Time per page of parsing recorded playlist pages, with and without the
+scrapers' SoupStrainers, for every installed parser backend.
+
+The fixtures hold the (url, body) pages fetch() returned for one date; the
+scrapers must extract the same tracks whether or not only the elements they
+read are parsed.
+"""
+from datetime import date
+import argparse
+import json
+import os
+
+from bs4.builder import builder_registry
+
+from benchmarks import best_of
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+PAGES = {
+    'SWR1Scraper': 'swr1_playlist.json',
+    'SWR3Scraper': 'swr3_playlist.json',
+    'FluxFMScraper': 'fluxfm_playlist.json',
+    'Antenne1Scraper': 'antenne1_playlist.json',
+    'SunshineLiveScraper': 'sunshinelive_playlist.json',
+}
+PARSERS = ('html.parser', 'lxml')
+
+
+def load_pages(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return [tuple(page) for page in json.load(f)]
+
+
+def parse(scraper_cls, pages, parser, strained):
+    scraper = scraper_cls(date(2020, 1, 15))
+    scraper.parser = parser
+    if not strained:
+        scraper.parse_only = None
+    scraper.parse(pages)
+    return scraper.tracks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from scraper import scrapers
+
+    backends = [name for name in PARSERS if builder_registry.lookup(name) is not None]
+    for class_name, fixture in PAGES.items():
+        scraper_cls = getattr(scrapers, class_name)
+        pages = load_pages(fixture)
+        kb = sum(len(body) for _, body in pages) / len(pages) / 1024
+        print(f'{class_name} ({len(pages)} pages, {kb:.0f}KB/page):')
+        for backend in backends:
+            full = parse(scraper_cls, pages, backend, strained=False)
+            strained = parse(scraper_cls, pages, backend, strained=True)
+            assert full == strained, f'{class_name} tracks differ when strained'
+            times = {
+                label: best_of(lambda: parse(scraper_cls, pages, backend, label == 'strained'),
+                               repeat=args.repeat) / len(pages)
+                for label in ('full', 'strained')
+            }
+            print(f'  {backend:>11}: full {times["full"] * 1000:6.2f}ms/page, '
+                  f'strained {times["strained"] * 1000:6.2f}ms/page '
+                  f'({times["full"] / times["strained"]:.1f}x, {len(full)} tracks)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Latency saved per station-day by reusing keep-alive connections.
+
+Fetches a day of hourly pages (as the SWR1/SWR3/Antenne1 scrapers do) from
+a local HTTP/1.1 stand-in, once with a new connection per request like the
+old module level requests.get, and once through scraper.lib's per-host
+session pool. The stand-in can sleep on every new connection to stand in
+for the TCP and TLS handshakes of a real station website.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import threading
+import time
+
+import requests
+
+from benchmarks import best_of
+from scraper import lib
+
+PAGE = b'<html><body>' + b'<div class="track">Artist - Title</div>' * 200 + b'</body></html>'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes, don't let delayed ACKs stall them
+    disable_nagle_algorithm = True
+    handshake = 0.0
+    connections = 0
+
+    def setup(self):
+        type(self).connections += 1
+        time.sleep(self.handshake)
+        super().setup()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+def fetch_day(get, base_url, pages):
+    for hour in range(pages):
+        get(f'{base_url}/playlist?hour={hour}').text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=24, help='pages per station-day')
+    parser.add_argument('--handshake-ms', type=float, default=[0.0, 50.0], nargs='+',
+                        help='simulated cost of opening a connection')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    try:
+        for handshake_ms in args.handshake_ms:
+            Handler.handshake = handshake_ms / 1000
+            repeat = 5 if handshake_ms else 20
+
+            Handler.connections = 0
+            before = best_of(lambda: fetch_day(requests.get, base_url, args.pages), repeat)
+            before_connections = Handler.connections // repeat
+
+            def pooled():
+                # A fresh pool per station-day, nothing carried over between runs
+                lib.SESSIONS = lib.SessionPool()
+                fetch_day(lambda url: lib.http_get(url, retries=0), base_url, args.pages)
+                lib.SESSIONS.close()
+
+            Handler.connections = 0
+            after = best_of(pooled, repeat)
+            after_connections = Handler.connections // repeat
+
+            print(f'handshake {handshake_ms:5.1f}ms: '
+                  f'per request {before * 1000:7.1f}ms ({before_connections} connections), '
+                  f'pooled {after * 1000:7.1f}ms ({after_connections} connections), '
+                  f'saved {(before - after) * 1000:7.1f}ms per station-day')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Import time of the management commands and of each scraper module.
+
+Every measurement is made in a fresh interpreter after django.setup(): the
+time to load a management command, or to look up a scraper class (which
+imports its module), and which of the heavier libraries that pulled in.
+"all scrapers" imports every scraper module, which is what importing the
+scrapers used to cost whatever the station.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+HEAVY = ('bs4', 'soupsieve', 'dateutil', 'requests', 'simplejson', 'beets', 'elasticsearch')
+
+
+def measure(kind, name):
+    """Load one command or scraper in this process and print the figures as JSON"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'radiostats.settings.dev')
+    import django
+    django.setup()
+    before = set(sys.modules)
+    start = time.perf_counter()
+    try:
+        if kind == 'command':
+            from django.core.management import load_command_class
+            load_command_class('scraper', name)
+        else:
+            from scraper import scrapers
+            for class_name in (scrapers.SCRAPERS if name == 'all' else [name]):
+                scrapers.get_scraper(class_name)
+    except ImportError as e:
+        print(json.dumps({'error': str(e)}))
+        return
+    elapsed = time.perf_counter() - start
+    loaded = [module for module in HEAVY if module in sys.modules and module not in before]
+    print(json.dumps({'ms': elapsed * 1000, 'loaded': loaded}))
+
+
+def run(kind, name, repeat):
+    best = None
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_import_time', '--measure', kind, name],
+            check=True, capture_output=True, text=True).stdout
+        figures = json.loads(output.splitlines()[-1])
+        if 'error' in figures:
+            return figures
+        if best is None or figures['ms'] < best['ms']:
+            best = figures
+    return best
+
+
+def report(label, figures):
+    if 'error' in figures:
+        print(f'  {label:<36} failed: {figures["error"]}')
+    else:
+        print(f'  {label:<36} {figures["ms"]:6.1f}ms  {", ".join(figures["loaded"]) or "-"}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per figure')
+    parser.add_argument('--measure', nargs=2, metavar=('KIND', 'NAME'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    from django.core.management import find_commands
+    from scraper import scrapers
+
+    commands_dir = os.path.join(os.path.dirname(scrapers.__file__), '..', 'management')
+    print('Management commands:')
+    for name in sorted(find_commands(commands_dir)):
+        report(name, run('command', name, args.repeat))
+
+    print('Scrapers:')
+    modules = {}
+    for class_name, module in sorted(scrapers.SCRAPERS.items()):
+        modules.setdefault(module, class_name)
+    for module, class_name in sorted(modules.items()):
+        report(f'{module} ({class_name})', run('scraper', class_name, args.repeat))
+    report('all scrapers', run('scraper', 'all', args.repeat))
+
+
+if __name__ == '__main__':
+    main()
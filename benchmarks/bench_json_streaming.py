@@ -0,0 +1,128 @@
+"""Peak memory and time of parsing large KEXP and Last.fm responses.
+
+Builds responses of --elements plays from the recorded fixtures and parses
+them with json.loads() (as the scrapers used to) and with the scrapers'
+incremental parse(). Each variant runs in a fresh interpreter to measure
+its peak RSS; tracemalloc's peak is reported too.
+"""
+from datetime import date, datetime
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+
+from benchmarks import best_of
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def kexp_body(elements):
+    with open(os.path.join(FIXTURES, 'kexp_plays.json')) as f:
+        data = json.load(f)
+    results = data['results']
+    data['results'] = [results[i % len(results)] for i in range(elements)]
+    return json.dumps(data)
+
+
+def lastfm_body(elements):
+    with open(os.path.join(FIXTURES, 'lastfm_recenttracks.json')) as f:
+        data = json.load(f)
+    tracks = data['recenttracks']['track']
+    data['recenttracks']['track'] = [tracks[i % len(tracks)] for i in range(elements)]
+    return json.dumps(data)
+
+
+def kexp_loads(body):
+    """KEXPScraper.parse before streaming"""
+    tracks = []
+    for result in json.loads(body).get('results', []):
+        if (result['playtype']['name'] == 'Media play' and
+                result['track'] and result['artist']):
+            tracks.append((result['artist']['name'], result['track']['name'],
+                           datetime.fromtimestamp(result['epoch_airdate']/1000)))
+    return tracks
+
+
+def lastfm_loads(body):
+    """GenericLastFMScraper.parse before streaming"""
+    tracks = []
+    page_tracks = json.loads(body)['recenttracks']['track']
+    if isinstance(page_tracks, dict):
+        page_tracks = [page_tracks]
+    for track in page_tracks:
+        if 'date' in track:
+            tracks.append((track['artist']['#text'], track['name'],
+                           datetime.utcfromtimestamp(int(track['date']['uts']))))
+    return tracks
+
+
+def kexp_stream(body):
+    from scraper.scrapers import KEXPScraper
+    scraper = KEXPScraper(date(2020, 1, 1))
+    scraper.parse([(scraper.url, body)])
+    return scraper.tracks
+
+
+def lastfm_stream(body):
+    from scraper.scrapers import GenericLastFMScraper
+    scraper = GenericLastFMScraper(date(2020, 1, 1))
+    scraper.parse([('http://ws.audioscrobbler.com/', body)])
+    return scraper.tracks
+
+
+VARIANTS = {
+    'kexp': (kexp_body, kexp_loads, kexp_stream),
+    'lastfm': (lastfm_body, lastfm_loads, lastfm_stream),
+}
+
+
+def measure(source, variant, elements):
+    """Run one variant in this process and print its figures as JSON"""
+    make_body, loads, stream = VARIANTS[source]
+    parse = loads if variant == 'loads' else stream
+    body = make_body(elements)
+    # Import everything up front, so only parsing counts
+    parse(make_body(1))
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    tracks = parse(body)
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    del tracks
+    seconds = best_of(lambda: parse(body), repeat=3)
+    print(json.dumps({'rss_kb': rss_peak - baseline, 'traced': traced_peak,
+                      'seconds': seconds, 'body': len(body)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--elements', type=int, default=20000, help='plays per response')
+    parser.add_argument('--measure', nargs=2, metavar=('SOURCE', 'VARIANT'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(*args.measure, args.elements)
+        return
+
+    for source in VARIANTS:
+        results = {}
+        for variant in ('loads', 'stream'):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_json_streaming',
+                 '--elements', str(args.elements), '--measure', source, variant],
+                check=True, capture_output=True, text=True).stdout
+            results[variant] = json.loads(output.splitlines()[-1])
+        body_mb = results['loads']['body'] / 1024 ** 2
+        print(f'{source} ({args.elements} plays, {body_mb:.1f}MB):')
+        for variant, figures in results.items():
+            print(f'  {variant:>6}: {figures["seconds"] * 1000:7.1f}ms, '
+                  f'peak RSS +{figures["rss_kb"] / 1024:6.1f}MB, '
+                  f'traced peak {figures["traced"] / 1024 ** 2:6.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Parsing throughput and memory of every scraper class on recorded days.
+
+Each scraper class is handed the pages of a representative day straight to
+parse(), nothing is fetched. Subclasses sharing a website (the FluxFM
+streams, the Last.fm accounts) use their base class's recording. The Last.fm
+and KEXP days are made of the recorded plays, spread over the day.
+
+Reports pages/s, tracks/s, the peak of Python allocations while parsing a
+day (tracemalloc) and the memory blocks still allocated afterwards, i.e.
+held by the scraper. --save stores the figures as a baseline, --compare
+prints the change against one and exits with status 1 if any scraper got
+slower or bigger by more than --threshold.
+"""
+from datetime import date
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tracemalloc
+
+from benchmarks import best_of
+from benchmarks.bench_html_parsing import PAGES, load_pages
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Figures where a higher value is worse
+LOWER_IS_BETTER = {'peak_kb', 'blocks'}
+
+
+def lastfm_day(plays=400, per_page=200):
+    """Pages of a day of plays in the shape of user.getRecentTracks"""
+    with open(os.path.join(FIXTURES, 'lastfm_recenttracks.json')) as f:
+        recorded = json.load(f)['recenttracks']['track']
+    start = 1577836800  # 2020-01-01 00:00 UTC
+    tracks = []
+    for i in range(plays):
+        track = dict(recorded[i % len(recorded)])
+        track['date'] = {'uts': str(start + 86399 - i * 86400 // plays)}
+        tracks.append(track)
+    total_pages = (plays + per_page - 1) // per_page
+    pages = []
+    for page in range(total_pages):
+        body = {'recenttracks': {
+            'track': tracks[page * per_page:(page + 1) * per_page],
+            '@attr': {'user': 'bbcradio1', 'page': str(page + 1), 'perPage': str(per_page),
+                      'totalPages': str(total_pages), 'total': str(plays)}}}
+        pages.append((f'http://ws.audioscrobbler.com/2.0/?page={page + 1}', json.dumps(body)))
+    return pages
+
+
+def kexp_day(plays=300):
+    with open(os.path.join(FIXTURES, 'kexp_plays.json')) as f:
+        data = json.load(f)
+    recorded = data['results']
+    start = 1577836800000
+    results = []
+    for i in range(plays):
+        result = dict(recorded[i % len(recorded)])
+        result['epoch_airdate'] = start + 86399000 - i * 86400000 // plays
+        results.append(result)
+    data['results'] = results
+    return [('https://legacy-api.kexp.org/play/', json.dumps(data))]
+
+
+def recorded_days():
+    """Scraper class name to the (date, pages) of its recorded day"""
+    days = {name: (date(2020, 1, 15), load_pages(fixture)) for name, fixture in PAGES.items()}
+    days['GenericLastFMScraper'] = (date(2020, 1, 1), lastfm_day())
+    days['KEXPScraper'] = (date(2020, 1, 1), kexp_day())
+    return days
+
+
+def scraper_classes():
+    """Every scraper class a station can use"""
+    from scraper import scrapers
+    return [scrapers.get_scraper(name) for name in sorted(scrapers.SCRAPERS)]
+
+
+def measure(scraper_cls, day, pages, repeat):
+    def parse():
+        scraper = scraper_cls(day)
+        scraper.parse(pages)
+        return scraper
+
+    scraper = parse()
+    tracks = len(scraper.tracks)
+    del scraper
+    seconds = best_of(parse, repeat=repeat)
+
+    gc.collect()
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    scraper = parse()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    gc.collect()
+    blocks = sys.getallocatedblocks() - blocks
+    del scraper
+    return {
+        'pages_per_s': len(pages) / seconds,
+        'tracks_per_s': tracks / seconds,
+        'peak_kb': peak / 1024,
+        'blocks': blocks,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print the change of every figure, returning whether any regressed"""
+    regressed = False
+    for name, figures in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f'{name}: not in the baseline')
+            continue
+        changes = []
+        for figure, value in figures.items():
+            if not before.get(figure):
+                continue
+            change = value / before[figure] - 1
+            worse = change > threshold if figure in LOWER_IS_BETTER else change < -threshold
+            regressed |= worse
+            changes.append(f'{figure} {change:+.0%}{" !" if worse else ""}')
+        print(f'{name}: {", ".join(changes)}')
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help='comma separated scraper class names')
+    parser.add_argument('--save', metavar='PATH', help='save the figures as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare to a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change of a figure counted as a regression')
+    args = parser.parse_args()
+
+    days = recorded_days()
+    only = set(args.only.split(',')) if args.only else None
+    results = {}
+    for scraper_cls in scraper_classes():
+        name = scraper_cls.__name__
+        if only and name not in only:
+            continue
+        recorded = next((days[base.__name__] for base in scraper_cls.__mro__
+                         if base.__name__ in days), None)
+        if recorded is None:
+            print(f'{name}: no recorded day')
+            continue
+        figures = measure(scraper_cls, *recorded, repeat=args.repeat)
+        results[name] = figures
+        print(f'{name:>24}: {figures["pages_per_s"]:8.1f} pages/s {figures["tracks_per_s"]:9.0f} '
+              f'tracks/s, peak {figures["peak_kb"]:7.0f}KB, {figures["blocks"]:6d} blocks held')
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'scrapers': results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f'\nCompared to {args.compare} (Python {baseline["python"]}):')
+        if compare(results, baseline['scrapers'], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
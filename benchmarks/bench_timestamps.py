@@ -0,0 +1,68 @@
+"""Timestamps parsed per second, from the times on recorded playlist pages.
+
+For each HTML scraper, takes the time texts its ExtractionSpec reads from
+the fixtures and parses them the way the scraper used to (dateutil or
+strptime) and with its spec's parse_time().
+"""
+from datetime import date, datetime
+import argparse
+import json
+
+from dateutil import parser as dateutil_parser
+
+from benchmarks import best_of
+from benchmarks.bench_html_parsing import PAGES, load_pages
+
+DAY = date(2020, 1, 15)
+
+
+def strptime_clock(text, day):
+    return datetime.combine(day, datetime.strptime(text, '%H:%M').time())
+
+
+BEFORE = {
+    'SWR1Scraper': lambda text, day: dateutil_parser.parse(text),
+    'SWR3Scraper': lambda text, day: datetime.strptime(text, '%Y-%m-%dT%H:%M'),
+    'FluxFMScraper': strptime_clock,
+    'Antenne1Scraper': strptime_clock,
+    'SunshineLiveScraper': strptime_clock,
+}
+
+
+def time_texts(scraper_cls, pages):
+    scraper = scraper_cls(DAY)
+    spec = scraper.extraction
+    texts = []
+    for _, body in pages:
+        if scraper_cls.__name__ == 'Antenne1Scraper':
+            # Its pages are HTML in a JSON string
+            body = json.loads(body)
+        soup = scraper.make_soup(body)
+        texts.extend(spec.time.extract(row) for row in spec.select_rows(soup, DAY))
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--timestamps', type=int, default=20000,
+                        help='timestamps parsed per scraper and run')
+    args = parser.parse_args()
+
+    from scraper import scrapers
+
+    for class_name, fixture in PAGES.items():
+        scraper_cls = getattr(scrapers, class_name)
+        texts = time_texts(scraper_cls, load_pages(fixture))
+        texts = [texts[i % len(texts)] for i in range(args.timestamps)]
+        before, after = BEFORE[class_name], scraper_cls.extraction.parse_time
+        assert [before(t, DAY) for t in texts[:100]] == [after(t, DAY) for t in texts[:100]]
+        rates = {}
+        for label, parse in (('before', before), ('after', after)):
+            seconds = best_of(lambda: [parse(text, DAY) for text in texts], repeat=3)
+            rates[label] = len(texts) / seconds
+        print(f'{class_name} (e.g. {texts[0]!r}): before {rates["before"]:10,.0f}/s, '
+              f'after {rates["after"]:10,.0f}/s ({rates["after"] / rates["before"]:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Per-track cost of converting a day of scraped times to (local, UTC).
+
+Compares the conversion the runner used to do for every track against
+StationTimezone.convert for a whole day's track list.
+"""
+from datetime import datetime, timedelta
+import argparse
+
+import pytz
+
+from benchmarks import best_of
+from scraper.lib import StationTimezone
+
+
+def per_track(datetimes, timezone, utc_datetimes):
+    """The pre-StationTimezone conversion, one track at a time"""
+    retval = []
+    for dt in datetimes:
+        if utc_datetimes:
+            utc_tz = pytz.timezone('UTC')
+            utc_dt = utc_tz.localize(dt)
+            local_tz = pytz.timezone(timezone)
+            local_time = local_tz.normalize(utc_dt.astimezone(local_tz))
+            utc_time = pytz.utc.localize(dt)
+        else:
+            local_time = dt
+            local_tz = pytz.timezone(timezone)
+            utc_time = local_tz.localize(dt).astimezone(pytz.utc)
+        retval.append((local_time, utc_time))
+    return retval
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--timezone', default='Europe/Berlin')
+    parser.add_argument('--tracks', type=int, default=400, help='tracks per day')
+    parser.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    days = []
+    for day in range(args.days):
+        start = datetime(2020, 3, 15) + timedelta(days=day)
+        step = timedelta(days=1) / args.tracks
+        days.append([start + step * i for i in range(args.tracks)])
+    total = args.tracks * args.days
+
+    for utc_datetimes in (False, True):
+        before = best_of(lambda: [per_track(day, args.timezone, utc_datetimes) for day in days])
+        # A fresh converter per day, so no offsets are reused across days
+        after = best_of(lambda: [StationTimezone(args.timezone).convert(day, utc_datetimes)
+                                 for day in days])
+        label = 'utc' if utc_datetimes else 'local'
+        print(f'{label:>5} times: per track {before / total * 1e6:6.2f}us, '
+              f'batched {after / total * 1e6:6.2f}us ({before / after:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -83,4 +83,49 @@ STATIC_URL = '/static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-ELASTICSEARCH = {'host': 'localhost', 'port': 9200}
\ No newline at end of file
+ELASTICSEARCH = {'host': 'localhost', 'port': 9200}
+
+# Scraping
+# Maximum number of stations scraped at once by `manage.py scrape`, and how
+# many of those may target the same host.
+SCRAPE_CONCURRENCY = 8
+SCRAPE_PER_HOST = 2
+# Number of (artist, title) -> Song id mappings kept in memory while scraping.
+SONG_CACHE_SIZE = 100000
+# Number of worker processes parsing fetched pages, 0 to parse in-process.
+# Each station then parses as many dates at once (see scrape --parse-workers).
+SCRAPE_PARSE_PROCESSES = 0
+# Per station and date scrape timings, as JSON lines and as a Prometheus
+# text format file for the node exporter's textfile collector (None to skip).
+SCRAPE_METRICS_JSONL = os.path.join(LOG_DIR, 'scrape_metrics.jsonl')
+SCRAPE_METRICS_PROM = os.path.join(LOG_DIR, 'scrape_metrics.prom')
+# Keep-alive connections kept per host by the scrapers' HTTP sessions, with
+# per-host overrides, e.g. {'ws.audioscrobbler.com': 16}.
+HTTP_POOL_MAXSIZE = 10
+HTTP_HOST_POOL_SIZES = {}
+# Requests per second allowed by an API, or (requests per second, burst).
+# Hosts which aren't listed aren't rate limited.
+HTTP_RATE_LIMITS = {
+    'ws.audioscrobbler.com': (5, 5),
+    'musicbrainz.org': 1,
+}
+# Failed requests are retried after an exponential backoff (with jitter) of
+# HTTP_RETRY_BACKOFF seconds doubling up to HTTP_RETRY_BACKOFF_MAX, or after
+# the server's Retry-After if that is longer. Only connection errors and 408,
+# 429 and 5xx responses are retried, other 4xx responses are returned at once.
+HTTP_RETRY_BACKOFF = 1.0
+HTTP_RETRY_BACKOFF_MAX = 60.0
+# On-disk cache of fetched pages, None to disable. Pages of days before
+# yesterday are kept forever, more recent ones for HTTP_CACHE_RECENT_TTL
+# seconds; HTTP_CACHE_TTLS lists (URL regex, seconds) overrides.
+HTTP_CACHE_DIR = None
+HTTP_CACHE_MAX_BYTES = 512 * 1024 ** 2
+HTTP_CACHE_RECENT_TTL = 300
+HTTP_CACHE_TTLS = []
+# Raw pages fetched by the scrape job are archived here for `manage.py
+# reparse` (None to not archive).
+SCRAPE_ARCHIVE_DIR = None
+# Requests a scraper may have in flight to the same host at once when it
+# fetches a day's pages concurrently, with per-host overrides.
+HTTP_HOST_CONCURRENCY = 4
+HTTP_HOST_CONCURRENCY_LIMITS = {}
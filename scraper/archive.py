@@ -0,0 +1,82 @@
+from datetime import datetime
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+
+from django.utils.text import slugify
+import logbook
+
+log = logbook.Logger('archive')
+
+
+class ResponseArchive(object):
+    """Append-only store of the raw pages fetched for each station and date,
+    so they can be parsed again (see the reparse command) without going back
+    to the station's website.
+
+    Each fetch of a date appends a gzip member holding one JSON line to
+    `<directory>/<station>/<year>/<date>.jsonl.gz`; reading a date returns
+    the pages of its latest fetch.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def station_dir(self, station_name):
+        return os.path.join(self.directory, slugify(station_name))
+
+    def path(self, station_name, date):
+        return os.path.join(self.station_dir(station_name), date.strftime('%Y'),
+                            date.strftime('%Y-%m-%d.jsonl.gz'))
+
+    def append(self, station_name, date, pages):
+        """Archive the (url, body) pages fetched for a station's date"""
+        record = json.dumps({'fetched': time.time(), 'pages': pages}) + '\n'
+        path = self.path(station_name, date)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Every append is a gzip member of its own, gzip readers read
+            # them as one stream.
+            with open(path, 'ab') as f:
+                f.write(gzip.compress(record.encode('utf-8')))
+
+    def read(self, station_name, date):
+        """The (url, body) pages of the latest fetch of a date, or None"""
+        path = self.path(station_name, date)
+        record = None
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+        except FileNotFoundError:
+            return None
+        except (EOFError, OSError, ValueError, zlib.error) as e:
+            # An append cut short, the fetches before it are still good
+            log.warning(f'Truncated archive {path}: {e}')
+        if record is None:
+            return None
+        return [tuple(page) for page in record['pages']]
+
+    def dates(self, station_name, from_date=None, to_date=None):
+        """Archived dates of a station from from_date to to_date inclusive,
+        in ascending order"""
+        retval = []
+        station_dir = self.station_dir(station_name)
+        if not os.path.isdir(station_dir):
+            return retval
+        for year in os.listdir(station_dir):
+            if ((from_date and int(year) < from_date.year)
+                    or (to_date and int(year) > to_date.year)):
+                continue
+            for name in os.listdir(os.path.join(station_dir, year)):
+                if not name.endswith('.jsonl.gz'):
+                    continue
+                date = datetime.strptime(name[:-len('.jsonl.gz')], '%Y-%m-%d').date()
+                if (from_date and date < from_date) or (to_date and date > to_date):
+                    continue
+                retval.append(date)
+        return sorted(retval)
@@ -0,0 +1,90 @@
+"""Declarative extraction of tracks from playlist pages.
+
+An ExtractionSpec says where the tracks of a page are: a CSS selector for
+the rows, one for each field of a row, how to read the time, and which rows
+to leave out. Selectors are compiled by soupsieve once, when the scraper
+class is defined, and reused for every row of every page.
+"""
+import soupsieve
+
+from scraper.timeparse import timestamp_parser
+
+
+class Field(object):
+    """The text (or attribute attr) of the first element in a row matching
+    selector, with every string in remove taken out and strip characters
+    stripped (whitespace by default)"""
+
+    def __init__(self, selector, attr=None, remove=(), strip=None):
+        self.selector = soupsieve.compile(selector)
+        self.attr = attr
+        self.remove = (remove,) if isinstance(remove, str) else tuple(remove)
+        self.strip = strip
+
+    def extract(self, row):
+        """Raises LookupError if the row doesn't have the field"""
+        element = self.selector.select_one(row)
+        if element is None:
+            raise LookupError(f'No element matching {self.selector.pattern!r}')
+        value = element[self.attr] if self.attr else element.text
+        for text in self.remove:
+            value = value.replace(text, '')
+        return value.strip(self.strip)
+
+
+class ExtractionSpec(object):
+    """How to extract (artist, title, time) tracks from a parsed page.
+
+    rows:        CSS selector of the elements holding one track each
+    artist, title, time:
+                 Field (or CSS selector) of each value within a row
+    time_format: strptime format of the time, dateutil guesses if None. A
+                 format without a date gets the date being scraped.
+    date, date_format:
+                 Field of a row's date and its format; rows of other days
+                 than the one being scraped are left out
+    exclude:     (artist, title) pairs which aren't tracks, e.g. station
+                 jingles, compared case-insensitively
+    """
+
+    def __init__(self, rows, artist, title, time, time_format=None, date=None,
+                 date_format='%Y-%m-%d', exclude=()):
+        self.rows = soupsieve.compile(rows)
+        self.artist = self._field(artist)
+        self.title = self._field(title)
+        self.time = self._field(time)
+        self.time_format = time_format
+        # parse_time(text, day) returns the datetime of a time field
+        self.parse_time = timestamp_parser(time_format)
+        self.date = date and self._field(date)
+        self.date_format = date_format
+        self.exclude = {(artist.lower(), title.lower()) for artist, title in exclude}
+
+    @staticmethod
+    def _field(field):
+        return field if isinstance(field, Field) else Field(field)
+
+    def select_rows(self, soup, day):
+        """The rows of a parsed page, leaving out those of other days"""
+        rows = self.rows.select(soup)
+        if self.date is None:
+            return rows
+        date_string = day.strftime(self.date_format)
+        retval = []
+        for row in rows:
+            try:
+                if self.date.extract(row) == date_string:
+                    retval.append(row)
+            except LookupError:
+                continue
+        return retval
+
+    def extract(self, row, day):
+        """The (artist, title, time) track of a row of day's page, or None if
+        it is excluded. Raises LookupError or ValueError for a row which
+        doesn't hold a track."""
+        artist = self.artist.extract(row)
+        title = self.title.extract(row)
+        if (artist.lower(), title.lower()) in self.exclude:
+            return None
+        return (artist, title, self.parse_time(self.time.extract(row), day))
@@ -0,0 +1,245 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, timedelta
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlencode
+import zlib
+
+import logbook
+import requests
+from requests.structures import CaseInsensitiveDict
+
+log = logbook.Logger('httpcache')
+
+# Responses which may be cached for as long as we like
+FOREVER = float('inf')
+
+# The date the current scrape is for, see scraping_date()
+_scraping_date = ContextVar('scraping_date', default=None)
+
+
+@contextmanager
+def scraping_date(day):
+    """Tell the response cache which date the requests made inside this block
+    are for, so that pages of days which are over can be kept forever"""
+    token = _scraping_date.set(day)
+    try:
+        yield
+    finally:
+        _scraping_date.reset(token)
+
+
+def cache_key(method, url, data=None, cookies=None):
+    """sha256 of everything which selects a response: the method, the URL,
+    the body and the cookies (e.g. FluxFM picks the stream by cookie)"""
+    if isinstance(data, dict):
+        data = urlencode(sorted(data.items()))
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    digest = hashlib.sha256()
+    digest.update(method.upper().encode('ascii') + b'\n' + url.encode('utf-8') + b'\n')
+    digest.update((data or b'') + b'\n')
+    digest.update(urlencode(sorted((cookies or {}).items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CachedResponse(object):
+    """A response read back from the cache"""
+
+    def __init__(self, key, meta, content):
+        self.key = key
+        self.meta = meta
+        self.content = content
+
+    @property
+    def fresh(self):
+        expires = self.meta['expires']
+        return expires is None or expires > time.time()
+
+    def validators(self):
+        """Headers for a conditional request revalidating this response"""
+        headers = {}
+        if self.meta['headers'].get('ETag'):
+            headers['If-None-Match'] = self.meta['headers']['ETag']
+        if self.meta['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = self.meta['headers']['Last-Modified']
+        return headers
+
+    def response(self):
+        response = requests.Response()
+        response.status_code = self.meta['status']
+        response.url = self.meta['url']
+        response.encoding = self.meta['encoding']
+        response.headers = CaseInsensitiveDict(self.meta['headers'])
+        response._content = self.content
+        return response
+
+
+class ResponseCache(object):
+    """Content-addressed on-disk cache of successful HTTP responses.
+
+    Bodies are stored zlib compressed, one file per response, under
+    `directory`. How long a response stays fresh is taken from the first of
+    `ttls` (regex, seconds) matching its URL, or else from the date being
+    scraped: days before yesterday never change again and are kept forever,
+    later days for `recent_ttl` seconds. Other requests aren't cached.
+    Stale responses with an ETag or Last-Modified are revalidated. Once the
+    cache grows beyond `max_bytes` the least recently used files go.
+    """
+
+    # Response headers kept with the body
+    HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+    def __init__(self, directory, max_bytes=512 * 1024 ** 2, ttls=(), recent_ttl=300):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in ttls]
+        self.recent_ttl = recent_ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.revalidated + self.misses
+        return (self.hits + self.revalidated) / lookups if lookups else 0.0
+
+    def ttl(self, url):
+        """Seconds a response for url stays fresh, None if it isn't cached"""
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        day = _scraping_date.get()
+        if day is None:
+            return None
+        # A station's day can still be going on in its timezone the day after
+        if day < date.today() - timedelta(days=1):
+            return FOREVER
+        return self.recent_ttl
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """Look up a cached response, fresh or not"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                content = zlib.decompress(f.read())
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except (ValueError, zlib.error) as e:
+            log.warning(f'Dropping unreadable cache entry {path}: {e}')
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+        cached = CachedResponse(key, meta, content)
+        self._touch(path)
+        with self._lock:
+            if cached.fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return cached
+
+    def put(self, key, response):
+        """Store a successful response if its URL is cacheable"""
+        ttl = self.ttl(response.url or '')
+        if ttl is None or response.status_code != 200:
+            return
+        self._write(key, response.url, response.status_code, response.encoding,
+                    dict((name, response.headers[name]) for name in self.HEADERS
+                         if name in response.headers),
+                    response.content, ttl)
+
+    def refresh(self, cached, response):
+        """Keep a revalidated (304 Not Modified) response for another TTL"""
+        ttl = self.ttl(cached.meta['url'])
+        with self._lock:
+            self.revalidated += 1
+            # It was counted as a miss when it turned out to be stale
+            self.misses -= 1
+        if ttl is None:
+            return
+        headers = dict(cached.meta['headers'])
+        for name in ('ETag', 'Last-Modified'):
+            if name in response.headers:
+                headers[name] = response.headers[name]
+        self._write(cached.key, cached.meta['url'], cached.meta['status'],
+                    cached.meta['encoding'], headers, cached.content, ttl)
+
+    def _write(self, key, url, status, encoding, headers, content, ttl):
+        meta = {
+            'url': url,
+            'status': status,
+            'encoding': encoding,
+            'headers': headers,
+            'stored': time.time(),
+            'expires': None if ttl == FOREVER else time.time() + ttl,
+        }
+        data = json.dumps(meta).encode('utf-8') + b'\n' + zlib.compress(content)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith('.tmp'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._files())
+
+    def _evict(self):
+        """Remove least recently used entries until 90% of max_bytes is left"""
+        target = self.max_bytes * 0.9
+        self._size = 0
+        files = sorted(self._files(), reverse=True)
+        for mtime, size, path in files:
+            if self._size + size <= target:
+                self._size += size
+            else:
+                self._remove(path)
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
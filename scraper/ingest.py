@@ -0,0 +1,244 @@
+from collections import namedtuple, OrderedDict
+import html
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateField, DateTimeField, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.utils import DataError
+from django.utils import timezone
+import logbook
+
+from scraper.lib import station_timezone
+from scraper.models import Station, Song, Play
+
+log = logbook.Logger('ingest')
+
+IngestResult = namedtuple(
+    'IngestResult', ['songs_created', 'plays_created', 'plays_existing', 'plays_updated'],
+    defaults=[0])
+
+ARTIST_LENGTH = Song._meta.get_field('artist').max_length
+TITLE_LENGTH = Song._meta.get_field('title').max_length
+
+
+class SongCache(object):
+    """Size-bounded LRU mapping of (artist, title) to Song ids.
+
+    Backfills see the same songs day after day, so consulting this before the
+    database saves most song lookups. Safe to share between runner threads."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                song_id = self._ids[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._ids.move_to_end(key)
+            self.hits += 1
+            return song_id
+
+    def set(self, key, song_id):
+        with self._lock:
+            self._ids[key] = song_id
+            self._ids.move_to_end(key)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+            self.hits = self.misses = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+# Shared by all runners of a process
+SONG_CACHE = SongCache(settings.SONG_CACHE_SIZE)
+
+
+def clean_tracks(tracks):
+    """Decode and truncate scraped (artist, title, time) tuples, dropping
+    incomplete entries. We need to make a set as sometimes tracks are
+    duplicated on the website by accident."""
+    retval = []
+    for track in set(tracks):
+        artist = html.unescape(track[0])[:ARTIST_LENGTH].strip()
+        title = html.unescape(track[1])[:TITLE_LENGTH].strip()
+        if artist and title:
+            retval.append((artist, title, track[2]))
+    return retval
+
+
+def play_times(station, datetimes, utc_datetimes):
+    """Return the (local time, utc time) pairs stored on plays for a batch
+    of scraped datetimes"""
+    converted = station_timezone(station.timezone).convert(datetimes, utc_datetimes)
+    if utc_datetimes:
+        return converted
+    # Naive scraped local times are stored as the station's wall clock time
+    # in the default timezone, as Django does for naive datetimes.
+    default_tz = timezone.get_default_timezone()
+    return [(dt if dt.tzinfo else dt.replace(tzinfo=default_tz), utc_time)
+            for dt, (_, utc_time) in zip(datetimes, converted)]
+
+
+def update_watermark(station, times):
+    """Advance the station's scrape watermark to cover the given
+    (local time, utc time) pairs. Must be called in the ingest transaction."""
+    if not times:
+        return
+    last_date = max(local_time.date() for local_time, _ in times)
+    last_time = max(utc_time for _, utc_time in times)
+    Station.objects.filter(pk=station.pk).update(
+        last_ingested_date=Greatest(
+            Coalesce('last_ingested_date', Value(last_date, output_field=DateField())),
+            Value(last_date, output_field=DateField())),
+        last_play_time=Greatest(
+            Coalesce('last_play_time', Value(last_time, output_field=DateTimeField())),
+            Value(last_time, output_field=DateTimeField())))
+    if station.last_ingested_date is None or station.last_ingested_date < last_date:
+        station.last_ingested_date = last_date
+    if station.last_play_time is None or station.last_play_time < last_time:
+        station.last_play_time = last_time
+
+
+def cache_on_commit(song_cache, song_ids):
+    """Add (artist, title): Song id items to song_cache once the ingest
+    transaction commits. Songs created by an ingest which is rolled back
+    don't exist, other stations' ingests mustn't find them in the cache."""
+    if song_cache is None or not song_ids:
+        return
+
+    def update():
+        for key, song_id in song_ids.items():
+            song_cache.set(key, song_id)
+    transaction.on_commit(update)
+
+
+def ingest_rows(station, tracks, utc_datetimes, song_cache=None):
+    """Store cleaned tracks as plays one track at a time"""
+    songs_created = plays_created = plays_existing = 0
+    times = []
+    # Songs looked up in the database, cached once the transaction commits
+    song_ids = {}
+    all_times = play_times(station, [dt for _, _, dt in tracks], utc_datetimes)
+    with transaction.atomic():
+        for (artist, title, _), (local_time, utc_time) in zip(tracks, all_times):
+            song_id = song_ids.get((artist, title))
+            if song_id is None and song_cache is not None:
+                song_id = song_cache.get((artist, title))
+            if song_id is None:
+                try:
+                    with transaction.atomic():
+                        song, created = Song.objects.get_or_create(artist=artist, title=title)
+                except DataError as e:
+                    log.error(f"Couldn't add {artist} - {title} to db: {e}")
+                    continue
+                songs_created += created
+                song_id = song_ids[(artist, title)] = song.id
+            _, created = Play.objects.get_or_create(
+                local_time=local_time,
+                time=utc_time,
+                song_id=song_id, station=station)
+            times.append((local_time, utc_time))
+            if created:
+                plays_created += 1
+            else:
+                plays_existing += 1
+        update_watermark(station, times)
+        cache_on_commit(song_cache, song_ids)
+    return IngestResult(songs_created, plays_created, plays_existing)
+
+
+def resolve_songs(pairs, song_cache=None):
+    """Map (artist, title) pairs to Song ids, creating missing songs.
+    Must be called in the ingest transaction.
+
+    Returns a tuple of the mapping and the number of songs created."""
+    pairs = set(pairs)
+    song_ids = {}
+    if song_cache is not None:
+        for pair in pairs:
+            song_id = song_cache.get(pair)
+            if song_id is not None:
+                song_ids[pair] = song_id
+        pairs -= set(song_ids)
+    if not pairs:
+        return song_ids, 0
+
+    def lookup(wanted):
+        artists = set(artist for artist, _ in wanted)
+        titles = set(title for _, title in wanted)
+        found = Song.objects.filter(
+            artist__in=artists, title__in=titles).values_list('artist', 'title', 'id')
+        return dict(((artist, title), pk) for artist, title, pk in found
+                    if (artist, title) in wanted)
+
+    song_ids.update(lookup(pairs))
+    missing = pairs - set(song_ids)
+    created = {}
+    if missing:
+        Song.objects.bulk_create(
+            [Song(artist=artist, title=title) for artist, title in missing],
+            ignore_conflicts=True)
+        created = lookup(missing)
+        song_ids.update(created)
+    for artist, title in missing - set(created):
+        # The database considers this song a duplicate of an existing one
+        # (e.g. a case-insensitive collation), let it decide which.
+        try:
+            song, _ = Song.objects.get_or_create(artist=artist, title=title)
+        except DataError as e:
+            log.error(f"Couldn't add {artist} - {title} to db: {e}")
+            continue
+        song_ids[(artist, title)] = song.id
+    cache_on_commit(song_cache, dict((pair, song_ids[pair]) for pair in pairs if pair in song_ids))
+    return song_ids, len(created)
+
+
+def ingest_bulk(station, tracks, utc_datetimes, song_cache=None, upsert=False):
+    """Store cleaned tracks as plays using a handful of bulk queries.
+
+    With upsert, existing plays at the same time which now have a different
+    song (e.g. after a parsing fix) are updated to the new one."""
+    with transaction.atomic():
+        song_ids, songs_created = resolve_songs(
+            ((artist, title) for artist, title, _ in tracks), song_cache)
+        plays = {}
+        all_times = play_times(station, [dt for _, _, dt in tracks], utc_datetimes)
+        for (artist, title, _), (local_time, utc_time) in zip(tracks, all_times):
+            if (artist, title) not in song_ids:
+                continue
+            plays.setdefault(utc_time, Play(
+                local_time=local_time, time=utc_time,
+                song_id=song_ids[(artist, title)], station=station))
+        existing = dict(
+            (time, (pk, song_id)) for time, pk, song_id in Play.objects.filter(
+                station=station, time__in=list(plays)).values_list('time', 'pk', 'song_id'))
+        new_plays = [play for time, play in plays.items() if time not in existing]
+        Play.objects.bulk_create(new_plays, ignore_conflicts=True)
+        changed = []
+        if upsert:
+            for time, (pk, song_id) in existing.items():
+                if song_id != plays[time].song_id:
+                    changed.append(Play(pk=pk, song_id=plays[time].song_id))
+            Play.objects.bulk_update(changed, ['song'], batch_size=500)
+        update_watermark(station, [(play.local_time, play.time) for play in plays.values()])
+    return IngestResult(songs_created, len(new_plays), len(tracks) - len(new_plays),
+                        len(changed))
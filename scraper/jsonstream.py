@@ -0,0 +1,109 @@
+"""Incremental decoding of the one large array in an API response.
+
+json.loads() builds every object of a response before the first one can be
+used. iter_json_array() walks down to the array at a given key path and
+decodes its elements one at a time, dropping text as it is consumed, so only
+one element is alive at a time however large the response is.
+"""
+import json
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def text_chunks(text, size=CHUNK_SIZE):
+    """Split a response body into chunks, as if it was being streamed"""
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+class _Reader(object):
+    """A window onto a stream of text chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ''
+        self.pos = 0
+
+    def more(self):
+        """Read the next chunk, dropping what was consumed. False at the end."""
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """The next non-whitespace character, or '' at the end"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more():
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f'Expected one of {chars!r}, got {char!r}')
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Most likely cut off at the end of the buffer
+                if not self.more():
+                    raise
+                continue
+            if end == len(self.buffer) and self.more():
+                # A number may go on in the next chunk
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(chunks, path, missing_ok=False):
+    """Yield the elements of the array at the key path (a sequence of object
+    keys) of the JSON document made of chunks. A single object where the
+    array is expected is yielded on its own (Last.fm does this for single
+    tracks). Raises KeyError if a key of the path is missing, unless
+    missing_ok."""
+    reader = _Reader(chunks)
+    for key in path:
+        reader.expect('{')
+        found = reader.peek() != '}'
+        while found:
+            name = reader.value()
+            reader.expect(':')
+            if name == key:
+                break
+            # Skip the value of another key
+            reader.value()
+            found = reader.expect(',}') == ','
+        if not found:
+            if missing_ok:
+                return
+            raise KeyError(key)
+    if reader.peek() == '{':
+        yield reader.value()
+        return
+    if reader.peek() == 'n':
+        # null instead of an empty array
+        reader.value()
+        return
+    reader.expect('[')
+    if reader.peek() == ']':
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
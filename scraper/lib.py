@@ -1,15 +1,190 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from http.cookiejar import DefaultCookiePolicy
 import pytz
+import random
+import threading
 import time
+from urllib.parse import urlparse
 
 import logbook
 import requests
+from requests.adapters import HTTPAdapter
+
+from scraper.httpcache import ResponseCache, cache_key
 
 log = logbook.Logger()
 
 USER_AGENT = ('Mozilla/5.0 (Windows NT 6.2; Win64; x64) AppleWebKit/537.36 '
               '(KHTML, like Gecko) Chrome/32.0.1667.0 Safari/537.36')
 
+def setting(name, default):
+    """A Django setting, or default when it's unset or Django isn't set up
+    (e.g. in the benchmarks)"""
+    from django.conf import settings
+    from django.core.exceptions import ImproperlyConfigured
+    try:
+        return getattr(settings, name, default)
+    except ImproperlyConfigured:
+        return default
+
+
+class SessionPool(object):
+    """One requests.Session per host, so that consecutive requests to a
+    station's website reuse keep-alive connections instead of paying for a
+    new TCP and TLS handshake each time.
+
+    Sessions don't keep cookies set by responses: every request only sends
+    the cookies it's given, as with a plain requests.get.
+    """
+
+    def __init__(self, pool_maxsize=10, host_pool_sizes=None):
+        self.pool_maxsize = pool_maxsize
+        self.host_pool_sizes = host_pool_sizes or {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, url):
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.netloc)
+        try:
+            return self._sessions[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._sessions:
+                size = self.host_pool_sizes.get(parsed.hostname, self.pool_maxsize)
+                session = requests.Session()
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+                session.mount(f'{parsed.scheme}://', adapter)
+                self._sessions[key] = session
+            return self._sessions[key]
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+SESSIONS = SessionPool(
+    pool_maxsize=setting('HTTP_POOL_MAXSIZE', 10),
+    host_pool_sizes=setting('HTTP_HOST_POOL_SIZES', {}))
+
+
+class TokenBucket(object):
+    """Allows `rate` requests per second on average, with bursts of up to
+    `burst` requests. Callers reserve a slot and sleep until it comes up,
+    so concurrent callers are spread out instead of all retrying at once."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        # The time at which the bucket would be full again
+        self._full_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token, returning how many seconds to wait before using it"""
+        interval = 1.0 / self.rate
+        with self._lock:
+            now = time.monotonic()
+            full_at = max(self._full_at, now) + interval
+            self._full_at = full_at
+            return max(0.0, full_at - now - self.burst * interval)
+
+    def defer(self, delay):
+        """Hold back every request for delay seconds (e.g. for a Retry-After)"""
+        with self._lock:
+            self._full_at = max(
+                self._full_at, time.monotonic() + delay + (self.burst - 1) / self.rate)
+
+
+class RateLimiter(object):
+    """Per-host request budgets shared by all scrapers of a process.
+
+    `rates` maps host names to (requests per second, burst) or just requests
+    per second. Hosts without a budget aren't limited."""
+
+    def __init__(self, rates=None):
+        self.buckets = {}
+        for host, rate in (rates or {}).items():
+            rate, burst = rate if isinstance(rate, (tuple, list)) else (rate, 1)
+            self.buckets[host] = TokenBucket(rate, burst)
+
+    def bucket(self, url):
+        return self.buckets.get(urlparse(url).hostname)
+
+    def wait(self, url):
+        bucket = self.bucket(url)
+        if bucket is not None:
+            delay = bucket.reserve()
+            if delay:
+                time.sleep(delay)
+
+    def defer(self, url, delay):
+        bucket = self.bucket(url)
+        if bucket is not None:
+            bucket.defer(delay)
+
+
+RATE_LIMITER = RateLimiter(setting('HTTP_RATE_LIMITS', {}))
+RETRY_BACKOFF = setting('HTTP_RETRY_BACKOFF', 1.0)
+RETRY_BACKOFF_MAX = setting('HTTP_RETRY_BACKOFF_MAX', 60.0)
+
+
+def retry_after(response):
+    """Seconds to wait according to a response's Retry-After header, if any"""
+    if response is None:
+        return None
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(pytz.utc)).total_seconds())
+
+
+def backoff_delay(attempt, base=None, maximum=None):
+    """Exponential backoff with jitter for the given (0-based) retry attempt"""
+    base = RETRY_BACKOFF if base is None else base
+    maximum = RETRY_BACKOFF_MAX if maximum is None else maximum
+    delay = min(maximum, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# Error statuses a request may succeed after, besides the 5xx ones
+RETRY_STATUSES = (408, 429)
+
+
+def retry_delay(url, attempt, error):
+    """Seconds to wait before retrying a request to url which failed with
+    error on the given (0-based) attempt, or None if retrying is pointless.
+    Connection errors, timeouts and 408, 429 and 5xx responses are retried
+    with backoff, or after their Retry-After if it's longer, which holds back
+    every request to the host. Other 4xx responses aren't retried."""
+    response = getattr(error, 'response', None)
+    if response is not None and not (
+            response.status_code in RETRY_STATUSES or response.status_code >= 500):
+        return None
+    delay = backoff_delay(attempt)
+    server_delay = retry_after(response)
+    if server_delay is not None:
+        delay = max(delay, server_delay)
+        RATE_LIMITER.defer(url, delay)
+    return delay
+
+
 def http_get(*args, **kwargs):
     kwargs['method'] = 'get'
     return http_req(*args, **kwargs)
@@ -19,25 +194,125 @@ def http_post(*args, **kwargs):
     return http_req(*args, **kwargs)
 
 def http_req(url, retries=10, user_agent=USER_AGENT, cookies=None, method='get', **kwargs):
-    """Wrapper for requests.get for retries"""
+    """Request url through its host's session, waiting for the host's rate
+    limit and retrying failures which may go away (see retry_delay) with
+    exponential backoff. The response of the last try is returned whatever
+    its status.
+
+    With a response cache configured, cached responses are returned without
+    a request where they are fresh and revalidated where they are stale."""
     if cookies is None:
         cookies = {}
-    requests_func = getattr(requests, method)
-    if retries:
+    headers = {'User-Agent': user_agent}
+    cache = RESPONSE_CACHE
+    cached = key = None
+    if cache is not None:
+        key = cache_key(method, url, kwargs.get('data'), cookies)
+        cached = cache.get(key)
+        if cached is not None:
+            if cached.fresh:
+                return cached.response()
+            headers.update(cached.validators())
+    retval = _send(url, retries, headers, cookies, method, kwargs)
+    if cache is not None:
+        if cached is not None and retval.status_code == 304:
+            cache.refresh(cached, retval)
+            return cached.response()
+        cache.put(key, retval)
+    return retval
+
+
+def _send(url, retries, headers, cookies, method, kwargs):
+    session = SESSIONS.session(url)
+    for attempt in range(retries):
+        RATE_LIMITER.wait(url)
         try:
-            retval = requests_func(
-                url, headers={'User-Agent': user_agent}, cookies=cookies, **kwargs)
+            retval = session.request(method, url, headers=headers, cookies=cookies, **kwargs)
             retval.raise_for_status()
         except Exception as e:
-            time.sleep(1)
-            log.error(str(e))
-            return http_get(url, retries=retries-1)
+            delay = retry_delay(url, attempt, e)
+            if delay is None:
+                log.error(f'{e}, not retrying')
+                return e.response
+            log.error(f'{e}, retrying in {delay:.1f}s')
+            time.sleep(delay)
         else:
             return retval
-    else:
-        # Try one last time, if it fails, it fails
-        return requests_func(
-            url, headers={'User-Agent': user_agent}, cookies=cookies)
+    # Try one last time, if it fails, it fails
+    RATE_LIMITER.wait(url)
+    return session.request(method, url, headers=headers, cookies=cookies, **kwargs)
+
+
+def make_response_cache():
+    """The response cache configured by the HTTP_CACHE_* settings, if any"""
+    directory = setting('HTTP_CACHE_DIR', None)
+    if not directory:
+        return None
+    return ResponseCache(
+        directory,
+        max_bytes=setting('HTTP_CACHE_MAX_BYTES', 512 * 1024 ** 2),
+        ttls=setting('HTTP_CACHE_TTLS', ()),
+        recent_ttl=setting('HTTP_CACHE_RECENT_TTL', 300))
+
+
+RESPONSE_CACHE = make_response_cache()
+
+
+class HostSlots(object):
+    """Bounds the number of requests in flight to each host, across all
+    threads and event loops of the process"""
+
+    def __init__(self, limit=4, host_limits=None):
+        self.limit = limit
+        self.host_limits = host_limits or {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def semaphore(self, url):
+        host = urlparse(url).hostname
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(
+                    self.host_limits.get(host, self.limit))
+            return self._semaphores[host]
+
+
+HOST_SLOTS = HostSlots(
+    limit=setting('HTTP_HOST_CONCURRENCY', 4),
+    host_limits=setting('HTTP_HOST_CONCURRENCY_LIMITS', {}))
+
+
+def host_slot(url):
+    """Context manager holding one of url's host slots"""
+    return HOST_SLOTS.semaphore(url)
+
+
+def _in_host_slot(func, url, *args, **kwargs):
+    with host_slot(url):
+        return func(url, *args, **kwargs)
+
+
+async def async_http_get(url, *args, **kwargs):
+    """http_get for coroutines. The request runs in a worker thread, so any
+    number of them can be awaited together; at most HTTP_HOST_CONCURRENCY
+    are sent to the same host at once."""
+    return await asyncio.to_thread(_in_host_slot, http_get, url, *args, **kwargs)
+
+
+async def async_http_post(url, *args, **kwargs):
+    """http_post for coroutines, see async_http_get"""
+    return await asyncio.to_thread(_in_host_slot, http_post, url, *args, **kwargs)
+
+
+def run_sync(coroutine):
+    """Run a coroutine to completion from synchronous code, even from a
+    thread whose event loop is already running"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
 
 
 def create_date_range(from_date, to_date=None):
@@ -48,12 +323,116 @@ def create_date_range(from_date, to_date=None):
     return retval
 
 
+def date_windows(dates, size):
+    """Split dates into tuples of at most size consecutive dates, keeping
+    their order"""
+    windows = []
+    window = []
+    for date in dates:
+        if window and (len(window) == size or abs((window[-1] - date).days) != 1):
+            windows.append(tuple(window))
+            window = []
+        window.append(date)
+    if window:
+        windows.append(tuple(window))
+    return windows
+
+
+def find_gap_dates(counts, from_date, to_date, min_ratio=0.5):
+    """Return the dates between from_date and to_date (inclusive), newest
+    first, which have no plays or fewer than min_ratio times the median
+    number of plays per day. `counts` maps dates to their number of plays."""
+    nonzero = sorted(count for count in counts.values() if count)
+    if not nonzero:
+        return []
+    median = nonzero[len(nonzero) // 2]
+    dates = create_date_range(from_date, to_date + timedelta(days=1))
+    return [date for date in dates if counts.get(date, 0) < median * min_ratio]
+
+
+class StationTimezone(object):
+    """Converts a station's scraped datetimes between local time and UTC.
+
+    Build it once per timezone (see station_timezone). Tracks of one day
+    share a handful of UTC offsets, so the offset is resolved once per local
+    hour and reused for every other track in that hour.
+
+    Local times which occur twice when clocks go back are resolved to
+    standard time unless `is_dst` is True. Local times skipped when clocks
+    go forward are interpreted with the offset in effect before the change
+    and moved forward to the matching wall clock time.
+    """
+    # Bound on remembered local hours, roughly a year's worth
+    max_hours = 10000
+
+    def __init__(self, name, is_dst=False):
+        self.name = name
+        self.tz = pytz.timezone(name)
+        self.is_dst = is_dst
+        self._hours = {}
+
+    def _offset(self, dt):
+        """The pytz tzinfo and UTC offset for the naive local datetime dt,
+        and whether dt falls into a skipped hour and has to be normalized"""
+        hour = dt.replace(minute=0, second=0, microsecond=0)
+        try:
+            return self._hours[hour]
+        except KeyError:
+            pass
+        skipped = False
+        try:
+            tzinfo = self.tz.localize(hour, is_dst=None).tzinfo
+        except pytz.AmbiguousTimeError:
+            log.debug(f'{hour} is ambiguous in {self.name}, using is_dst={self.is_dst}')
+            tzinfo = self.tz.localize(hour, is_dst=self.is_dst).tzinfo
+        except pytz.NonExistentTimeError:
+            log.debug(f'{hour} does not exist in {self.name}')
+            tzinfo = self.tz.localize(hour, is_dst=False).tzinfo
+            skipped = True
+        if len(self._hours) >= self.max_hours:
+            self._hours.clear()
+        self._hours[hour] = retval = tzinfo, hour.replace(tzinfo=tzinfo).utcoffset(), skipped
+        return retval
+
+    def to_utc(self, dt):
+        """Returns the datetime dt converted to UTC, naive datetimes being
+        local time"""
+        if dt.tzinfo:
+            return dt.astimezone(pytz.utc)
+        _, offset, _ = self._offset(dt)
+        return (dt - offset).replace(tzinfo=pytz.utc)
+
+    def convert(self, datetimes, utc_datetimes=False):
+        """Convert a batch of scraped datetimes, naive ones being in local
+        time or UTC, to a list of (aware local time, aware UTC time) tuples.
+        Aware datetimes (e.g. with an offset on the page) keep their offset."""
+        retval = []
+        if utc_datetimes:
+            for dt in datetimes:
+                utc_time = dt.astimezone(pytz.utc) if dt.tzinfo else dt.replace(tzinfo=pytz.utc)
+                retval.append((utc_time.astimezone(self.tz), utc_time))
+            return retval
+        for dt in datetimes:
+            if dt.tzinfo:
+                retval.append((dt, dt.astimezone(pytz.utc)))
+                continue
+            tzinfo, offset, skipped = self._offset(dt)
+            local_time = dt.replace(tzinfo=tzinfo)
+            if skipped:
+                local_time = self.tz.normalize(local_time)
+            retval.append((local_time, (dt - offset).replace(tzinfo=pytz.utc)))
+        return retval
+
+
+@lru_cache(maxsize=None)
+def station_timezone(name):
+    """The shared StationTimezone for a timezone name"""
+    return StationTimezone(name)
+
+
 def utc_datetime(dt, station):
     """Returns the datetime dt converted to the UTC timezone"""
-    if not dt.tzinfo:
-        timezone = pytz.timezone(station.timezone)
-        dt = timezone.localize(dt)
-    return dt.astimezone(pytz.utc)
+    return station_timezone(station.timezone).to_utc(dt)
 
 
 def localize_datetime(dt, station):
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scraper import scrapers
+from scraper.models import Station
+
+
+class Command(BaseCommand):
+    """Every registered scraper class is listed with its module and the
+    stations using it. Fails if an enabled station's scraper can't be
+    loaded, so it can check a deployment before the scrape job runs."""
+
+    help = 'List the registered scrapers and check every enabled station has one'
+
+    def handle(self, *args, **options):
+        stations = list(Station.objects.order_by('name'))
+        by_class = defaultdict(list)
+        for station in stations:
+            by_class[station.class_name].append(
+                station.name if station.enabled else f'{station.name} (disabled)')
+        for class_name, module in sorted(scrapers.SCRAPERS.items()):
+            self.stdout.write(f'{class_name:<24} scraper.scrapers.{module:<14} '
+                              f'{", ".join(by_class[class_name]) or "-"}')
+
+        broken = scrapers.unresolved(station for station in stations if station.enabled)
+        for station, error in broken:
+            self.stderr.write(f'{station.name}: {error}')
+        if broken:
+            raise CommandError(f"{len(broken)} enabled stations' scrapers can't be loaded")
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+import logbook
+import pytz
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from scraper.models import Station, Play
+
+
+log = logbook.Logger()
+
+
+class Command(BaseCommand):
+    """The scrape job decides where to continue from using each station's
+    watermark, which is kept up to date when plays are ingested. This
+    recomputes the watermarks from the plays already in the database, e.g.
+    after importing data or deleting plays."""
+
+    help = 'Rebuild the per-station scrape watermarks from existing plays'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-s",
+            "--station",
+            dest="station_name",
+            help="specify name of station to rebuild"
+        )
+
+    def handle(self, *args, **options):
+        stations = Station.objects.all()
+        if options.get('station_name'):
+            stations = stations.filter(name=options['station_name'])
+        for station in stations:
+            last_play_time = Play.objects.filter(
+                station=station).aggregate(Max('time'))['time__max']
+            if last_play_time is None:
+                last_ingested_date = None
+            else:
+                local_tz = pytz.timezone(station.timezone)
+                last_ingested_date = last_play_time.astimezone(local_tz).date()
+            Station.objects.filter(pk=station.pk).update(
+                last_ingested_date=last_ingested_date, last_play_time=last_play_time)
+            log.info(u'{0}: last ingested date {1}, last play at {2}'.format(
+                station.name, last_ingested_date, last_play_time))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+from datetime import datetime
+from itertools import repeat
+import os
+import time
+
+import logbook
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from scraper import scrapers
+from scraper.archive import ResponseArchive
+from scraper.ingest import SONG_CACHE, clean_tracks, ingest_bulk
+from scraper.models import Station
+from scraper.parsing import ParserPool, parse_archived
+
+
+log = logbook.Logger('reparse')
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Invalid date {value}, expected YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    """Pages archived by `scrape --archive-dir` are parsed again with the
+    current scrapers, e.g. after fixing an extract_tracks bug, and the
+    resulting plays stored. Plays which now have a different song are
+    updated. Nothing is fetched."""
+
+    help = 'Parse archived pages again and store the resulting plays'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-s",
+            "--station",
+            dest="station_name",
+            help="specify name of station to reparse"
+        )
+        parser.add_argument(
+            "--from",
+            dest="from_date",
+            help="first date to reparse (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--to",
+            dest="to_date",
+            help="last date to reparse (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--archive-dir",
+            dest="archive_dir",
+            default=settings.SCRAPE_ARCHIVE_DIR,
+            help="directory the scrape job archived pages to"
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            dest="processes",
+            default=os.cpu_count(),
+            help="number of worker processes parsing pages, 0 to parse in-process"
+        )
+        parser.add_argument(
+            "--chunksize",
+            type=int,
+            dest="chunksize",
+            default=8,
+            help="number of dates handed to a worker process at once"
+        )
+        parser.add_argument(
+            "-d",
+            "--dry_run",
+            action='store_true',
+            dest="dry_run",
+            help="parse but don't store anything"
+        )
+
+    def handle(self, *args, **options):
+        archive_dir = options.get('archive_dir')
+        if not archive_dir:
+            raise CommandError('No archive directory, set SCRAPE_ARCHIVE_DIR or --archive-dir')
+        from_date = options.get('from_date') and parse_date(options['from_date'])
+        to_date = options.get('to_date') and parse_date(options['to_date'])
+        stations = Station.objects.all()
+        if options.get('station_name'):
+            stations = stations.filter(name=options['station_name'])
+            if not stations:
+                raise CommandError(f'No station named {options["station_name"]}')
+        reparse_options = {
+            'archive': ResponseArchive(archive_dir),
+            'from_date': from_date,
+            'to_date': to_date,
+            'chunksize': options.get('chunksize') or 1,
+            'dry_run': options.get('dry_run', False),
+        }
+        processes = options.get('processes') or 0
+        if processes:
+            with ParserPool(processes) as parser_pool:
+                self.reparse(stations, parser_pool=parser_pool, **reparse_options)
+        else:
+            self.reparse(stations, **reparse_options)
+
+    def reparse(self, stations, archive, from_date=None, to_date=None, parser_pool=None,
+                chunksize=1, dry_run=False):
+        for station in stations:
+            dates = archive.dates(station.name, from_date, to_date)
+            if not dates:
+                continue
+            scraper_cls = getattr(scrapers, station.class_name)
+            args = (repeat(station.class_name), repeat(archive.directory),
+                    repeat(station.name), dates)
+            if parser_pool is not None:
+                parsed = parser_pool.map(parse_archived, *args, chunksize=chunksize)
+            else:
+                parsed = map(parse_archived, *args)
+
+            start = time.monotonic()
+            days = failed = plays_created = plays_updated = 0
+            for date, tracks, error in parsed:
+                if error is not None:
+                    log.error(f'Failed to parse {station.name} for {date}:\n{error}')
+                    failed += 1
+                    continue
+                if not tracks:
+                    continue
+                days += 1
+                if dry_run:
+                    continue
+                result = ingest_bulk(station, clean_tracks(tracks), scraper_cls.utc_datetimes,
+                                     SONG_CACHE, upsert=True)
+                plays_created += result.plays_created
+                plays_updated += result.plays_updated
+            elapsed = time.monotonic() - start
+            log.info(f'{station.name}: reparsed {days} days ({failed} failed) in {elapsed:.1f}s '
+                     f'({days / elapsed * 60 if elapsed else 0:.0f} days/min), '
+                     f'{plays_created} plays added, {plays_updated} plays updated')
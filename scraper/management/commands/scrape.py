@@ -1,26 +1,47 @@
 #!/usr/bin/env python
-from datetime import datetime
-from html.parser import HTMLParser
-import html
+from concurrent.futures import Future
+import threading
 import traceback
 import os
 import sys
-from optparse import make_option
+import time
 import pytz
 
 import logbook
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
-import subprocess
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
 
-from scraper import scrapers
-from scraper.lib import create_date_range, utc_datetime
-from scraper.models import Station, Song, Play
+from scraper import lib, scrapers
+from scraper.archive import ResponseArchive
+from scraper.httpcache import scraping_date
+from scraper.ingest import SONG_CACHE, clean_tracks, ingest_bulk, ingest_rows
+from scraper.lib import create_date_range, date_windows, find_gap_dates
+from scraper.metrics import ScrapeMetrics
+from scraper.models import Station, Play
+from scraper.parsing import ParserPool
+from scraper.pipeline import ScrapePipeline
+from scraper.scheduler import ScrapeScheduler
 
 log = logbook.Logger('runner')
 
 
+def log_setup():
+    """Handlers logging to stdout and scraper.log. Bind them application-wide
+    so that runners in worker threads log too."""
+    return logbook.NestedSetup([
+        logbook.StreamHandler(sys.stdout),
+        logbook.FileHandler(os.path.join(settings.LOG_DIR, 'scraper.log'), bubble=True),
+    ])
+
+
+def page_bytes(pages):
+    """Size of the bodies of (url, body) pages"""
+    return sum(len(body.encode('utf-8')) for _, body in pages)
+
+
 class Command(BaseCommand):
     help = 'Scrapes radio stations for new tracks'
 
@@ -44,117 +65,373 @@ class Command(BaseCommand):
             dest="sequential",
             help="run sequentially, not in parallel"
         )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            dest="concurrency",
+            default=settings.SCRAPE_CONCURRENCY,
+            help="maximum number of stations scraped at once"
+        )
+        parser.add_argument(
+            "--per-host",
+            type=int,
+            dest="per_host",
+            default=settings.SCRAPE_PER_HOST,
+            help="maximum number of stations scraped at once from the same host"
+        )
+        parser.add_argument(
+            "--bulk",
+            action='store_true',
+            dest="bulk",
+            help="store each date's tracks with batched queries"
+        )
+        parser.add_argument(
+            "--backfill-workers",
+            type=int,
+            dest="backfill_workers",
+            default=1,
+            help="number of dates of a station fetched concurrently"
+        )
+        parser.add_argument(
+            "--parse-workers",
+            type=int,
+            dest="parse_workers",
+            help="number of threads parsing a station's fetched dates, each waiting "
+                 "for its date while a parser process parses it (default: "
+                 "--parse-processes with a parser pool, else 1)"
+        )
+        parser.add_argument(
+            "--parse-processes",
+            type=int,
+            dest="parse_processes",
+            default=settings.SCRAPE_PARSE_PROCESSES,
+            help="parse fetched pages in a pool of this many worker processes, "
+                 "fed by each station's --parse-workers threads"
+        )
+        parser.add_argument(
+            "--queue-size",
+            type=int,
+            dest="queue_size",
+            default=4,
+            help="number of dates buffered between backfill stages"
+        )
+        parser.add_argument(
+            "--fill-gaps",
+            action='store_true',
+            dest="fill_gaps",
+            help="only scrape days missing from or sparse in the station's history"
+        )
+        parser.add_argument(
+            "--gap-ratio",
+            type=float,
+            dest="gap_ratio",
+            default=0.5,
+            help="with --fill-gaps, rescrape days with fewer plays than this "
+                 "fraction of the station's median plays per day"
+        )
+        parser.add_argument(
+            "--window-days",
+            type=int,
+            dest="window_days",
+            help="fetch this many consecutive dates at once where the scraper "
+                 "supports it (default: the scraper's window_days, 1 to disable)"
+        )
+        parser.add_argument(
+            "--archive-dir",
+            dest="archive_dir",
+            default=settings.SCRAPE_ARCHIVE_DIR,
+            help="archive the fetched pages under this directory for reparsing"
+        )
 
     def handle(self, *args, **options):
-        dry_run = options.get('dry_run', False)
+        with log_setup().applicationbound():
+            parse_processes = options.get('parse_processes')
+            if parse_processes:
+                with ParserPool(parse_processes) as parser_pool:
+                    self.scrape(parser_pool=parser_pool, **options)
+            else:
+                self.scrape(**options)
+
+    def scrape(self, parser_pool=None, **options):
+        metrics = ScrapeMetrics(settings.SCRAPE_METRICS_JSONL)
+        archive_dir = options.get('archive_dir')
+        runner_options = {
+            'parser_pool': parser_pool,
+            'metrics': metrics,
+            'dry_run': options.get('dry_run', False),
+            'bulk': options.get('bulk', False),
+            'backfill_workers': options.get('backfill_workers') or 1,
+            # Each parse worker blocks on its date, one per process keeps
+            # them all busy on a single station's backfill
+            'parse_workers': (options.get('parse_workers')
+                              or (parser_pool.processes if parser_pool else 1)),
+            'queue_size': options.get('queue_size') or 4,
+            'fill_gaps': options.get('fill_gaps', False),
+            'gap_ratio': options.get('gap_ratio') or 0.5,
+            'archive': ResponseArchive(archive_dir) if archive_dir else None,
+            'window_days': options.get('window_days'),
+        }
         if options['station_name']:
             station = Station.objects.filter(name=options['station_name'])[0]
-            runner = GenericRunner(station, dry_run=dry_run)
+            runner = GenericRunner(station, **runner_options)
             runner.run()
         else:
             stations = Station.objects.filter(enabled=True)
-            processes = []
-            manage_py = os.path.join(os.path.dirname(__file__), '../../..', 'manage.py')
-            for station in stations:
-                cmd = ['python', manage_py, 'scrape', '-s', station.name]
-                #hackity hack:
-                if dry_run:
-                    cmd.append('-d')
-                process = subprocess.Popen(cmd)
-                if options.get('sequential'):
-                    process.wait()
-                else:
-                    processes.append(process)
-            if not options.get('sequential'):
-                [p.wait() for p in processes]
+            broken = scrapers.unresolved(stations)
+            for station, error in broken:
+                log.error(f'Not scraping {station.name}, its scraper {station.class_name} '
+                          f"can't be loaded: {error}")
+            broken_stations = [station for station, _ in broken]
+            stations = [station for station in stations if station not in broken_stations]
+            if options.get('sequential'):
+                concurrency = 1
+            else:
+                concurrency = options.get('concurrency') or settings.SCRAPE_CONCURRENCY
+            scheduler = ScrapeScheduler(
+                lambda station: GenericRunner(station, **runner_options),
+                concurrency=concurrency,
+                per_host=options.get('per_host') or settings.SCRAPE_PER_HOST)
+            results = scheduler.run(stations)
+            failed = ([result.station.name for result in results if not result.ok]
+                      + [station.name for station in broken_stations])
+            total = len(results) + len(broken_stations)
+            log.info(f'Scraped {total - len(failed)} of {total} stations.')
+            if failed:
+                log.error(f'Failed stations: {", ".join(failed)}')
+        log.info(f'Song cache: {SONG_CACHE.hits} hits, {SONG_CACHE.misses} misses '
+                 f'({SONG_CACHE.hit_rate:.0%} hit rate, {len(SONG_CACHE)} entries).')
+        metrics.set_gauge('song_cache_hit_ratio', SONG_CACHE.hit_rate,
+                          'Share of song lookups answered by the song cache.')
+        response_cache = lib.RESPONSE_CACHE
+        if response_cache is not None:
+            log.info(f'Response cache: {response_cache.hits} hits, '
+                     f'{response_cache.revalidated} revalidated, {response_cache.misses} misses '
+                     f'({response_cache.hit_rate:.0%} hit rate).')
+            metrics.set_gauge('http_cache_hit_ratio', response_cache.hit_rate,
+                              'Share of HTTP requests answered by the response cache.')
+        if settings.SCRAPE_METRICS_PROM:
+            metrics.write_prometheus(settings.SCRAPE_METRICS_PROM)
 
 
 class GenericRunner(object):
-    def __init__(self, station, dry_run=False):
+    def __init__(self, station, dry_run=False, bulk=False, song_cache=SONG_CACHE,
+                 backfill_workers=1, parse_workers=1, queue_size=4,
+                 fill_gaps=False, gap_ratio=0.5, parser_pool=None, metrics=None,
+                 archive=None, window_days=1):
         self.station = station
         self.dry_run = dry_run
+        self.bulk = bulk
+        self.song_cache = song_cache
+        self.backfill_workers = backfill_workers
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.fill_gaps = fill_gaps
+        self.gap_ratio = gap_ratio
+        self.parser_pool = parser_pool
+        self.metrics = metrics
+        self.archive = archive
+        self.window_days = window_days
+        # Per date timings and sizes, filled in by the fetch and parse stages
+        self.stats = {}
+        # Date windows fetched at once (see fetch_window), by date
+        self.windows = {}
+        self.window_fetches = {}
+        self.windows_lock = threading.Lock()
 
     def run(self):
-        # TODO: DON'T JUST IGNORE RUNTIMEWARNINGS ABOUT TIMEZONES
-        # but instead fix this code as part of modernizing it
-        import warnings
-        warnings.filterwarnings("ignore")
-        #
-
-        log_handler = logbook.FileHandler(os.path.join(settings.LOG_DIR, 'scraper.log'), bubble=True)
-        logbook.StreamHandler(sys.stdout).push_thread()
-        log_handler.push_thread()
         last_date = None
-        for date in self.date_range:
+        dates = self.gap_range if self.fill_gaps else self.date_range
+        self.plan_windows(dates)
+        for date, scraper in self.scraped(dates):
             last_date = date
-            scraper = getattr(scrapers, self.station.class_name)(date)
-            log.info(f'Scraping {self.station.name} for date {date.strftime("%Y-%m-%d")}...')
-            try:
-                scraper.scrape()
-            except LookupError:
-                if not scraper.tracks:
-                    msg = f'No data found for date {date.strftime("%Y%m%d")} on {self.station.name}.'
-                    continue
-                else:
-                    raise
-            except Exception as e:
-                msg = f'Uncaught exception occurred scraping {self.station.name} on {date.strftime("%Y%m%d")}:\n{traceback.format_exc()}'
-                log.error(msg)
+            if scraper is None:
+                self.record(date, ok=False)
                 continue
             if self.dry_run:
                 print(list(set(scraper.tracks)))
+                self.record(date, tracks_extracted=len(scraper.tracks))
                 continue
 
-            added_already = 0
-            # Add all unique tracks: we need to make a set as sometimes
-            # tracks are duplicated on the website by accident
-            for track in list(set(scraper.tracks)):
-                artist = html.unescape(track[0])[:256].strip()
-                title = html.unescape(track[1])[:256].strip()
-                if not (artist and title):
-                    continue
-                try:
-                    song, _ = Song.objects.get_or_create(
-                        artist=artist, title=title)
-                except django.db.utils.DataError as e:
-                    log.error(f"Couldn't add {artist} - {title} to db: {e}")
-                    continue
-                if scraper.utc_datetimes:
-                    utc_tz = pytz.timezone('UTC')
-                    utc_dt = utc_tz.localize(track[2])
-                    local_tz = pytz.timezone(self.station.timezone)
-                    local_time = local_tz.normalize(utc_dt.astimezone(local_tz))
-                    utc_time = pytz.utc.localize(track[2])
-                else:
-                    local_time = track[2]
-                    utc_time = utc_datetime(track[2], self.station)
-                _, created = Play.objects.get_or_create(
-                    local_time=local_time,
-                    time=utc_time,
-                    song=song, station=self.station)
-                if not created:
-                    # We're encountering tracks we've already added.
-                    # Keep trying to add tracks for this date, but
-                    # don't proceed with processing further dates if
-                    # all tracks for this date were already added.
-                    added_already += 1
-                    continue
+            tracks = clean_tracks(scraper.tracks)
+            ingest = ingest_bulk if self.bulk else ingest_rows
+            start = time.monotonic()
+            result = ingest(self.station, tracks, scraper.utc_datetimes, self.song_cache)
+            self.record(date, tracks_extracted=len(scraper.tracks),
+                        db_seconds=time.monotonic() - start,
+                        songs_created=result.songs_created,
+                        plays_created=result.plays_created)
+            log.info(f'Added {result.plays_created} plays ({result.songs_created} new songs) '
+                     f'for {self.station.name} on {date.strftime("%Y-%m-%d")}, '
+                     f'{result.plays_existing} already present.')
+            if self.fill_gaps:
+                # Gaps aren't contiguous, finding one already filled
+                # says nothing about the others.
+                continue
+            # Keep trying to add tracks for this date, but don't proceed
+            # with processing further dates if all tracks for this date
+            # were already added.
             if (scraper.terminate_early
-                    or (scraper.tracks and added_already == len(scraper.tracks))
+                    or (tracks and result.plays_existing == len(tracks))
                     or not scraper.tracks):
                 break
         log.info(f'End reached for {self.station.name} at {last_date}. Stopping...')
         if not self.dry_run:
-            self.station.last_scraped = datetime.utcnow()
-            self.station.save()
+            self.station.last_scraped = timezone.now()
+            # Only last_scraped: the watermark is maintained by the ingest path
+            self.station.save(update_fields=['last_scraped'])
         return
 
+    def record(self, date, ok=True, **values):
+        """Send a date's stats to the metrics collector"""
+        stats = self.stats.pop(date, {})
+        stats.update(values)
+        if self.metrics is not None:
+            self.metrics.record(self.station.name, date, ok=ok, **stats)
+
+    def plan_windows(self, dates):
+        """Group consecutive dates into windows fetched at once, for
+        scrapers which can do that (e.g. Last.fm)"""
+        scraper_cls = getattr(scrapers, self.station.class_name)
+        if not hasattr(scraper_cls, 'fetch_window'):
+            return
+        size = self.window_days
+        if size is None:
+            size = getattr(scraper_cls, 'window_days', 1)
+        if size <= 1:
+            return
+        for window in date_windows(dates, size):
+            for date in window:
+                self.windows[date] = window
+
+    def fetch_window(self, scraper, window):
+        """The pages of scraper's date, fetched together with the rest of its
+        window by whichever of the window's dates comes first. Returns them
+        and the bytes fetched for the window if this date fetched it, else 0."""
+        with self.windows_lock:
+            first = window not in self.window_fetches
+            if first:
+                self.window_fetches[window] = [Future(), len(window)]
+            fetch = self.window_fetches[window][0]
+            # Forget the pages once every date of the window has them
+            self.window_fetches[window][1] -= 1
+            if not self.window_fetches[window][1]:
+                del self.window_fetches[window]
+        if first:
+            log.info(f'Scraping {self.station.name} for dates '
+                     f'{min(window).strftime("%Y-%m-%d")} to {max(window).strftime("%Y-%m-%d")}...')
+            try:
+                # The most recent date decides how long responses are cached
+                with scraping_date(max(window)):
+                    fetch.set_result(type(scraper).fetch_window(window))
+            except Exception as e:
+                fetch.set_exception(e)
+        pages = fetch.result()[scraper.date]
+        if not first:
+            return pages, 0
+        return pages, sum(page_bytes(date_pages) for date_pages in fetch.result().values())
+
+    def fetch_date(self, date):
+        scraper = getattr(scrapers, self.station.class_name)(date)
+        pages = error = None
+        bytes_fetched = 0
+        start = time.monotonic()
+        try:
+            window = self.windows.get(date)
+            if window is not None:
+                pages, bytes_fetched = self.fetch_window(scraper, window)
+            else:
+                log.info(f'Scraping {self.station.name} for date {date.strftime("%Y-%m-%d")}...')
+                with scraping_date(date):
+                    pages = scraper.fetch()
+                bytes_fetched = page_bytes(pages or [])
+        except Exception as e:
+            error = e
+        else:
+            if self.archive is not None and pages:
+                self.archive.append(self.station.name, date, pages)
+        self.stats[date] = {
+            'http_seconds': time.monotonic() - start,
+            'bytes_fetched': bytes_fetched,
+        }
+        return scraper, pages, error
+
+    def parse_date(self, fetched):
+        scraper, pages, error = fetched
+        if error is None:
+            start = time.monotonic()
+            try:
+                if self.parser_pool is not None:
+                    self.parser_pool.parse(scraper, pages)
+                else:
+                    scraper.parse(pages)
+            except Exception as e:
+                error = e
+            self.stats.setdefault(scraper.date, {})['parse_seconds'] = time.monotonic() - start
+        return self.check_scraped(scraper, error)
+
+    def check_scraped(self, scraper, error):
+        """Return the scraper, or None if scraping failed"""
+        if error is None:
+            return scraper
+        date = scraper.date
+        if isinstance(error, LookupError):
+            if not scraper.tracks:
+                log.info(f'No data found for date {date.strftime("%Y%m%d")} on {self.station.name}.')
+                return None
+            else:
+                raise error
+        exc_info = ''.join(traceback.format_exception(error))
+        msg = f'Uncaught exception occurred scraping {self.station.name} on {date.strftime("%Y%m%d")}:\n{exc_info}'
+        log.error(msg)
+        return None
+
+    def scraped(self, dates):
+        """Yield (date, scraper) pairs in the order of `dates`, where scraper
+        is None if the date could not be scraped.
+
+        With more than one backfill or parse worker, dates are fetched,
+        parsed and handed back in a pipeline, several of them concurrently.
+        Dates which haven't been started yet are abandoned once the caller
+        stops iterating."""
+        if self.backfill_workers <= 1 and self.parse_workers <= 1:
+            for date in dates:
+                yield date, self.parse_date(self.fetch_date(date))
+            return
+        pipeline = ScrapePipeline(
+            self.fetch_date, self.parse_date,
+            fetch_workers=self.backfill_workers,
+            parse_workers=self.parse_workers,
+            queue_size=self.queue_size)
+        try:
+            yield from pipeline.run(dates)
+        finally:
+            pipeline.log_stats(self.station.name)
+
     @property
     def date_range(self):
         """A list of dates to be processed"""
-        try:
-            latest = Play.objects.filter(
-                station=self.station).order_by('-time').first().local_time.date()
-        except AttributeError:
-            latest = self.station.start_date
+        latest = self.station.last_ingested_date
+        if latest is None:
+            # Stations which haven't been ingested into since watermarks
+            # were introduced (see the rebuild_watermarks command).
+            try:
+                latest = Play.objects.filter(
+                    station=self.station).order_by('-time').first().local_time.date()
+            except AttributeError:
+                latest = self.station.start_date
         return create_date_range(latest)
+
+    @property
+    def gap_range(self):
+        """A list of dates without plays, or with few plays compared to the
+        station's typical day, between its first and latest ingested day"""
+        local_tz = pytz.timezone(self.station.timezone)
+        counts = dict(
+            Play.objects.filter(station=self.station)
+            .annotate(day=TruncDate('time', tzinfo=local_tz))
+            .values('day').annotate(plays=Count('id'))
+            .values_list('day', 'plays'))
+        if not counts:
+            return []
+        to_date = self.station.last_ingested_date or max(counts)
+        return find_gap_dates(counts, min(counts), to_date, self.gap_ratio)
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+
+# Per station and date values, in output order, with their Prometheus help
+FIELDS = OrderedDict([
+    ('http_seconds', 'Time spent fetching pages'),
+    ('bytes_fetched', 'Bytes of page bodies fetched'),
+    ('parse_seconds', 'Time spent parsing pages'),
+    ('tracks_extracted', 'Tracks extracted from pages'),
+    ('db_seconds', 'Time spent storing tracks'),
+    ('songs_created', 'Songs created'),
+    ('plays_created', 'Plays created'),
+])
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class ScrapeMetrics(object):
+    """Collects per-stage timings and counts for every scraped station and
+    date. Each record is appended to a JSON lines file as it comes in, and
+    write_prometheus() dumps per-station totals in the Prometheus text
+    format for the node exporter's textfile collector."""
+
+    def __init__(self, jsonl_path=None):
+        self.jsonl_path = jsonl_path
+        self.totals = {}
+        self.extra = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, station, date, ok=True, **values):
+        record = OrderedDict([
+            ('time', time.time()),
+            ('station', station),
+            ('date', date.strftime('%Y-%m-%d')),
+            ('ok', ok),
+        ])
+        for field in FIELDS:
+            record[field] = values.get(field, 0)
+        with self._lock:
+            totals = self.totals.setdefault(station, dict.fromkeys(FIELDS, 0))
+            totals.setdefault('dates', 0)
+            totals.setdefault('failed_dates', 0)
+            for field in FIELDS:
+                totals[field] += record[field]
+            totals['dates'] += 1
+            totals['failed_dates'] += not ok
+            if self.jsonl_path:
+                with open(self.jsonl_path, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+        return record
+
+    def set_gauge(self, name, value, help_text):
+        """Add a process-wide value (e.g. a cache hit rate) to the dump"""
+        self.extra[name] = (value, help_text)
+
+    def prometheus_text(self):
+        lines = []
+        fields = list(FIELDS.items()) + [
+            ('dates', 'Dates scraped'), ('failed_dates', 'Dates which failed to scrape')]
+        with self._lock:
+            for field, help_text in fields:
+                name = f'radiostats_scrape_{field}'
+                lines.append(f'# HELP {name} {help_text} in the last scrape run.')
+                lines.append(f'# TYPE {name} gauge')
+                for station, totals in sorted(self.totals.items()):
+                    lines.append(f'{name}{{station="{_escape_label(station)}"}} {totals[field]}')
+            for field, (value, help_text) in self.extra.items():
+                name = f'radiostats_scrape_{field}'
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Write the text format file atomically, so the collector never
+        reads a partial file"""
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scraper', '0003_play_synced'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='station',
+            name='last_ingested_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='station',
+            name='last_play_time',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddIndex(
+            model_name='play',
+            index=models.Index(fields=['station', 'time'], name='play_station_time_idx'),
+        ),
+    ]
@@ -17,6 +17,9 @@ class Station(models.Model):
     start_date = models.DateField()
     last_scraped = models.DateTimeField(null=True)
     enabled = models.BooleanField(default=True)
+    # Scrape watermark: the latest local date and play time ingested
+    last_ingested_date = models.DateField(null=True)
+    last_play_time = models.DateTimeField(null=True)
 
     def __str__(self):
         return self.name
@@ -87,3 +90,4 @@ class Play(models.Model):
 
     class Meta:
         unique_together = (("time", "station"),)
+        indexes = [models.Index(fields=['station', 'time'], name='play_station_time_idx')]
@@ -0,0 +1,73 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import traceback
+
+import django
+
+def init_worker():
+    """Set up Django once per worker process. Scrapers are imported by the
+    first task needing them."""
+    django.setup()
+
+
+def parse_pages(class_name, date, pages):
+    """Parse pages fetched by a scraper, returning its tracks"""
+    from scraper import scrapers
+    scraper = getattr(scrapers, class_name)(date)
+    scraper.parse(pages)
+    return scraper.tracks
+
+
+def parse_archived(class_name, archive_dir, station_name, date):
+    """Parse the archived pages of a station's date. Returns the date, its
+    tracks (None if nothing was archived) and the error parsing them, if any."""
+    from scraper.archive import ResponseArchive
+    pages = ResponseArchive(archive_dir).read(station_name, date)
+    if pages is None:
+        return date, None, None
+    try:
+        return date, parse_pages(class_name, date, pages), None
+    except Exception:
+        return date, None, traceback.format_exc()
+
+
+def _warm_up():
+    return True
+
+
+class ParserPool(object):
+    """Pool of worker processes which turn fetched pages into tracks.
+
+    Parsing is CPU bound, so doing it in worker processes lets large
+    backfills use every core while fetching stays in the main process.
+    Workers are spawned (not forked, the scrape job runs threads) and
+    started eagerly so the first dates don't pay for Django's setup.
+    """
+
+    def __init__(self, processes):
+        self.processes = processes
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker)
+        for future in [self.executor.submit(_warm_up) for _ in range(processes)]:
+            future.result()
+
+    def parse(self, scraper, pages):
+        """Parse pages in a worker, storing the tracks on scraper"""
+        tracks = self.executor.submit(
+            parse_pages, type(scraper).__name__, scraper.date, pages).result()
+        scraper.tracks.extend(tracks)
+
+    def map(self, func, *iterables, chunksize=1):
+        """Call func over iterables in the workers, like Executor.map"""
+        return self.executor.map(func, *iterables, chunksize=chunksize)
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,161 @@
+import queue
+import threading
+import time
+
+import logbook
+
+log = logbook.Logger('pipeline')
+
+# How often blocked workers check whether the pipeline was stopped
+POLL_INTERVAL = 0.1
+
+
+class StageQueue(object):
+    """Bounded queue between two pipeline stages which keeps track of how
+    full it gets and how long producers were blocked on it"""
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.items = 0
+        self.depth_total = 0
+        self.max_depth = 0
+        self.blocked = 0.0
+        self._lock = threading.Lock()
+
+    def put(self, item, stopped):
+        start = time.monotonic()
+        while not stopped.is_set():
+            try:
+                self.queue.put(item, timeout=POLL_INTERVAL)
+            except queue.Full:
+                continue
+            depth = self.queue.qsize()
+            with self._lock:
+                self.items += 1
+                self.depth_total += depth
+                self.max_depth = max(self.max_depth, depth)
+                self.blocked += time.monotonic() - start
+            return True
+        return False
+
+    def get(self, stopped):
+        while not stopped.is_set():
+            try:
+                return self.queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return None
+
+    def stats(self):
+        return {
+            'items': self.items,
+            'max_depth': self.max_depth,
+            'mean_depth': self.depth_total / self.items if self.items else 0.0,
+            'blocked': self.blocked,
+        }
+
+
+class ScrapePipeline(object):
+    """Scrapes a list of dates in three stages connected by bounded queues:
+    fetch (network) -> parse (CPU) -> persist (the caller, in date order).
+
+    `fetch(date)` returns an item which is handed to `parse(item)`; whatever
+    that returns is yielded by `run()` together with its date, in the order
+    of the dates given. An exception raised by either stage is re-raised
+    to the caller when its date comes up. At most `window` dates are in
+    flight ahead of the date being persisted.
+    """
+
+    def __init__(self, fetch, parse, fetch_workers=4, parse_workers=1, queue_size=4):
+        self.fetch = fetch
+        self.parse = parse
+        self.fetch_workers = max(1, fetch_workers)
+        self.parse_workers = max(1, parse_workers)
+        self.queue_size = max(1, queue_size)
+        self.window = self.fetch_workers + self.parse_workers + 2 * self.queue_size
+        self.parse_queue = StageQueue('parse', self.queue_size)
+        self.persist_queue = StageQueue('persist', self.queue_size)
+        self.busy = {'fetch': 0.0, 'parse': 0.0}
+        self._busy_lock = threading.Lock()
+
+    def run(self, dates):
+        dates = list(dates)
+        stopped = threading.Event()
+        slots = threading.Semaphore(self.window)
+        feed = iter(enumerate(dates))
+        feed_lock = threading.Lock()
+
+        def timed(stage, func, *args):
+            start = time.monotonic()
+            try:
+                return func(*args), None
+            except Exception as e:
+                return None, e
+            finally:
+                with self._busy_lock:
+                    self.busy[stage] += time.monotonic() - start
+
+        def fetch_worker():
+            while not stopped.is_set():
+                if not slots.acquire(timeout=POLL_INTERVAL):
+                    continue
+                with feed_lock:
+                    index, date = next(feed, (None, None))
+                if index is None:
+                    return
+                item, error = timed('fetch', self.fetch, date)
+                if not self.parse_queue.put((index, date, item, error), stopped):
+                    return
+
+        def parse_worker():
+            while not stopped.is_set():
+                task = self.parse_queue.get(stopped)
+                if task is None:
+                    return
+                index, date, item, error = task
+                if error is None:
+                    item, error = timed('parse', self.parse, item)
+                if not self.persist_queue.put((index, date, item, error), stopped):
+                    return
+
+        threads = ([threading.Thread(target=fetch_worker, daemon=True)
+                    for _ in range(self.fetch_workers)]
+                   + [threading.Thread(target=parse_worker, daemon=True)
+                      for _ in range(self.parse_workers)])
+        for thread in threads:
+            thread.start()
+        done = {}
+        try:
+            for index in range(len(dates)):
+                while index not in done:
+                    task = self.persist_queue.get(stopped)
+                    done[task[0]] = task
+                _, date, result, error = done.pop(index)
+                if error is not None:
+                    raise error
+                yield date, result
+                # Only free the slot once the caller asks for the next date,
+                # so nothing new is fetched if it stops here.
+                slots.release()
+        finally:
+            stopped.set()
+            for thread in threads:
+                thread.join()
+
+    def stats(self):
+        """Busy time per stage and queue statistics, to find the bottleneck"""
+        return {
+            'fetch': {'workers': self.fetch_workers, 'busy': self.busy['fetch'],
+                      'queue': self.parse_queue.stats()},
+            'parse': {'workers': self.parse_workers, 'busy': self.busy['parse'],
+                      'queue': self.persist_queue.stats()},
+        }
+
+    def log_stats(self, name):
+        for stage, stats in self.stats().items():
+            queue_stats = stats['queue']
+            log.info(f'{name} {stage}: {stats["workers"]} workers busy {stats["busy"]:.1f}s, '
+                     f'output queue depth max {queue_stats["max_depth"]} '
+                     f'mean {queue_stats["mean_depth"]:.1f}, '
+                     f'blocked {queue_stats["blocked"]:.1f}s')
@@ -0,0 +1,90 @@
+import asyncio
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import time
+import traceback
+from urllib.parse import urlparse
+
+from django.db import close_old_connections
+import logbook
+
+log = logbook.Logger('scheduler')
+
+StationResult = namedtuple('StationResult', ['station', 'ok', 'elapsed', 'error'])
+
+
+def scraper_host(scraper_cls):
+    """Return the host a scraper class talks to, used to group stations
+    which share a website (e.g. all FluxFM streams or all Last.fm accounts)"""
+    host = getattr(scraper_cls, 'host', None)
+    if host:
+        return host
+    netloc = urlparse(getattr(scraper_cls, 'base_url', '') or '').netloc
+    return netloc or scraper_cls.__name__
+
+
+class ScrapeScheduler(object):
+    """Scrapes many stations concurrently inside a single process.
+
+    Runners are blocking (HTTP and ORM calls), so each station's runner is
+    executed in a worker thread while an asyncio event loop decides which
+    stations may run. `concurrency` bounds the number of stations scraped at
+    once, `per_host` bounds how many of those may target the same host.
+    """
+
+    def __init__(self, runner_factory, concurrency=8, per_host=2, on_complete=None):
+        self.runner_factory = runner_factory
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self.on_complete = on_complete
+
+    def host_for(self, station):
+        from scraper import scrapers
+        scraper_cls = getattr(scrapers, station.class_name, None)
+        if scraper_cls is None:
+            return station.class_name
+        return scraper_host(scraper_cls)
+
+    def run(self, stations):
+        """Scrape all stations, returning a list of StationResults in
+        order of completion"""
+        return asyncio.run(self._run_all(list(stations)))
+
+    async def _run_all(self, stations):
+        self._global = asyncio.Semaphore(self.concurrency)
+        self._hosts = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        self._results = []
+        self._total = len(stations)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            self._executor = executor
+            await asyncio.gather(*[self._run_station(station) for station in stations])
+        return self._results
+
+    async def _run_station(self, station):
+        # Wait for a host slot before taking a global one, so that stations
+        # queued behind a busy host don't block stations on idle hosts.
+        async with self._hosts[self.host_for(station)]:
+            async with self._global:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self._executor, self._run_runner, station)
+        self._results.append(result)
+        if result.ok:
+            log.info(f'Finished {station.name} in {result.elapsed:.1f}s '
+                     f'({len(self._results)}/{self._total})')
+        else:
+            log.error(f'Failed {station.name} after {result.elapsed:.1f}s '
+                      f'({len(self._results)}/{self._total}):\n{result.error}')
+        if self.on_complete is not None:
+            self.on_complete(result)
+
+    def _run_runner(self, station):
+        start = time.monotonic()
+        try:
+            self.runner_factory(station).run()
+        except Exception:
+            return StationResult(station, False, time.monotonic() - start, traceback.format_exc())
+        finally:
+            # Worker threads are reused, don't let them hold on to stale
+            # database connections between stations.
+            close_old_connections()
+        return StationResult(station, True, time.monotonic() - start, None)
@@ -0,0 +1,72 @@
+"""Registry of the scraper classes a Station's class_name can name.
+
+Each website's scrapers live in a module of their own, imported the first
+time one of its classes is looked up (getattr(scrapers, class_name) or
+get_scraper()), so scraping e.g. only Last.fm stations never imports
+BeautifulSoup.
+"""
+import importlib
+
+# Scraper class name: module of this package defining it
+SCRAPERS = {
+    'Antenne1Scraper': 'antenne1',
+    'BBC1XtraScraper': 'lastfm',
+    'BBC6MusicScraper': 'lastfm',
+    'BBCRadio1Scraper': 'lastfm',
+    'BBCRadio2Scraper': 'lastfm',
+    'BBCRadio3Scraper': 'lastfm',
+    'Beats1Scraper': 'lastfm',
+    'ByteFMScraper': 'lastfm',
+    'FluxFMBerlinScraper': 'fluxfm',
+    'FluxFMBremenScraper': 'fluxfm',
+    'FluxFMScraper': 'fluxfm',
+    'FluxFMWorldwideScraper': 'fluxfm',
+    'KEXPScraper': 'kexp',
+    'RadioNovaScraper': 'lastfm',
+    'SWR1Scraper': 'swr',
+    'SWR3Scraper': 'swr',
+    'Spin1038Scraper': 'lastfm',
+    'SunshineLiveScraper': 'sunshinelive',
+    'XFMUKScraper': 'lastfm',
+}
+# Base classes and helpers for writing scrapers
+_SHARED = {
+    'ScraperBase': 'base',
+    'GenericScraper': 'generic',
+    'GenericLastFMScraper': 'lastfm',
+    'available_parser': 'generic',
+    'css_class': 'generic',
+}
+
+
+def __getattr__(name):
+    module = SCRAPERS.get(name) or _SHARED.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'{__name__}.{module}'), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(SCRAPERS) | set(_SHARED))
+
+
+def get_scraper(class_name):
+    """The scraper class named class_name, importing its module if need be.
+    Raises LookupError if there's no such scraper."""
+    if class_name not in SCRAPERS:
+        raise LookupError(f'No scraper named {class_name}')
+    return __getattr__(class_name)
+
+
+def unresolved(stations):
+    """The (station, error) pairs of the stations whose scraper class can't
+    be loaded"""
+    retval = []
+    for station in stations:
+        try:
+            get_scraper(station.class_name)
+        except Exception as e:
+            retval.append((station, e))
+    return retval
@@ -0,0 +1,22 @@
+from bs4 import SoupStrainer
+
+from scraper.extraction import ExtractionSpec, Field
+from scraper.scrapers.generic import GenericScraper, css_class
+
+
+class Antenne1Scraper(GenericScraper):
+    base_url = ('http://www.antenne1.de/musik/on-air/playlist-was-lief-gerade/'
+                'ajax-skript.html?playstunde={hour}&playdatum={date:%d.%m.%Y}')
+    parse_only = SoupStrainer('div', class_=css_class('track'))
+    extraction = ExtractionSpec(
+        rows='div.track',
+        artist='p.artist',
+        title='p.title',
+        time=Field('p.playtime', remove='Uhr'),
+        time_format='%H:%M')
+
+    def parse(self, pages):
+        for _, body in pages:
+            html = body.replace('\\/', '/').replace('\\"', '"').strip('"')
+            self.soup = self.make_soup(html)
+            self.extract_tracks()
@@ -0,0 +1,33 @@
+import asyncio
+
+import logbook
+
+from scraper.lib import run_sync
+
+
+class ScraperBase(object):
+    def __init__(self, date):
+        self.date = date
+        self.tracks = []
+        self.log = logbook.Logger(type(self).__name__)
+
+    def fetch(self):
+        """Download everything needed to scrape self.date, returning a list of
+        (url, body) tuples. Scrapers implementing fetch_async() get this for
+        free."""
+        if type(self).fetch_async is ScraperBase.fetch_async:
+            raise NotImplementedError
+        return run_sync(self.fetch_async())
+
+    async def fetch_async(self):
+        """fetch() as a coroutine, so that a day's requests can be made
+        concurrently (see async_http_get). By default runs fetch() in a
+        thread."""
+        return await asyncio.to_thread(self.fetch)
+
+    def parse(self, pages):
+        """Populate self.tracks from the pages returned by fetch()"""
+        raise NotImplementedError
+
+    def scrape(self):
+        self.parse(self.fetch())
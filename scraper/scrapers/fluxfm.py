@@ -0,0 +1,27 @@
+from bs4 import SoupStrainer
+
+from scraper.extraction import ExtractionSpec, Field
+from scraper.scrapers.generic import GenericScraper
+
+
+class FluxFMScraper(GenericScraper):
+    base_url = 'http://www.fluxfm.de/fluxfm-playlist/?date={date:%Y-%m-%d}'
+    parse_only = SoupStrainer('table', id='songs')
+    extraction = ExtractionSpec(
+        rows='table#songs tr',
+        artist='span.artist',
+        title=Field('span.song', strip='- '),
+        time='td.time div',
+        time_format='%H:%M')
+
+
+class FluxFMBerlinScraper(FluxFMScraper):
+    cookies = {'mfmloc': 'berlin'}
+
+
+class FluxFMBremenScraper(FluxFMScraper):
+    cookies = {'mfmloc': 'bremen'}
+
+
+class FluxFMWorldwideScraper(FluxFMScraper):
+    cookies = {'mfmloc': 'world'}
@@ -0,0 +1,141 @@
+import asyncio
+from functools import partial
+import re
+
+from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+import requests
+
+from scraper.lib import async_http_get, retry_delay
+from scraper.scrapers.base import ScraperBase
+from scraper.timeparse import parse_clock
+
+
+def available_parser(*features):
+    """The first of the BeautifulSoup tree builders named by features which
+    is installed, e.g. available_parser('lxml', 'html.parser')"""
+    for feature in features:
+        if builder_registry.lookup(feature) is not None:
+            return feature
+    raise ValueError('None of the parsers {0} is installed'.format(', '.join(features)))
+
+
+def css_class(name):
+    """Match the elements having class name, for use in a SoupStrainer. While
+    parsing, a strainer sees the whole class attribute, so {'class': name}
+    would miss elements with several classes."""
+    return re.compile(r'(?:^|\s){0}(?:\s|$)'.format(re.escape(name)))
+
+
+class GenericScraper(ScraperBase):
+    cookies = {}
+    terminate_early = False
+    utc_datetimes = False
+    # Most of a day's pages requested at once, on top of the per host limit
+    # (HTTP_HOST_CONCURRENCY), and how often a page which failed is fetched
+    # again on its own before the day is scraped without it
+    concurrency = 4
+    page_retries = 2
+    # BeautifulSoup tree builder for the pages, and a SoupStrainer keeping
+    # only the elements extract_tracks() reads; everything else on a page is
+    # skipped without building a tree for it.
+    parser = available_parser('lxml', 'html.parser')
+    parse_only = None
+    # ExtractionSpec of the tracks on a page, read by extract_tracks()
+    extraction = None
+
+    @property
+    def tracklist_urls(self):
+        """base_url for self.date, once for every hour of the day if it has
+        an {hour} field"""
+        if '{hour' in self.base_url:
+            return [self.base_url.format(date=self.date, hour=hour) for hour in range(24)]
+        return [self.base_url.format(date=self.date)]
+
+    def time_to_datetime(self, text_time, split_char):
+        """Transform a text time into a datetime using appropriate date"""
+        return parse_clock(text_time, self.date, split_char)
+
+    async def fetch_async(self):
+        """General fetch workflow, requesting the tracklist urls concurrently.
+        Can be overridden if necessary."""
+        return await self.fetch_pages(
+            [(url, partial(async_http_get, url, cookies=self.cookies))
+             for url in self.tracklist_urls])
+
+    async def fetch_pages(self, pages):
+        """Fetch (url, request) pairs, request being a coroutine function
+        making the HTTP request for url which takes http_req's retries
+        argument, at most self.concurrency at a time. Returns the (url, body)
+        pages in the same order.
+
+        A page which fails is retried on its own, up to self.page_retries
+        times, while the others carry on. A page which still fails, or which
+        is e.g. not found, is logged and left out; the error is only raised
+        if every page failed. Any other error is raised once all pages are
+        done."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_page(url, request):
+            attempt = 0
+            while True:
+                async with semaphore:
+                    try:
+                        # Retries are made here, so that the semaphore isn't
+                        # held while waiting for one
+                        response = await request(retries=0)
+                        response.raise_for_status()
+                        return url, response.text
+                    except requests.RequestException as e:
+                        error = e
+                delay = retry_delay(url, attempt, error)
+                if delay is None or attempt == self.page_retries:
+                    self.log.error(f'Failed to fetch {url} ({error}), leaving it out')
+                    raise error
+                self.log.warning(f'Failed to fetch {url} ({error}), retrying in {delay:.1f}s')
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        results = await asyncio.gather(
+            *[fetch_page(url, request) for url, request in pages], return_exceptions=True)
+        for result in results:
+            if (isinstance(result, BaseException)
+                    and not isinstance(result, requests.RequestException)):
+                raise result
+        fetched = [result for result in results if not isinstance(result, BaseException)]
+        if results and not fetched:
+            raise results[0]
+        return fetched
+
+    def make_soup(self, body):
+        return BeautifulSoup(body, self.parser, parse_only=self.parse_only)
+
+    def parse(self, pages):
+        """General parse workflow. Can be overridden if necessary."""
+        for url, body in pages:
+            self.soup = self.make_soup(body)
+            result = self.extract_tracks()
+            if not result:
+                self.log.warn('No tracks found in url {0}'.format(url))
+
+    def extract_tracks(self):
+        """Add the tracks self.extraction finds in self.soup to self.tracks,
+        returning whether the page had any rows"""
+        if self.extraction is None:
+            raise NotImplementedError
+        rows = self.extraction.select_rows(self.soup, self.date)
+        self.tracks.extend(self.extract_rows(rows))
+        return len(rows) > 0
+
+    def extract_rows(self, rows):
+        """The tracks of rows selected by self.extraction"""
+        tracks = []
+        for row in rows:
+            try:
+                track = self.extraction.extract(row, self.date)
+            except (LookupError, ValueError):
+                self.log.error(u'Failed to extract track from: {0}'.format(row))
+                continue
+            if track is not None:
+                tracks.append(track)
+        return tracks
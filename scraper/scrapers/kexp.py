@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from scraper.jsonstream import iter_json_array, text_chunks
+from scraper.lib import http_get
+from scraper.scrapers.base import ScraperBase
+
+
+class KEXPScraper(ScraperBase):
+    cookies = {}
+    terminate_early = False
+    utc_datetimes = False # The responses make it look like UTC time, but it's actually local
+    base_url = 'https://legacy-api.kexp.org/play/?end_time={date}T23:59:59Z&limit=1000'
+
+    def __init__(self, date):
+        super(KEXPScraper, self).__init__(date)
+        self.url = self.base_url.format(
+            date=self.date.strftime('%Y-%m-%d')
+        )
+
+    def fetch(self):
+        return [(self.url, http_get(self.url).text)]
+
+    def parse(self, pages):
+        _, body = pages[0]
+        extracted = []
+
+        results = iter_json_array(text_chunks(body), ('results',), missing_ok=True)
+        for result in results:
+            if (result['playtype']['name'] == 'Media play' and
+                    result['track'] and result['artist']):
+                artist = result['artist']['name']
+                title = result['track']['name']
+                dt = datetime.fromtimestamp(result['epoch_airdate']/1000)
+                extracted.append((artist, title, dt))
+        if not extracted:
+            self.log.warn('No tracks found in url {0}'.format(self.url))
+        self.tracks.extend(extracted)
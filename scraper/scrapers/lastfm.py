@@ -0,0 +1,155 @@
+import asyncio
+import calendar
+from datetime import datetime
+import json
+import time
+
+from django.conf import settings
+
+from scraper.jsonstream import iter_json_array, text_chunks
+from scraper.lib import backoff_delay, host_slot, http_get, run_sync
+from scraper.scrapers.base import ScraperBase
+
+
+class GenericLastFMScraper(ScraperBase):
+    terminate_early = False
+    # Number of dates fetched at once by fetch_window when backfilling
+    window_days = 7
+    base_url = ('http://ws.audioscrobbler.com/2.0/?method=user.getrecenttracks'
+                '&user={user}&api_key={api_key}&from={start}&to={end}&format=json&limit=200')
+    utc_datetimes = True
+
+    def __init__(self, date):
+        super(GenericLastFMScraper, self).__init__(date)
+        self.start = datetime.combine(date, datetime.min.time())
+        self.end = datetime.combine(date, datetime.max.time())
+
+    @staticmethod
+    def _page_tracks(body):
+        """Iterate over the tracks of a page, decoding one at a time"""
+        return iter_json_array(text_chunks(body), ('recenttracks', 'track'))
+
+    @staticmethod
+    def _total_pages(body):
+        attr = json.loads(body)['recenttracks'].get('@attr', {})
+        return int(attr.get('totalPages', 1))
+
+    def _get_tracks(self, url, page):
+        """Return the (url, body) of a page of recent tracks, and whether it
+        has any tracks. Requests are paced by the ws.audioscrobbler.com rate
+        limit."""
+        page_url = url + '&page=%s' % page
+        attempt = 0
+        while True:
+            with host_slot(page_url):
+                body = http_get(page_url).text
+            try:
+                return (page_url, body), next(self._page_tracks(body), None) is not None
+            except LookupError:
+                # An error document, e.g. when the rate limit was exceeded
+                delay = backoff_delay(attempt)
+                self.log.error(f'Error getting tracks, retrying in {delay:.1f}s...')
+                time.sleep(delay)
+                attempt += 1
+
+    async def fetch_range(self, start, end):
+        """Fetch all pages of recent tracks played from start to end. Page 1
+        says how many pages there are, the rest are requested at once."""
+        url = self.base_url.format(
+            user=self.username, api_key=settings.LASTFM_API_KEY,
+            start=calendar.timegm(start.timetuple()),
+            end=calendar.timegm(end.timetuple()))
+        first_page, has_tracks = await asyncio.to_thread(self._get_tracks, url, 1)
+        if not has_tracks:
+            return []
+        total_pages = self._total_pages(first_page[1])
+        self.log.info(f'Scraping {total_pages} pages...')
+        rest = await asyncio.gather(
+            *[asyncio.to_thread(self._get_tracks, url, page)
+              for page in range(2, total_pages + 1)])
+        return [first_page] + [page for page, has_tracks in rest if has_tracks]
+
+    async def fetch_async(self):
+        return await self.fetch_range(self.start, self.end)
+
+    @classmethod
+    def fetch_window(cls, dates):
+        """Fetch the pages of several consecutive dates in one paginated
+        stream. Returns the pages of each date, holding only its own tracks,
+        so that every date parses and archives its tracks once."""
+        first, last = cls(min(dates)), cls(max(dates))
+        pages = run_sync(first.fetch_range(first.start, last.end))
+        return cls.split_pages(dates, pages)
+
+    @classmethod
+    def split_pages(cls, dates, pages):
+        """Split pages of several dates' recent tracks into the pages of each
+        date, leaving out the currently playing track"""
+        days = [cls(date) for date in dates]
+        retval = dict((date, []) for date in dates)
+        for url, body in pages:
+            buckets = {}
+            for track in cls._page_tracks(body):
+                if 'date' not in track:
+                    continue
+                utc_time = datetime.utcfromtimestamp(int(track['date']['uts']))
+                for day in days:
+                    if day.start <= utc_time <= day.end:
+                        buckets.setdefault(day.date, []).append(track)
+                        break
+            for date, tracks in buckets.items():
+                retval[date].append((url, json.dumps({'recenttracks': {'track': tracks}})))
+        return retval
+
+    def parse(self, pages):
+        for _, body in pages:
+            for track in self._page_tracks(body):
+                if 'date' not in track:
+                    # currently playing
+                    continue
+                artist = track['artist']['#text']
+                title = track['name']
+                utc_time = datetime.utcfromtimestamp(int(track['date']['uts']))
+                if not self.start <= utc_time <= self.end:
+                    continue
+                self.tracks.append((artist, title, utc_time))
+
+
+class ByteFMScraper(GenericLastFMScraper):
+    username = 'ByteFM'
+
+
+class BBC1XtraScraper(GenericLastFMScraper):
+    username = 'bbc1xtra'
+
+
+class BBC6MusicScraper(GenericLastFMScraper):
+    username = 'bbc6music'
+
+
+class BBCRadio1Scraper(GenericLastFMScraper):
+    username = 'bbcradio1'
+
+
+class BBCRadio2Scraper(GenericLastFMScraper):
+    username = 'bbcradio2'
+
+
+class BBCRadio3Scraper(GenericLastFMScraper):
+    username = 'bbcradio3'
+
+
+class Beats1Scraper(GenericLastFMScraper):
+    username = 'beats1radio'
+
+
+class RadioNovaScraper(GenericLastFMScraper):
+    username = 'RadioNovaFR'
+
+
+class Spin1038Scraper(GenericLastFMScraper):
+    username = 'spin1038'
+
+
+class XFMUKScraper(GenericLastFMScraper):
+    username = 'XFMUK'
@@ -0,0 +1,85 @@
+from functools import partial
+import re
+
+from bs4 import SoupStrainer
+
+from scraper.extraction import ExtractionSpec, Field
+from scraper.lib import async_http_get
+from scraper.scrapers.generic import GenericScraper
+
+
+class SunshineLiveScraper(GenericScraper):
+    base_url = ('http://www.sunshine-live.de/playlist?filterTime={date}%20{time}'
+                '&filterStream=studio&format=html'
+                '&zcmlimitstart={start_from}&ax=ok')
+    page_size = 25
+    # Pages requested at once; a busy day has about 16
+    page_window = 8
+    parse_only = SoupStrainer('article')
+    extraction = ExtractionSpec(
+        rows='article',
+        artist=Field('h5', remove='Artist:'),
+        title=Field('h4', remove='Titel:'),
+        time=Field('div.time', remove='UHR'),
+        time_format='%H:%M',
+        date=Field('div.date'),
+        date_format='%d.%m.%Y',
+        # dummy entries from lazy moderators/technical studio issues
+        exclude=[('sunshine live', 'electronic music radio')])
+
+    def day_entries(self, body):
+        """The markup of the entries of a playlist page for self.date. Found
+        with a text search rather than parsing the page, which is left to
+        parse() (and the parser pool)."""
+        date_text = re.compile(r'>\s*{0}\s*<'.format(re.escape(self.date.strftime('%d.%m.%Y'))))
+        return [entry for entry in re.findall(r'<article\b.*?</article>', body, re.S)
+                if date_text.search(entry)]
+
+    def page_tracks(self, body):
+        """Return the tracks on a playlist page played on self.date, or None
+        if the page has no entries for self.date at all"""
+        # Entries of the next day are skipped rather than ending the page, as
+        # the list is not necessarily ordered - see 30.07.2016 for example
+        rows = self.extraction.select_rows(self.make_soup(body), self.date)
+        if not rows:
+            return None
+        return self.extract_rows(rows)
+
+    def page_url(self, page):
+        return self.base_url.format(date=self.date.strftime('%d.%m.%Y'), time='00:00',
+                                    start_from=page * self.page_size)
+
+    async def fetch_async(self):
+        """Fetch windows of page_window pages at once until the day's entries
+        run out. The list isn't strictly ordered, so the end is the first page
+        without entries for self.date (or, should the site stop paginating,
+        without any new entries), not the first entry of the next day."""
+        date_string = self.date.strftime('%d.%m.%Y')
+        pages = []
+        seen = set()
+        first = 0
+        while True:
+            urls = [self.page_url(page) for page in range(first, first + self.page_window)]
+            window = await self.fetch_pages([(url, partial(async_http_get, url)) for url in urls])
+            for page, (url, body) in enumerate(window, first):
+                entries = self.day_entries(body)
+                if seen.issuperset(entries):
+                    self.log.info('No more tracks for {} on page {}'.format(date_string, page))
+                    return pages
+                seen.update(entries)
+                pages.append((url, body))
+            first += self.page_window
+
+    def parse(self, pages):
+        date_string = self.date.strftime('%d.%m.%Y')
+        seen = set()
+        for _, body in pages:
+            # Pages overlap when entries are added while they are fetched
+            for track in self.page_tracks(body) or []:
+                if track not in seen:
+                    seen.add(track)
+                    self.tracks.append(track)
+        if not self.tracks:
+            self.log.error('No tracks found for {}'.format(date_string))
+        else:
+            self.log.info('Collected {} tracks for {}'.format(len(self.tracks), date_string))
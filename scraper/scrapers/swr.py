@@ -0,0 +1,38 @@
+from functools import partial
+from urllib.parse import urlencode
+
+from bs4 import SoupStrainer
+
+from scraper.extraction import ExtractionSpec, Field
+from scraper.lib import async_http_post
+from scraper.scrapers.generic import GenericScraper, css_class
+
+
+class SWR1Scraper(GenericScraper):
+    base_url = ('https://www.swr.de/swr1/bw/playlist/index.html'
+                '?swx_time={hour:02}%3A00&swx_date={date:%Y-%m-%d}')
+    parse_only = SoupStrainer('div', class_=css_class('list-playlist-item'))
+    extraction = ExtractionSpec(
+        rows='div.list-playlist-item',
+        artist='dl dd.playlist-item-artist',
+        title='dl dd.playlist-item-song',
+        time=Field('time', attr='datetime'))
+
+
+class SWR3Scraper(GenericScraper):
+    base_url = 'https://www.swr3.de/playlisten/index.html'
+    parse_only = SoupStrainer('div', class_=css_class('list-playlist-item'))
+    extraction = ExtractionSpec(
+        rows='div.list-playlist-item',
+        artist='dd:nth-of-type(2)',
+        title='dd:nth-of-type(1)',
+        time=Field('time', attr='datetime'),
+        time_format='%Y-%m-%dT%H:%M')
+
+    async def fetch_async(self):
+        forms = [{'time': '{0:02d}:00'.format(hour), 'date': self.date.strftime('%Y-%m-%d')}
+                 for hour in range(24)]
+        return await self.fetch_pages(
+            [('{0}?{1}'.format(self.base_url, urlencode(form_data)),
+              partial(async_http_post, self.base_url, data=form_data))
+             for form_data in forms])
@@ -0,0 +1,60 @@
+"""Parsing of the timestamps found on playlist pages.
+
+Stations use a handful of fixed formats: ISO 8601 (`2020-01-15T07:04`) and
+clock times (`07:04`, `7:04:30`). Those are parsed by datetime.fromisoformat
+and by splitting them, which is many times faster than strptime() and
+dateutil's parser. Anything else falls back to those.
+"""
+from datetime import datetime, time
+import re
+
+from dateutil import parser as dateutil_parser
+
+# strptime directives which make a format carry a date
+_DATE_DIRECTIVES = re.compile(r'%[dmyYjbBUWaAcx]')
+_ISO_FORMATS = {'%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S'}
+_CLOCK_FORMATS = {'%H:%M', '%H:%M:%S'}
+
+
+def parse_datetime(text):
+    """A datetime from an ISO 8601 timestamp, or whatever dateutil makes of
+    any other text"""
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return dateutil_parser.parse(text)
+
+
+def parse_clock(text, day, separator=':'):
+    """The datetime of day at the clock time text, e.g. '07:04' or '7:04:30'"""
+    parts = text.split(separator)
+    try:
+        if len(parts) == 2:
+            return datetime(day.year, day.month, day.day, int(parts[0]), int(parts[1]))
+        if len(parts) == 3:
+            return datetime(day.year, day.month, day.day,
+                            int(parts[0]), int(parts[1]), int(parts[2]))
+    except ValueError:
+        pass
+    return dateutil_parser.parse(text, default=datetime.combine(day, time()))
+
+
+def timestamp_parser(format=None):
+    """A function parsing (text, day) into a datetime, for timestamps in the
+    strptime format given; dateutil guesses the format of those without one.
+    Times without a date are on day. The fast paths above are used for the
+    formats they cover."""
+    if format is None:
+        return lambda text, day: parse_datetime(text)
+    if format in _CLOCK_FORMATS:
+        return parse_clock
+    if format in _ISO_FORMATS:
+        def parse_iso(text, day):
+            try:
+                return datetime.fromisoformat(text)
+            except ValueError:
+                return datetime.strptime(text, format)
+        return parse_iso
+    if _DATE_DIRECTIVES.search(format):
+        return lambda text, day: datetime.strptime(text, format)
+    return lambda text, day: datetime.combine(day, datetime.strptime(text, format).time())
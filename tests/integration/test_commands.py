@@ -4,7 +4,7 @@ Integration tests for Django management commands.
 Compatible with Python 2.7 and 3.x
 """
 import pytest
-from datetime import datetime, date, timedelta
+from datetime import datetime, date, timedelta, timezone
 try:
     from unittest import mock
 except ImportError:
@@ -293,3 +293,115 @@ class TestPlayDocumentGeneration(object):
         
         reloaded = Play.objects.get(id=play.id)
         assert reloaded.synced
+
+
+@pytest.mark.django_db
+class TestRebuildWatermarksCommand(object):
+    """Integration tests for rebuild_watermarks management command."""
+
+    def test_command_sets_watermarks_from_plays(self):
+        station = Station.objects.create(
+            name='Watermark Station',
+            country='DE',
+            timezone='Europe/Berlin',
+            class_name='TestScraper',
+            start_date=date(2020, 1, 1)
+        )
+        empty_station = Station.objects.create(
+            name='Empty Station',
+            country='DE',
+            timezone='Europe/Berlin',
+            class_name='TestScraper',
+            start_date=date(2020, 1, 1),
+            last_ingested_date=date(2020, 5, 1)
+        )
+        song = Song.objects.create(artist='Artist', title='Title')
+        for hour in (12, 23):
+            play_time = datetime(2020, 3, 1, hour, 30, 0, tzinfo=timezone.utc)
+            Play.objects.create(local_time=play_time, time=play_time, song=song, station=station)
+
+        call_command('rebuild_watermarks')
+
+        station.refresh_from_db()
+        empty_station.refresh_from_db()
+        # 23:30 UTC is already the next day in Berlin
+        assert station.last_ingested_date == date(2020, 3, 2)
+        assert station.last_play_time == datetime(2020, 3, 1, 23, 30, 0, tzinfo=timezone.utc)
+        assert empty_station.last_ingested_date is None
+        assert empty_station.last_play_time is None
+
+
+FLUXFM_PAGE = u"""
+<table id="songs">
+  <tr><td class="time"><div>12:05</div></td>
+      <td><span class="artist">{artist}</span><span class="song">- Title 1</span></td></tr>
+  <tr><td class="time"><div>12:09</div></td>
+      <td><span class="artist">Artist 2</span><span class="song">- Title 2</span></td></tr>
+</table>
+"""
+
+
+@pytest.mark.django_db
+class TestReparseCommand(object):
+    """Integration tests for reparse management command."""
+
+    def test_command_stores_and_updates_archived_plays(self, tmp_path):
+        """Test that archived pages are parsed again and plays upserted."""
+        from scraper.archive import ResponseArchive
+        station = Station.objects.create(
+            name='FluxFM', country='DE', timezone='Europe/Berlin',
+            class_name='FluxFMScraper', start_date=date(2020, 1, 1))
+        archive = ResponseArchive(str(tmp_path))
+        archive.append('FluxFM', date(2020, 1, 1),
+                       [('http://www.fluxfm.de/', FLUXFM_PAGE.format(artist='Typo'))])
+        archive.append('FluxFM', date(2020, 1, 2),
+                       [('http://www.fluxfm.de/', FLUXFM_PAGE.format(artist='Artist 1'))])
+
+        call_command('reparse', station_name='FluxFM', archive_dir=str(tmp_path),
+                     processes=0)
+        assert Play.objects.filter(station=station).count() == 4
+        assert Play.objects.filter(song__artist='Typo').count() == 1
+
+        # The first day was archived again after fixing the page
+        archive.append('FluxFM', date(2020, 1, 1),
+                       [('http://www.fluxfm.de/', FLUXFM_PAGE.format(artist='Artist 1'))])
+        call_command('reparse', station_name='FluxFM', archive_dir=str(tmp_path),
+                     processes=0, from_date='2020-01-01', to_date='2020-01-01')
+        assert Play.objects.filter(station=station).count() == 4
+        assert Play.objects.filter(song__artist='Typo').count() == 0
+        assert Play.objects.filter(song__artist='Artist 1').count() == 2
+        station.refresh_from_db()
+        assert station.last_ingested_date == date(2020, 1, 2)
+
+    def test_command_needs_archive_dir(self):
+        """Test that the command refuses to run without an archive."""
+        from django.core.management.base import CommandError
+        with pytest.raises(CommandError):
+            call_command('reparse', archive_dir=None, processes=0)
+
+
+@pytest.mark.django_db
+class TestListScrapersCommand(object):
+    """Integration tests for list_scrapers management command."""
+
+    def test_command_lists_scrapers_and_their_stations(self):
+        Station.objects.create(name='FluxFM', country='DE', timezone='Europe/Berlin',
+                               class_name='FluxFMScraper', start_date=date(2020, 1, 1))
+        Station.objects.create(name='Old', country='DE', timezone='Europe/Berlin',
+                               class_name='GoneScraper', start_date=date(2020, 1, 1),
+                               enabled=False)
+        out = StringIO()
+        call_command('list_scrapers', stdout=out)
+        lines = out.getvalue().splitlines()
+        assert any(line.startswith('FluxFMScraper') and line.endswith('FluxFM')
+                   for line in lines)
+        assert any(line.startswith('KEXPScraper') for line in lines)
+
+    def test_command_fails_for_enabled_station_without_scraper(self):
+        from django.core.management.base import CommandError
+        Station.objects.create(name='Gone', country='DE', timezone='Europe/Berlin',
+                               class_name='GoneScraper', start_date=date(2020, 1, 1))
+        err = StringIO()
+        with pytest.raises(CommandError):
+            call_command('list_scrapers', stdout=StringIO(), stderr=err)
+        assert 'Gone: No scraper named GoneScraper' in err.getvalue()
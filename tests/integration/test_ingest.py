@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Integration tests for scraper.ingest.
+"""
+import pytest
+from datetime import datetime, date
+
+from scraper.ingest import SongCache, clean_tracks, ingest_bulk, ingest_rows
+from scraper.models import Station, Song, Play
+
+
+@pytest.fixture
+def station():
+    return Station.objects.create(
+        name='Ingest Station',
+        country='DE',
+        timezone='Europe/Berlin',
+        class_name='TestScraper',
+        start_date=date(2020, 1, 1)
+    )
+
+
+def day_tracks():
+    return [
+        ('Artist 1', 'Title 1', datetime(2020, 1, 1, 10, 0)),
+        ('Artist 2', 'Title 2', datetime(2020, 1, 1, 10, 4)),
+        ('Artist 1', 'Title 1', datetime(2020, 1, 1, 14, 30)),
+    ]
+
+
+class TestSongCache(object):
+    """Test cases for SongCache class."""
+
+    def test_hits_and_misses(self):
+        cache = SongCache(10)
+        assert cache.get(('Artist', 'Title')) is None
+        cache.set(('Artist', 'Title'), 1)
+        assert cache.get(('Artist', 'Title')) == 1
+        assert cache.hits == 1
+        assert cache.misses == 1
+        assert cache.hit_rate == 0.5
+
+    def test_evicts_least_recently_used(self):
+        cache = SongCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert len(cache) == 2
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+
+class TestCleanTracks(object):
+    """Test cases for clean_tracks function."""
+
+    def test_unescapes_and_deduplicates(self):
+        dt = datetime(2020, 1, 1, 12, 0)
+        tracks = [('Simon &amp; Garfunkel ', 'Mrs Robinson', dt)] * 2
+        assert clean_tracks(tracks) == [('Simon & Garfunkel', 'Mrs Robinson', dt)]
+
+    def test_drops_incomplete_tracks(self):
+        dt = datetime(2020, 1, 1, 12, 0)
+        assert clean_tracks([(' ', 'Title', dt), ('Artist', '', dt)]) == []
+
+    def test_truncates_to_field_length(self):
+        dt = datetime(2020, 1, 1, 12, 0)
+        (artist, title, _), = clean_tracks([('a' * 300, 't' * 300, dt)])
+        assert len(artist) == 255
+        assert len(title) == 255
+
+
+@pytest.mark.django_db
+class TestIngestBulk(object):
+    """Integration tests for ingest_bulk function."""
+
+    def test_creates_songs_and_plays(self, station):
+        result = ingest_bulk(station, day_tracks(), False)
+
+        assert result.songs_created == 2
+        assert result.plays_created == 3
+        assert result.plays_existing == 0
+        assert Song.objects.count() == 2
+        assert Play.objects.filter(station=station).count() == 3
+
+    def test_reuses_existing_songs(self, station):
+        Song.objects.create(artist='Artist 1', title='Title 1')
+        result = ingest_bulk(station, day_tracks(), False)
+
+        assert result.songs_created == 1
+        assert Song.objects.count() == 2
+
+    def test_second_ingest_reports_existing(self, station):
+        ingest_bulk(station, day_tracks(), False)
+        result = ingest_bulk(station, day_tracks(), False)
+
+        assert result.songs_created == 0
+        assert result.plays_created == 0
+        assert result.plays_existing == 3
+        assert Play.objects.filter(station=station).count() == 3
+
+    def test_matches_row_by_row_ingest(self, station):
+        ingest_rows(station, day_tracks(), False)
+        row_plays = sorted(Play.objects.values_list('local_time', 'time', 'song__title'))
+        Play.objects.all().delete()
+
+        ingest_bulk(station, day_tracks(), False)
+        bulk_plays = sorted(Play.objects.values_list('local_time', 'time', 'song__title'))
+        assert bulk_plays == row_plays
+
+    def test_advances_watermark(self, station):
+        ingest_bulk(station, day_tracks(), False)
+        station.refresh_from_db()
+
+        assert station.last_ingested_date == date(2020, 1, 1)
+        # 14:30 in Berlin
+        assert station.last_play_time == datetime(2020, 1, 1, 13, 30, tzinfo=station.last_play_time.tzinfo)
+
+    def test_watermark_never_moves_back(self, station):
+        ingest_bulk(station, day_tracks(), False)
+        ingest_rows(station, [('Old', 'Song', datetime(2019, 12, 1, 9, 0))], False)
+        station.refresh_from_db()
+
+        assert station.last_ingested_date == date(2020, 1, 1)
+        assert station.last_play_time.date() == date(2020, 1, 1)
+
+    def test_utc_datetimes(self, station):
+        tracks = [('Artist', 'Title', datetime(2020, 6, 1, 10, 0))]
+        ingest_bulk(station, tracks, True)
+
+        play = Play.objects.get()
+        assert play.time == datetime(2020, 6, 1, 10, 0, tzinfo=play.time.tzinfo)
+        assert play.time.utcoffset().total_seconds() == 0
+
+    @pytest.mark.parametrize('ingest', [ingest_rows, ingest_bulk])
+    def test_aware_datetimes(self, station, ingest):
+        """Test times scraped with an offset (e.g. SWR1's) keep it."""
+        from scraper.timeparse import parse_datetime
+        tracks = [('Artist', 'Title', parse_datetime('2020-01-15T07:04:00+01:00'))]
+        ingest(station, tracks, False)
+
+        play = Play.objects.get()
+        assert play.time == datetime(2020, 1, 15, 6, 4, tzinfo=play.time.tzinfo)
+        assert play.local_time == play.time
+
+
+@pytest.mark.django_db
+class TestIngestWithSongCache(object):
+    """Integration tests for ingestion backed by a SongCache."""
+
+    def test_bulk_populates_and_uses_cache(self, station, django_assert_num_queries,
+                                           django_capture_on_commit_callbacks):
+        cache = SongCache(100)
+        with django_capture_on_commit_callbacks(execute=True):
+            ingest_bulk(station, day_tracks(), False, cache)
+        assert len(cache) == 2
+
+        Play.objects.all().delete()
+        # savepoint, play lookup, play insert, watermark, release: no song queries
+        with django_assert_num_queries(5):
+            result = ingest_bulk(station, day_tracks(), False, cache)
+        assert result.songs_created == 0
+        assert result.plays_created == 3
+        assert cache.hits == 2
+
+    def test_rows_uses_cache(self, station, django_capture_on_commit_callbacks):
+        cache = SongCache(100)
+        with django_capture_on_commit_callbacks(execute=True):
+            ingest_rows(station, day_tracks(), False, cache)
+        assert cache.misses == 2
+        assert len(cache) == 2
+        assert Play.objects.filter(station=station).count() == 3
+
+        Play.objects.all().delete()
+        ingest_rows(station, day_tracks(), False, cache)
+        assert cache.hits == 3
+
+    @pytest.mark.parametrize('ingest', [ingest_rows, ingest_bulk])
+    def test_rolled_back_songs_not_cached(self, station, ingest,
+                                          django_capture_on_commit_callbacks):
+        """Test songs created by an ingest which failed aren't used by the next one."""
+        from django.db import IntegrityError
+        cache = SongCache(100)
+        other = Station.objects.create(
+            name='Other Station', country='DE', timezone='Europe/Berlin',
+            class_name='TestScraper', start_date=date(2020, 1, 1))
+        # Two plays at the same time: the ingest fails after creating the song
+        tracks = [('New Artist', 'New Title', datetime(2020, 1, 1, 9, 0)),
+                  ('New Artist', 'Other Title', datetime(2020, 1, 1, 9, 0))]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            with pytest.raises(IntegrityError):
+                ingest_rows(station, tracks, True, cache)
+        assert len(cache) == 0
+        assert not Song.objects.filter(artist='New Artist').exists()
+
+        with django_capture_on_commit_callbacks(execute=True):
+            result = ingest(other, tracks[:1], True, cache)
+        assert result.songs_created == 1
+        play = Play.objects.get(station=other)
+        assert (play.song.artist, play.song.title) == ('New Artist', 'New Title')
+        assert cache.get(('New Artist', 'New Title')) == play.song_id
+
+
+@pytest.mark.django_db
+class TestGapRange(object):
+    """Integration tests for GenericRunner.gap_range."""
+
+    def test_finds_missing_and_sparse_local_days(self, station):
+        from scraper.management.commands.scrape import GenericRunner
+        tracks = []
+        for day in (1, 2, 4, 5):
+            plays = 1 if day == 4 else 10
+            # 23:30 Berlin time is already the next day in UTC
+            tracks += [('Artist', 'Title', datetime(2020, 1, day, 23, 30 - i)) for i in range(plays)]
+        ingest_bulk(station, tracks, False)
+
+        runner = GenericRunner(station, fill_gaps=True)
+        assert runner.gap_range == [date(2020, 1, 4), date(2020, 1, 3)]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for scraper.archive.
+"""
+from datetime import date
+
+from scraper.archive import ResponseArchive
+
+PAGES = [('http://example.com/?hour=0', u'<html>Ä</html>'),
+         ('http://example.com/?hour=1', u'<html>Ö</html>')]
+
+
+class TestResponseArchive(object):
+    """Test cases for ResponseArchive class."""
+
+    def test_read_latest_fetch(self, tmp_path):
+        archive = ResponseArchive(str(tmp_path))
+        archive.append('Radio Eins', date(2020, 1, 1), PAGES[:1])
+        archive.append('Radio Eins', date(2020, 1, 1), PAGES)
+        assert archive.read('Radio Eins', date(2020, 1, 1)) == PAGES
+        assert archive.path('Radio Eins', date(2020, 1, 1)).endswith(
+            'radio-eins/2020/2020-01-01.jsonl.gz')
+
+    def test_read_missing(self, tmp_path):
+        archive = ResponseArchive(str(tmp_path))
+        assert archive.read('Radio Eins', date(2020, 1, 1)) is None
+
+    def test_truncated_append_ignored(self, tmp_path):
+        archive = ResponseArchive(str(tmp_path))
+        archive.append('Radio Eins', date(2020, 1, 1), PAGES)
+        with open(archive.path('Radio Eins', date(2020, 1, 1)), 'ab') as f:
+            f.write(b'\x1f\x8b\x08\x00')
+        assert archive.read('Radio Eins', date(2020, 1, 1)) == PAGES
+
+    def test_dates(self, tmp_path):
+        archive = ResponseArchive(str(tmp_path))
+        for day in [date(2019, 12, 31), date(2020, 1, 2), date(2020, 1, 1), date(2021, 1, 1)]:
+            archive.append('Radio Eins', day, PAGES)
+        assert archive.dates('Radio Eins') == [
+            date(2019, 12, 31), date(2020, 1, 1), date(2020, 1, 2), date(2021, 1, 1)]
+        assert archive.dates('Radio Eins', date(2020, 1, 1), date(2020, 12, 31)) == [
+            date(2020, 1, 1), date(2020, 1, 2)]
+        assert archive.dates('Other') == []
@@ -1,14 +1,17 @@
 from unittest import mock
+import time
 from datetime import date, datetime
 
 import pytz
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.core.exceptions import ObjectDoesNotExist
 
 from scraper.management.commands import scrape, normalize
+from scraper.ingest import IngestResult, SONG_CACHE
 from scraper.lib import create_date_range
 
 
+@override_settings(SCRAPE_METRICS_JSONL=None, SCRAPE_METRICS_PROM=None)
 class ScrapeTests(TestCase):
     @mock.patch('scraper.management.commands.scrape.GenericRunner')
     def test_handle_with_station(self, mock_runner):
@@ -21,25 +24,68 @@ class ScrapeTests(TestCase):
             command = scrape.Command()
             command.handle(station_name="test_station", dry_run=False, sequential=False)
 
-        mock_runner.assert_called_once_with(mock_station, dry_run=False)
+        mock_runner.assert_called_once_with(mock_station, dry_run=False, bulk=False, backfill_workers=1, parse_workers=1, queue_size=4,
+            fill_gaps=False, gap_ratio=0.5, parser_pool=None, metrics=mock.ANY, archive=None,
+            window_days=None)
         self.assertTrue(mock_runner.return_value.run.called)
 
-    @mock.patch('subprocess.Popen')
-    def test_handle_all_stations(self, mock_popen):
-        """Test that handle spawns processes for all enabled stations."""
+    @mock.patch('scraper.management.commands.scrape.ParserPool')
+    @mock.patch('scraper.management.commands.scrape.GenericRunner')
+    def test_handle_parse_workers_follow_parse_processes(self, mock_runner, mock_pool):
+        """Test that a parser pool gets a parse worker per process by default."""
+        mock_pool.return_value.__enter__.return_value = mock_pool.return_value
+        mock_pool.return_value.processes = 3
+
+        with mock.patch('scraper.models.Station.objects.filter') as mock_filter:
+            mock_filter.return_value = [mock.MagicMock()]
+            scrape.Command().handle(station_name="test_station", parse_processes=3)
+            self.assertEqual(mock_runner.call_args[1]['parse_workers'], 3)
+            scrape.Command().handle(station_name="test_station", parse_processes=3,
+                                    parse_workers=2)
+            self.assertEqual(mock_runner.call_args[1]['parse_workers'], 2)
+
+    @mock.patch('scraper.management.commands.scrape.GenericRunner')
+    def test_handle_all_stations(self, mock_runner):
+        """Test that handle runs every enabled station in-process."""
         mock_station1 = mock.MagicMock()
         mock_station1.name = "station1"
+        mock_station1.class_name = "FluxFMScraper"
         mock_station2 = mock.MagicMock()
         mock_station2.name = "station2"
+        mock_station2.class_name = "KEXPScraper"
 
         with mock.patch('scraper.models.Station.objects.filter') as mock_filter:
             mock_filter.return_value = [mock_station1, mock_station2]
             command = scrape.Command()
-            command.handle(station_name=None, dry_run=True, sequential=False)
+            command.handle(station_name=None, dry_run=True, sequential=False,
+                           concurrency=4, per_host=1)
+
+        self.assertEqual(mock_runner.call_count, 2)
+        mock_runner.assert_any_call(mock_station1, dry_run=True, bulk=False, backfill_workers=1, parse_workers=1, queue_size=4,
+            fill_gaps=False, gap_ratio=0.5, parser_pool=None, metrics=mock.ANY, archive=None,
+            window_days=None)
+        mock_runner.assert_any_call(mock_station2, dry_run=True, bulk=False, backfill_workers=1, parse_workers=1, queue_size=4,
+            fill_gaps=False, gap_ratio=0.5, parser_pool=None, metrics=mock.ANY, archive=None,
+            window_days=None)
+        self.assertEqual(mock_runner.return_value.run.call_count, 2)
 
-        self.assertEqual(mock_popen.call_count, 2)
-        mock_popen.assert_any_call(['python', mock.ANY, 'scrape', '-s', 'station1', '-d'])
-        mock_popen.assert_any_call(['python', mock.ANY, 'scrape', '-s', 'station2', '-d'])
+    @mock.patch('scraper.management.commands.scrape.GenericRunner')
+    def test_handle_skips_stations_without_scraper(self, mock_runner):
+        """Test that enabled stations whose scraper can't be loaded are left out."""
+        mock_station1 = mock.MagicMock()
+        mock_station1.name = "station1"
+        mock_station1.class_name = "KEXPScraper"
+        mock_station2 = mock.MagicMock()
+        mock_station2.name = "station2"
+        mock_station2.class_name = "GoneScraper"
+
+        with mock.patch('scraper.models.Station.objects.filter') as mock_filter:
+            mock_filter.return_value = [mock_station1, mock_station2]
+            command = scrape.Command()
+            command.handle(station_name=None, dry_run=True, sequential=True)
+
+        self.assertEqual(mock_runner.call_count, 1)
+        self.assertIs(mock_runner.call_args[0][0], mock_station1)
 
 
 class GenericRunnerTests(TestCase):
@@ -49,6 +95,10 @@ class GenericRunnerTests(TestCase):
         self.mock_station.class_name = "TestScraper"
         self.mock_station.timezone = "UTC"
         self.mock_station.start_date = date(2020, 1, 1)
+        self.mock_station.pk = 1
+        self.mock_station.last_ingested_date = None
+        self.mock_station.last_play_time = None
+        SONG_CACHE.clear()
 
     @mock.patch('scraper.lib.datetime')
     @mock.patch('scraper.models.Play.objects.filter')
@@ -73,6 +123,17 @@ class GenericRunnerTests(TestCase):
         runner = scrape.GenericRunner(self.mock_station)
         self.assertEqual(runner.date_range[0], date(2020, 1, 9))
 
+    @mock.patch('scraper.lib.datetime')
+    @mock.patch('scraper.models.Play.objects.filter')
+    def test_date_range_from_watermark(self, mock_filter, mock_datetime):
+        """Test date_range property uses the station's watermark without querying plays."""
+        mock_datetime.now.return_value.date.return_value = date(2020, 1, 10)
+        self.mock_station.last_ingested_date = date(2020, 1, 7)
+        runner = scrape.GenericRunner(self.mock_station)
+
+        self.assertEqual(runner.date_range, [date(2020, 1, 9), date(2020, 1, 8), date(2020, 1, 7)])
+        self.assertFalse(mock_filter.called)
+
     @mock.patch('scraper.management.commands.scrape.logbook')
     @mock.patch('scraper.management.commands.scrape.scrapers')
     @mock.patch('scraper.models.Song.objects.get_or_create')
@@ -93,13 +154,15 @@ class GenericRunnerTests(TestCase):
         runner.run()
 
         mock_scrapers.TestScraper.assert_called_once_with(date(2020, 1, 1))
-        mock_scraper_instance.scrape.assert_called_once()
+        mock_scraper_instance.fetch.assert_called_once()
+        mock_scraper_instance.parse.assert_called_once_with(mock_scraper_instance.fetch.return_value)
         mock_song_get_or_create.assert_called_once_with(artist='Artist', title='Title')
 
         # Check that the play was created with the correct time
         first_call_args = mock_play_get_or_create.call_args[1]
         self.assertEqual(first_call_args['station'], self.mock_station)
-        self.assertEqual(first_call_args['local_time'], datetime(2020, 1, 1, 12, 0))
+        # The station's wall clock time, stored in the default timezone
+        self.assertEqual(first_call_args['local_time'], datetime(2020, 1, 1, 12, 0, tzinfo=pytz.utc))
         self.assertEqual(first_call_args['time'].year, 2020)
         self.assertEqual(first_call_args['time'].month, 1)
         self.assertEqual(first_call_args['time'].day, 1)
@@ -142,6 +205,198 @@ class GenericRunnerTests(TestCase):
         self.assertTrue(self.mock_station.save.called)
 
 
+    @mock.patch('scraper.management.commands.scrape.logbook')
+    @mock.patch('scraper.management.commands.scrape.scrapers')
+    @mock.patch('scraper.management.commands.scrape.ingest_bulk')
+    def test_run_bulk_stops_on_duplicate(self, mock_ingest_bulk, mock_scrapers, mock_logbook):
+        """Test that bulk ingestion keeps the early termination behaviour."""
+        mock_scraper_instance = mock.MagicMock()
+        mock_scraper_instance.tracks = [('Artist', 'Title', datetime(2020, 1, 1, 12, 0))]
+        mock_scraper_instance.terminate_early = False
+        mock_scrapers.TestScraper.return_value = mock_scraper_instance
+        mock_ingest_bulk.return_value = IngestResult(0, 0, 1)
+
+        runner = scrape.GenericRunner(self.mock_station, bulk=True)
+        type(runner).date_range = mock.PropertyMock(return_value=[date(2020, 1, 1), date(2020, 1, 2)])
+        runner.run()
+
+        mock_ingest_bulk.assert_called_once_with(
+            self.mock_station, [('Artist', 'Title', datetime(2020, 1, 1, 12, 0))], mock.ANY, SONG_CACHE)
+        mock_scrapers.TestScraper.assert_called_once_with(date(2020, 1, 1))
+
+    @mock.patch('scraper.management.commands.scrape.logbook')
+    @mock.patch('scraper.management.commands.scrape.scrapers')
+    @mock.patch('scraper.management.commands.scrape.ingest_rows')
+    def test_run_backfill_ingests_in_date_order(self, mock_ingest_rows, mock_scrapers, mock_logbook):
+        """Test that concurrently scraped dates are ingested in date_range order."""
+        dates = [date(2020, 1, day) for day in range(10, 0, -1)]
+
+        def make_scraper(scrape_date):
+            scraper = mock.MagicMock()
+            scraper.date = scrape_date
+            scraper.terminate_early = False
+            scraper.tracks = [('Artist', 'Title', datetime(2020, 1, scrape_date.day, 12, 0))]
+            # Finish later dates first
+            scraper.fetch.side_effect = lambda: time.sleep(0.001 * scrape_date.day)
+            return scraper
+        mock_scrapers.TestScraper.side_effect = make_scraper
+        ingested = []
+        mock_ingest_rows.side_effect = lambda station, tracks, utc, cache: (
+            ingested.append(tracks[0][2].date()) or IngestResult(0, 1, 0))
+
+        runner = scrape.GenericRunner(self.mock_station, backfill_workers=4)
+        with mock.patch.object(scrape.GenericRunner, 'date_range', new_callable=mock.PropertyMock,
+                               return_value=dates):
+            runner.run()
+
+        self.assertEqual(ingested, dates)
+
+    @mock.patch('scraper.management.commands.scrape.logbook')
+    @mock.patch('scraper.management.commands.scrape.scrapers')
+    @mock.patch('scraper.management.commands.scrape.ingest_rows')
+    def test_run_parses_dates_concurrently(self, mock_ingest_rows, mock_scrapers, mock_logbook):
+        """Test that parse workers parse several dates at once without backfill workers."""
+        import threading
+        dates = [date(2020, 1, day) for day in range(6, 0, -1)]
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        class SlowParser(object):
+            def parse(self, scraper, pages):
+                with lock:
+                    in_flight[0] += 1
+                    in_flight[1] = max(in_flight)
+                time.sleep(0.02)
+                with lock:
+                    in_flight[0] -= 1
+
+        def make_scraper(scrape_date):
+            scraper = mock.MagicMock()
+            scraper.date = scrape_date
+            scraper.terminate_early = False
+            scraper.tracks = [('Artist', 'Title', datetime(2020, 1, scrape_date.day, 12, 0))]
+            return scraper
+        mock_scrapers.TestScraper.side_effect = make_scraper
+        mock_ingest_rows.return_value = IngestResult(0, 1, 0)
+
+        runner = scrape.GenericRunner(self.mock_station, parse_workers=3,
+                                      parser_pool=SlowParser())
+        with mock.patch.object(scrape.GenericRunner, 'date_range', new_callable=mock.PropertyMock,
+                               return_value=dates):
+            runner.run()
+
+        self.assertEqual(mock_ingest_rows.call_count, len(dates))
+        self.assertGreater(in_flight[1], 1)
+
+    @mock.patch('scraper.management.commands.scrape.logbook')
+    @mock.patch('scraper.management.commands.scrape.scrapers')
+    @mock.patch('scraper.management.commands.scrape.ingest_rows')
+    def test_run_fetches_windows_of_dates(self, mock_ingest_rows, mock_scrapers, mock_logbook):
+        """Test that scrapers with fetch_window get consecutive dates fetched at once."""
+        dates = [date(2020, 1, day) for day in range(5, 0, -1)]
+        windows = []
+
+        class WindowScraper(object):
+            terminate_early = False
+            utc_datetimes = True
+
+            def __init__(self, scrape_date):
+                self.date = scrape_date
+                self.tracks = []
+
+            @classmethod
+            def fetch_window(cls, window):
+                windows.append(window)
+                return dict((day, [('http://example.com', str(day))]) for day in window)
+
+            def parse(self, pages):
+                self.tracks.append(('Artist', 'Title', datetime(2020, 1, self.date.day, 12, 0)))
+
+        mock_scrapers.TestScraper = WindowScraper
+        ingested = []
+        mock_ingest_rows.side_effect = lambda station, tracks, utc, cache: (
+            ingested.append(tracks[0][2].date()) or IngestResult(0, 1, 0))
+
+        for backfill_workers in (1, 3):
+            windows[:] = ingested[:] = []
+            archive = mock.Mock()
+            runner = scrape.GenericRunner(self.mock_station, window_days=3,
+                                          backfill_workers=backfill_workers, archive=archive)
+            with mock.patch.object(scrape.GenericRunner, 'date_range',
+                                   new_callable=mock.PropertyMock, return_value=dates):
+                runner.run()
+
+            self.assertEqual(sorted(windows), [tuple(dates[3:]), tuple(dates[:3])])
+            self.assertEqual(ingested, dates)
+            # Every date archives its own pages only
+            for call in archive.append.call_args_list:
+                _, day, pages = call[0]
+                self.assertEqual(pages, [('http://example.com', str(day))])
+            self.assertEqual(archive.append.call_count, len(dates))
+            self.assertEqual(runner.window_fetches, {})
+
+    @mock.patch('scraper.management.commands.scrape.logbook')
+    @mock.patch('scraper.management.commands.scrape.scrapers')
+    @mock.patch('scraper.management.commands.scrape.ingest_rows')
+    def test_run_backfill_stops_on_duplicate(self, mock_ingest_rows, mock_scrapers, mock_logbook):
+        """Test that backfill stops scheduling dates once a date was already ingested."""
+        dates = [date(2020, 1, day) for day in range(20, 0, -1)]
+        mock_scraper_instance = mock.MagicMock()
+        mock_scraper_instance.tracks = [('Artist', 'Title', datetime(2020, 1, 1, 12, 0))]
+        mock_scraper_instance.terminate_early = False
+        mock_scrapers.TestScraper.return_value = mock_scraper_instance
+        mock_ingest_rows.return_value = IngestResult(0, 0, 1)
+
+        runner = scrape.GenericRunner(self.mock_station, backfill_workers=3, queue_size=1)
+        with mock.patch.object(scrape.GenericRunner, 'date_range', new_callable=mock.PropertyMock,
+                               return_value=dates):
+            runner.run()
+
+        self.assertEqual(mock_ingest_rows.call_count, 1)
+        # Only the lookahead window (workers plus queues) was ever scraped
+        self.assertLessEqual(mock_scrapers.TestScraper.call_count, 6)
+
+    @mock.patch('scraper.management.commands.scrape.logbook')
+    @mock.patch('scraper.management.commands.scrape.scrapers')
+    @mock.patch('scraper.management.commands.scrape.ingest_rows')
+    def test_run_fill_gaps_scrapes_every_gap(self, mock_ingest_rows, mock_scrapers, mock_logbook):
+        """Test that filling gaps doesn't stop at an already filled gap."""
+        gaps = [date(2020, 3, 1), date(2020, 2, 1), date(2020, 1, 1)]
+        mock_scraper_instance = mock.MagicMock()
+        mock_scraper_instance.tracks = [('Artist', 'Title', datetime(2020, 1, 1, 12, 0))]
+        mock_scrapers.TestScraper.return_value = mock_scraper_instance
+        mock_ingest_rows.return_value = IngestResult(0, 0, 1)
+
+        runner = scrape.GenericRunner(self.mock_station, fill_gaps=True)
+        with mock.patch.object(scrape.GenericRunner, 'gap_range', new_callable=mock.PropertyMock,
+                               return_value=gaps):
+            runner.run()
+
+        self.assertEqual([c[0][0] for c in mock_scrapers.TestScraper.call_args_list], gaps)
+
+    @mock.patch('scraper.management.commands.scrape.logbook')
+    @mock.patch('scraper.management.commands.scrape.scrapers')
+    @mock.patch('scraper.management.commands.scrape.ingest_rows')
+    def test_run_records_metrics(self, mock_ingest_rows, mock_scrapers, mock_logbook):
+        """Test that every scraped date is reported to the metrics collector."""
+        mock_scraper_instance = mock.MagicMock()
+        mock_scraper_instance.tracks = [('Artist', 'Title', datetime(2020, 1, 1, 12, 0))]
+        mock_scraper_instance.terminate_early = False
+        mock_scraper_instance.date = date(2020, 1, 1)
+        mock_scraper_instance.fetch.return_value = [('http://example.com', u'<html>\u00e9</html>')]
+        mock_scrapers.TestScraper.return_value = mock_scraper_instance
+        mock_ingest_rows.return_value = IngestResult(1, 1, 0)
+        metrics = mock.MagicMock()
+
+        runner = scrape.GenericRunner(self.mock_station, metrics=metrics)
+        type(runner).date_range = mock.PropertyMock(return_value=[date(2020, 1, 1)])
+        runner.run()
+
+        metrics.record.assert_called_once_with(
+            'test_station', date(2020, 1, 1), ok=True,
+            http_seconds=mock.ANY, bytes_fetched=15, parse_seconds=mock.ANY,
+            tracks_extracted=1, db_seconds=mock.ANY, songs_created=1, plays_created=1)
+
 class NormalizeTests(TestCase):
     def setUp(self):
         self.command = normalize.Command()
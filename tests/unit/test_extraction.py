@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for scraper.extraction.
+"""
+from datetime import date, datetime
+
+import pytest
+from bs4 import BeautifulSoup
+
+from scraper.extraction import ExtractionSpec, Field
+
+DAY = date(2020, 1, 15)
+
+
+def row(html):
+    return BeautifulSoup(html, 'html.parser')
+
+
+class TestField(object):
+
+    def test_text(self):
+        assert Field('span.artist').extract(row('<span class="artist"> Nena </span>')) == 'Nena'
+
+    def test_attribute(self):
+        field = Field('time', attr='datetime')
+        assert field.extract(row('<time datetime="2020-01-15T07:04">07:04</time>')) == '2020-01-15T07:04'
+
+    def test_remove_and_strip(self):
+        assert Field('p', remove='Uhr').extract(row('<p>07:04 Uhr</p>')) == '07:04'
+        assert Field('span', strip='- ').extract(row('<span>- Dreams</span>')) == 'Dreams'
+
+    def test_missing(self):
+        with pytest.raises(LookupError):
+            Field('span.artist').extract(row('<span class="song">Dreams</span>'))
+        with pytest.raises(LookupError):
+            Field('time', attr='datetime').extract(row('<time>07:04</time>'))
+
+
+class TestExtractionSpec(object):
+
+    def test_time_without_date_gets_the_day(self):
+        spec = ExtractionSpec(rows='li', artist='b', title='i', time='span', time_format='%H:%M')
+        soup = row('<ul><li><b>Nena</b><i>99 Luftballons</i><span>7:04</span></li></ul>')
+        rows = spec.select_rows(soup, DAY)
+        assert [spec.extract(r, DAY) for r in rows] == [
+            ('Nena', '99 Luftballons', datetime(2020, 1, 15, 7, 4))]
+
+    def test_time_with_date(self):
+        spec = ExtractionSpec(rows='li', artist='b', title='i', time=Field('time', attr='datetime'),
+                              time_format='%Y-%m-%dT%H:%M')
+        track = spec.extract(row('<li><b>a</b><i>t</i><time datetime="2020-01-14T23:58"></time></li>'), DAY)
+        assert track[2] == datetime(2020, 1, 14, 23, 58)
+
+    def test_time_guessed_without_format(self):
+        spec = ExtractionSpec(rows='li', artist='b', title='i', time='span')
+        track = spec.extract(row('<li><b>a</b><i>t</i><span>2020-01-15 07:04:30</span></li>'), DAY)
+        assert track[2] == datetime(2020, 1, 15, 7, 4, 30)
+
+    def test_rows_of_other_days_left_out(self):
+        spec = ExtractionSpec(rows='li', artist='b', title='i', time='span', time_format='%H:%M',
+                              date='em', date_format='%d.%m.%Y')
+        soup = row('<ul><li><em>15.01.2020</em><b>a</b><i>t</i><span>23:59</span></li>'
+                   '<li><em>16.01.2020</em><b>a</b><i>t</i><span>00:01</span></li>'
+                   '<li><b>no date</b></li></ul>')
+        assert len(spec.select_rows(soup, DAY)) == 1
+        assert spec.select_rows(soup, date(2020, 1, 17)) == []
+
+    def test_excluded_tracks(self):
+        spec = ExtractionSpec(rows='li', artist='b', title='i', time='span', time_format='%H:%M',
+                              exclude=[('Sunshine Live', 'Electronic Music Radio')])
+        assert spec.extract(
+            row('<li><b>SUNSHINE LIVE</b><i>electronic music radio</i><span>07:00</span></li>'),
+            DAY) is None
+
+    def test_bad_time(self):
+        spec = ExtractionSpec(rows='li', artist='b', title='i', time='span', time_format='%H:%M')
+        with pytest.raises(ValueError):
+            spec.extract(row('<li><b>a</b><i>t</i><span>soon</span></li>'), DAY)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for scraper.httpcache and its use by scraper.lib.http_req.
+"""
+import os
+from datetime import date, timedelta
+from unittest import mock
+
+import pytest
+import requests
+
+from scraper import lib
+from scraper.httpcache import FOREVER, ResponseCache, cache_key, scraping_date
+
+PAST = date(2020, 1, 1)
+
+
+def make_response(url, body=u'<html>Ä</html>', status=200, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    response.encoding = 'utf-8'
+    response.headers = requests.structures.CaseInsensitiveDict(headers or {})
+    response._content = body.encode('utf-8')
+    return response
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path))
+
+
+@pytest.fixture
+def use_cache(cache):
+    with mock.patch.object(lib, 'RESPONSE_CACHE', cache):
+        yield cache
+
+
+class TestCacheKey(object):
+
+    def test_same_request_same_key(self):
+        assert (cache_key('get', 'http://a/', {'b': 1, 'a': 2})
+                == cache_key('GET', 'http://a/', {'a': 2, 'b': 1}))
+
+    def test_differences_change_key(self):
+        key = cache_key('get', 'http://a/')
+        assert cache_key('post', 'http://a/') != key
+        assert cache_key('get', 'http://a/?x=1') != key
+        assert cache_key('get', 'http://a/', 'body') != key
+        assert cache_key('get', 'http://a/', cookies={'mfmloc': 'berlin'}) != key
+
+
+class TestResponseCache(object):
+
+    def test_ttl(self, tmp_path):
+        cache = ResponseCache(str(tmp_path), ttls=[(r'kexp\.org', 60)], recent_ttl=10)
+        assert cache.ttl('https://api.kexp.org/v2/plays/') == 60
+        assert cache.ttl('https://www.swr3.de/') is None
+        with scraping_date(PAST):
+            assert cache.ttl('https://www.swr3.de/') == FOREVER
+        with scraping_date(date.today()):
+            assert cache.ttl('https://www.swr3.de/') == 10
+        with scraping_date(date.today() - timedelta(days=1)):
+            assert cache.ttl('https://www.swr3.de/') == 10
+
+    def test_round_trip(self, cache):
+        with scraping_date(PAST):
+            cache.put('abc', make_response('http://example.com/', headers={'ETag': '"1"'}))
+        cached = cache.get('abc')
+        assert cached.fresh
+        response = cached.response()
+        assert response.text == u'<html>Ä</html>'
+        assert response.headers['etag'] == '"1"'
+        assert cache.hits == 1
+
+    def test_not_cached_without_ttl_or_on_error(self, cache):
+        cache.put('abc', make_response('http://example.com/'))
+        with scraping_date(PAST):
+            cache.put('def', make_response('http://example.com/', status=500))
+        assert cache.get('abc') is None
+        assert cache.get('def') is None
+        assert cache.misses == 2
+
+    def test_unreadable_entry_dropped(self, cache):
+        path = cache.path('abc')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(b'garbage')
+        assert cache.get('abc') is None
+        assert not os.path.exists(path)
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = ResponseCache(str(tmp_path), max_bytes=1500)
+        body = os.urandom(300).hex()
+        with scraping_date(PAST):
+            for i, key in enumerate(['aa1', 'bb2', 'cc3']):
+                cache.put(key, make_response(f'http://example.com/{i}', body))
+                os.utime(cache.path(key), (i, i))
+            # Reading aa1 makes bb2 the least recently used entry
+            cache.get('aa1')
+            cache.put('dd4', make_response('http://example.com/3', body))
+        assert cache.get('bb2') is None
+        assert cache.get('aa1') is not None
+        assert cache.get('dd4') is not None
+        assert cache._size <= 1350
+
+
+class TestCachedHttpReq(object):
+
+    @mock.patch('scraper.lib.requests.Session.request')
+    def test_fresh_response_served_from_cache(self, mock_request, use_cache):
+        mock_request.return_value = make_response('http://example.com/')
+        with scraping_date(PAST):
+            first = lib.http_get('http://example.com/')
+            second = lib.http_get('http://example.com/')
+        assert mock_request.call_count == 1
+        assert first.text == second.text
+        assert use_cache.hit_rate == 0.5
+
+    @mock.patch('scraper.lib.requests.Session.request')
+    def test_cookies_are_part_of_the_key(self, mock_request, use_cache):
+        mock_request.return_value = make_response('http://example.com/')
+        with scraping_date(PAST):
+            lib.http_get('http://example.com/', cookies={'mfmloc': 'berlin'})
+            lib.http_get('http://example.com/', cookies={'mfmloc': 'bremen'})
+        assert mock_request.call_count == 2
+
+    @mock.patch('scraper.lib.requests.Session.request')
+    def test_stale_response_revalidated(self, mock_request, use_cache):
+        use_cache.recent_ttl = -1
+        mock_request.side_effect = [
+            make_response('http://example.com/', headers={'ETag': '"v1"'}),
+            make_response('http://example.com/', body=u'', status=304),
+        ]
+        with scraping_date(date.today()):
+            lib.http_get('http://example.com/')
+            response = lib.http_get('http://example.com/')
+        assert response.status_code == 200
+        assert response.text == u'<html>Ä</html>'
+        assert mock_request.call_args[1]['headers']['If-None-Match'] == '"v1"'
+        assert use_cache.revalidated == 1
+        assert use_cache.misses == 1
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for scraper.jsonstream.
+"""
+import json
+
+import pytest
+
+from scraper.jsonstream import iter_json_array, text_chunks
+
+DOCUMENT = {
+    'next': 'https://legacy-api.kexp.org/play/?offset=3',
+    'meta': {'results': 'not this one', 'nested': [1, {'a': [2]}]},
+    'results': [{'artist': u'Sigur Rós "live"', 'n': i * 1.5, 'ok': i % 2 == 0}
+                for i in range(50)],
+    'count': 50,
+}
+
+
+class TestIterJsonArray(object):
+    """Test cases for iter_json_array function."""
+
+    @pytest.mark.parametrize('size', [1, 2, 7, 100, 1000000])
+    def test_any_chunk_size(self, size):
+        body = json.dumps(DOCUMENT, indent=2)
+        assert list(iter_json_array(text_chunks(body, size), ['results'])) == DOCUMENT['results']
+
+    def test_nested_path(self):
+        body = json.dumps({'recenttracks': {'@attr': {'page': '1'}, 'track': [{'name': 'a'}]}})
+        assert list(iter_json_array(text_chunks(body, 3), ['recenttracks', 'track'])) == [
+            {'name': 'a'}]
+
+    def test_single_object(self):
+        body = json.dumps({'recenttracks': {'track': {'name': 'a'}}})
+        assert list(iter_json_array([body], ['recenttracks', 'track'])) == [{'name': 'a'}]
+
+    def test_numbers_split_across_chunks(self):
+        assert list(iter_json_array(['{"results": [1, 22', '3, 4]}'], ['results'])) == [1, 223, 4]
+
+    def test_empty_and_null(self):
+        assert list(iter_json_array(['{"results": []}'], ['results'])) == []
+        assert list(iter_json_array(['{"results": null}'], ['results'])) == []
+
+    def test_missing_key(self):
+        with pytest.raises(KeyError):
+            list(iter_json_array(['{"error": 29, "message": "Rate limit"}'],
+                                 ['recenttracks', 'track']))
+        with pytest.raises(KeyError):
+            list(iter_json_array(['{}'], ['results']))
+        assert list(iter_json_array(['{"error": 29}'], ['results'], missing_ok=True)) == []
+
+    def test_stops_reading_when_iteration_stops(self):
+        def chunks():
+            yield '{"results": [{"a": 1}, '
+            raise AssertionError('read too far')
+        assert next(iter_json_array(chunks(), ['results'])) == {'a': 1}
+
+    def test_invalid_json(self):
+        with pytest.raises(ValueError):
+            list(iter_json_array(['{"results": [1, }'], ['results']))
@@ -59,6 +59,43 @@ class TestCreateDateRange(object):
             assert result[0] > result[-1]
 
 
+class TestDateWindows(object):
+    """Test cases for date_windows function."""
+
+    def test_consecutive_dates(self):
+        dates = [date(2020, 1, day) for day in range(7, 0, -1)]
+        assert lib.date_windows(dates, 3) == [tuple(dates[:3]), tuple(dates[3:6]), (dates[6],)]
+
+    def test_gaps_split_windows(self):
+        dates = [date(2020, 1, 10), date(2020, 1, 9), date(2020, 1, 5), date(2020, 1, 4)]
+        assert lib.date_windows(dates, 7) == [tuple(dates[:2]), tuple(dates[2:])]
+
+    def test_empty(self):
+        assert lib.date_windows([], 7) == []
+
+
+class TestFindGapDates(object):
+    """Test cases for find_gap_dates function."""
+
+    def test_missing_and_sparse_days(self):
+        counts = {
+            date(2020, 1, 1): 300,
+            date(2020, 1, 2): 310,
+            date(2020, 1, 4): 20,
+            date(2020, 1, 5): 290,
+        }
+        result = lib.find_gap_dates(counts, date(2020, 1, 1), date(2020, 1, 5))
+        assert result == [date(2020, 1, 4), date(2020, 1, 3)]
+
+    def test_ratio(self):
+        counts = {date(2020, 1, 1): 100, date(2020, 1, 2): 80, date(2020, 1, 3): 100}
+        assert lib.find_gap_dates(counts, date(2020, 1, 1), date(2020, 1, 3), 0.5) == []
+        assert lib.find_gap_dates(counts, date(2020, 1, 1), date(2020, 1, 3), 0.9) == [date(2020, 1, 2)]
+
+    def test_no_plays(self):
+        assert lib.find_gap_dates({}, date(2020, 1, 1), date(2020, 1, 3)) == []
+
+
 class TestUtcDatetime(object):
     """Test cases for utc_datetime function."""
 
@@ -124,6 +161,56 @@ class TestUtcDatetime(object):
             assert result.tzinfo == pytz.utc
 
 
+class TestStationTimezone(object):
+    """Test cases for StationTimezone class."""
+
+    def test_matches_pytz_localize(self):
+        berlin = pytz.timezone('Europe/Berlin')
+        converter = lib.StationTimezone('Europe/Berlin')
+        datetimes = [datetime(2020, 1, 1, 12, 0), datetime(2020, 7, 1, 12, 30, 15),
+                     datetime(2020, 7, 1, 23, 59)]
+        for (local, utc), dt in zip(converter.convert(datetimes), datetimes):
+            assert local == berlin.localize(dt)
+            assert str(local) == str(berlin.localize(dt))
+            assert utc == berlin.localize(dt).astimezone(pytz.utc)
+            assert utc.tzinfo == pytz.utc
+
+    def test_utc_datetimes(self):
+        converter = lib.StationTimezone('America/New_York')
+        (local, utc), = converter.convert([datetime(2020, 1, 1, 17, 0)], utc_datetimes=True)
+        assert utc == pytz.utc.localize(datetime(2020, 1, 1, 17, 0))
+        assert local.hour == 12
+        assert local.tzname() == 'EST'
+
+    def test_ambiguous_time(self):
+        """Times repeated when clocks go back are standard time by default."""
+        dt = datetime(2020, 10, 25, 2, 30)
+        (_, utc), = lib.StationTimezone('Europe/Berlin').convert([dt])
+        assert utc == pytz.utc.localize(datetime(2020, 10, 25, 1, 30))
+        (_, utc), = lib.StationTimezone('Europe/Berlin', is_dst=True).convert([dt])
+        assert utc == pytz.utc.localize(datetime(2020, 10, 25, 0, 30))
+
+    def test_non_existent_time(self):
+        """Times skipped when clocks go forward are moved forward."""
+        (local, utc), = lib.StationTimezone('Europe/Berlin').convert([datetime(2020, 3, 29, 2, 30)])
+        assert utc == pytz.utc.localize(datetime(2020, 3, 29, 1, 30))
+        assert local.hour == 3
+
+    def test_aware_datetimes(self):
+        """Times scraped with an offset keep it."""
+        from scraper.timeparse import parse_datetime
+        dt = parse_datetime('2020-01-15T07:04:00+01:00')
+        utc = pytz.utc.localize(datetime(2020, 1, 15, 6, 4))
+        converter = lib.StationTimezone('America/New_York')
+        assert converter.convert([dt]) == [(dt, utc)]
+        (local, utc_time), = converter.convert([dt], utc_datetimes=True)
+        assert utc_time == utc
+        assert local.hour == 1
+
+    def test_station_timezone_is_shared(self):
+        assert lib.station_timezone('Europe/Paris') is lib.station_timezone('Europe/Paris')
+
+
 class TestLocalizeDatetime(object):
     """Test cases for localize_datetime function."""
 
@@ -146,10 +233,147 @@ class TestLocalizeDatetime(object):
         assert result.hour == 12
 
 
+class TestSessionPool(object):
+    """Test cases for the per-host HTTP session pool."""
+
+    def test_session_per_host(self):
+        pool = lib.SessionPool()
+        session = pool.session('https://example.com/a')
+        assert pool.session('https://example.com/b?c=d') is session
+        assert pool.session('https://example.org/a') is not session
+        assert pool.session('http://example.com/a') is not session
+
+    def test_host_pool_size(self):
+        pool = lib.SessionPool(pool_maxsize=3, host_pool_sizes={'example.org': 7})
+        default = pool.session('https://example.com/').get_adapter('https://example.com/')
+        custom = pool.session('https://example.org/').get_adapter('https://example.org/')
+        assert default._pool_maxsize == 3
+        assert custom._pool_maxsize == 7
+
+    def test_response_cookies_not_kept(self):
+        pool = lib.SessionPool()
+        session = pool.session('https://example.com/')
+        assert session.cookies.get_policy().is_not_allowed('example.com')
+
+    def test_close(self):
+        pool = lib.SessionPool()
+        session = pool.session('https://example.com/')
+        pool.close()
+        assert pool.session('https://example.com/') is not session
+
+
+class TestRateLimiter(object):
+    """Test cases for the per-host token bucket rate limiter."""
+
+    @mock.patch('scraper.lib.time.monotonic', return_value=100.0)
+    def test_token_bucket_spaces_requests(self, mock_monotonic):
+        bucket = lib.TokenBucket(rate=2, burst=1)
+        bucket._full_at = 100.0
+        assert [bucket.reserve() for _ in range(3)] == [0.0, 0.5, 1.0]
+
+    @mock.patch('scraper.lib.time.monotonic', return_value=100.0)
+    def test_token_bucket_burst(self, mock_monotonic):
+        bucket = lib.TokenBucket(rate=5, burst=5)
+        bucket._full_at = 100.0
+        delays = [bucket.reserve() for _ in range(6)]
+        assert delays == pytest.approx([0.0] * 5 + [0.2])
+
+    @mock.patch('scraper.lib.time.monotonic', return_value=100.0)
+    def test_token_bucket_defer(self, mock_monotonic):
+        bucket = lib.TokenBucket(rate=2, burst=4)
+        bucket._full_at = 100.0
+        bucket.defer(30)
+        assert bucket.reserve() == pytest.approx(30)
+        assert bucket.reserve() == pytest.approx(30.5)
+
+    @mock.patch('scraper.lib.time.sleep')
+    def test_unlisted_host_not_limited(self, mock_sleep):
+        limiter = lib.RateLimiter({'ws.audioscrobbler.com': 1})
+        for _ in range(3):
+            limiter.wait('http://example.com/page')
+        mock_sleep.assert_not_called()
+
+    @mock.patch('scraper.lib.time.sleep')
+    def test_listed_host_waits(self, mock_sleep):
+        limiter = lib.RateLimiter({'ws.audioscrobbler.com': (1, 1)})
+        for _ in range(3):
+            limiter.wait('http://ws.audioscrobbler.com/2.0/?page=1')
+        assert mock_sleep.call_count == 2
+
+
+class TestBackoff(object):
+    """Test cases for retry delays."""
+
+    def test_backoff_delay_grows_and_is_capped(self):
+        for attempt, delay in [(0, 1), (1, 2), (3, 8), (10, 60)]:
+            for _ in range(20):
+                assert delay / 2 <= lib.backoff_delay(attempt, 1, 60) <= delay
+
+    def test_retry_after_seconds(self):
+        response = mock.Mock(headers={'Retry-After': '120'})
+        assert lib.retry_after(response) == 120
+
+    def test_retry_after_date(self):
+        when = datetime.now(pytz.utc) + timedelta(seconds=60)
+        response = mock.Mock(headers={'Retry-After': when.strftime('%a, %d %b %Y %H:%M:%S GMT')})
+        assert 55 < lib.retry_after(response) <= 60
+
+    def test_retry_after_missing(self):
+        assert lib.retry_after(None) is None
+        assert lib.retry_after(mock.Mock(headers={})) is None
+        assert lib.retry_after(mock.Mock(headers={'Retry-After': 'soon'})) is None
+
+
+class TestAsyncHttp(object):
+    """Test cases for the coroutine HTTP helpers."""
+
+    def test_host_slots_bound_concurrency(self):
+        import threading
+        import time as time_module
+        slots = lib.HostSlots(limit=2, host_limits={'example.org': 1})
+        running = {'example.com': 0, 'example.org': 0}
+        peak = dict(running)
+        lock = threading.Lock()
+
+        def fake_get(url, **kwargs):
+            host = url.split('/')[2]
+            with lock:
+                running[host] += 1
+                peak[host] = max(peak[host], running[host])
+            time_module.sleep(0.01)
+            with lock:
+                running[host] -= 1
+            return url
+
+        async def fetch_all():
+            import asyncio
+            urls = [f'http://{host}/{i}' for host in running for i in range(6)]
+            return await asyncio.gather(*[lib.async_http_get(url) for url in urls])
+
+        with mock.patch.object(lib, 'HOST_SLOTS', slots), \
+                mock.patch.object(lib, 'http_get', side_effect=fake_get):
+            responses = lib.run_sync(fetch_all())
+
+        assert responses == [f'http://{host}/{i}' for host in running for i in range(6)]
+        assert peak == {'example.com': 2, 'example.org': 1}
+
+    def test_run_sync_inside_running_loop(self):
+        import asyncio
+
+        async def answer():
+            return 42
+
+        async def outer():
+            return lib.run_sync(answer())
+
+        assert lib.run_sync(answer()) == 42
+        assert asyncio.run(outer()) == 42
+
+
 class TestHttpGet(object):
     """Test cases for http_get function."""
 
-    @mock.patch('scraper.lib.requests.get')
+    @mock.patch('scraper.lib.requests.Session.request')
     def test_http_get_success(self, mock_get):
         """Test successful HTTP GET request."""
         mock_response = mock.Mock()
@@ -162,7 +386,7 @@ class TestHttpGet(object):
         assert result.text == '<html>Test</html>'
         mock_get.assert_called_once()
 
-    @mock.patch('scraper.lib.requests.get')
+    @mock.patch('scraper.lib.requests.Session.request')
     @mock.patch('scraper.lib.time.sleep')
     def test_http_get_retry_on_failure(self, mock_sleep, mock_get):
         """Test HTTP GET retries on failure."""
@@ -183,7 +407,7 @@ class TestHttpGet(object):
         assert mock_get.call_count == 3
         assert mock_sleep.call_count == 2
 
-    @mock.patch('scraper.lib.requests.get')
+    @mock.patch('scraper.lib.requests.Session.request')
     @mock.patch('scraper.lib.time.sleep')
     def test_http_get_max_retries_reached(self, mock_sleep, mock_get):
         """Test HTTP GET when max retries is reached."""
@@ -192,7 +416,7 @@ class TestHttpGet(object):
         with pytest.raises(Exception):
             lib.http_get('http://example.com', retries=2)
 
-    @mock.patch('scraper.lib.requests.get')
+    @mock.patch('scraper.lib.requests.Session.request')
     def test_http_get_custom_user_agent(self, mock_get):
         """Test HTTP GET with custom user agent."""
         mock_response = mock.Mock()
@@ -205,7 +429,7 @@ class TestHttpGet(object):
         call_args = mock_get.call_args
         assert call_args[1]['headers']['User-Agent'] == custom_agent
 
-    @mock.patch('scraper.lib.requests.get')
+    @mock.patch('scraper.lib.requests.Session.request')
     def test_http_get_with_cookies(self, mock_get):
         """Test HTTP GET with cookies."""
         mock_response = mock.Mock()
@@ -222,7 +446,7 @@ class TestHttpGet(object):
 class TestHttpPost(object):
     """Test cases for http_post function."""
 
-    @mock.patch('scraper.lib.requests.post')
+    @mock.patch('scraper.lib.requests.Session.request')
     def test_http_post_success(self, mock_post):
         """Test successful HTTP POST request."""
         mock_response = mock.Mock()
@@ -235,7 +459,7 @@ class TestHttpPost(object):
         assert result.text == '{"result": "ok"}'
         mock_post.assert_called_once()
 
-    @mock.patch('scraper.lib.requests.post')
+    @mock.patch('scraper.lib.requests.Session.request')
     def test_http_post_with_user_agent(self, mock_post):
         """Test HTTP POST sets correct user agent."""
         mock_response = mock.Mock()
@@ -251,7 +475,69 @@ class TestHttpPost(object):
 class TestHttpReq(object):
     """Test cases for http_req function."""
 
-    @mock.patch('scraper.lib.requests.get')
+    @mock.patch('scraper.lib.requests.Session.request')
+    @mock.patch('scraper.lib.time.sleep')
+    def test_http_req_retry_keeps_request(self, mock_sleep, mock_request):
+        """Test retries repeat the method, data and cookies of the request."""
+        mock_response = mock.Mock()
+        mock_request.side_effect = [Exception('Connection reset'), mock_response]
+
+        result = lib.http_post('http://example.com', data={'key': 'value'},
+                               cookies={'session': 'test123'}, retries=3)
+
+        assert result is mock_response
+        for call in mock_request.call_args_list:
+            assert call[0][0] == 'post'
+            assert call[1]['data'] == {'key': 'value'}
+            assert call[1]['cookies'] == {'session': 'test123'}
+
+    @mock.patch('scraper.lib.requests.Session.request')
+    @mock.patch('scraper.lib.time.sleep')
+    def test_http_req_honours_retry_after(self, mock_sleep, mock_request):
+        """Test a Retry-After longer than the backoff is waited for."""
+        error = lib.requests.HTTPError('429 Too Many Requests')
+        error.response = mock.Mock(status_code=429, headers={'Retry-After': '30'})
+        mock_request.side_effect = [error, mock.Mock()]
+
+        lib.http_get('http://example.com', retries=3)
+
+        mock_sleep.assert_called_once_with(30.0)
+
+    @mock.patch('scraper.lib.requests.Session.request')
+    @mock.patch('scraper.lib.time.sleep')
+    def test_http_req_server_errors_retried(self, mock_sleep, mock_request):
+        """Test 5xx and 408 responses are retried."""
+        responses = []
+        for status in (503, 408, 200):
+            response = mock.Mock(status_code=status, headers={})
+            if status != 200:
+                response.raise_for_status.side_effect = lib.requests.HTTPError(
+                    str(status), response=response)
+            responses.append(response)
+        mock_request.side_effect = responses
+
+        result = lib.http_get('http://example.com', retries=3)
+
+        assert result is responses[-1]
+        assert mock_sleep.call_count == 2
+
+    @mock.patch('scraper.lib.requests.Session.request')
+    @mock.patch('scraper.lib.time.sleep')
+    def test_http_req_client_error_not_retried(self, mock_sleep, mock_request):
+        """Test a 404 response is returned at once."""
+        response = mock.Mock(status_code=404, headers={})
+        response.raise_for_status.side_effect = lib.requests.HTTPError('404', response=response)
+        mock_request.return_value = response
+
+        result = lib.http_get('http://example.com')
+
+        assert result is response
+        mock_request.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    """Test cases for http_req function."""
+
+    @mock.patch('scraper.lib.requests.Session.request')
     def test_http_req_get_method(self, mock_get):
         """Test http_req with get method."""
         mock_response = mock.Mock()
@@ -261,7 +547,7 @@ class TestHttpReq(object):
         lib.http_req('http://example.com', method='get')
         mock_get.assert_called_once()
 
-    @mock.patch('scraper.lib.requests.post')
+    @mock.patch('scraper.lib.requests.Session.request')
     def test_http_req_post_method(self, mock_post):
         """Test http_req with post method."""
         mock_response = mock.Mock()
@@ -270,8 +556,9 @@ class TestHttpReq(object):
         
         lib.http_req('http://example.com', method='post')
         mock_post.assert_called_once()
+        assert mock_post.call_args[0][:2] == ('post', 'http://example.com')
 
-    @mock.patch('scraper.lib.requests.get')
+    @mock.patch('scraper.lib.requests.Session.request')
     def test_http_req_zero_retries(self, mock_get):
         """Test http_req with no retries."""
         mock_response = mock.Mock()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for scraper.metrics.
+"""
+import json
+from datetime import date
+
+from scraper.metrics import ScrapeMetrics
+
+
+class TestScrapeMetrics(object):
+    """Test cases for ScrapeMetrics class."""
+
+    def test_writes_json_lines(self, tmp_path):
+        path = tmp_path / 'metrics.jsonl'
+        metrics = ScrapeMetrics(str(path))
+        metrics.record('Station', date(2020, 1, 1), http_seconds=1.5, plays_created=10)
+        metrics.record('Station', date(2020, 1, 2), ok=False)
+
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        assert len(records) == 2
+        assert records[0]['station'] == 'Station'
+        assert records[0]['date'] == '2020-01-01'
+        assert records[0]['http_seconds'] == 1.5
+        assert records[0]['plays_created'] == 10
+        assert records[0]['parse_seconds'] == 0
+        assert records[1]['ok'] is False
+
+    def test_prometheus_totals_per_station(self, tmp_path):
+        metrics = ScrapeMetrics()
+        metrics.record('Station', date(2020, 1, 1), plays_created=10, bytes_fetched=100)
+        metrics.record('Station', date(2020, 1, 2), plays_created=5, bytes_fetched=50)
+        metrics.record('Other "FM"', date(2020, 1, 1), ok=False)
+        metrics.set_gauge('song_cache_hit_ratio', 0.75, 'Song cache hit ratio.')
+        path = tmp_path / 'scrape.prom'
+        metrics.write_prometheus(str(path))
+
+        lines = path.read_text().splitlines()
+        assert '# TYPE radiostats_scrape_plays_created gauge' in lines
+        assert 'radiostats_scrape_plays_created{station="Station"} 15' in lines
+        assert 'radiostats_scrape_bytes_fetched{station="Station"} 150' in lines
+        assert 'radiostats_scrape_dates{station="Station"} 2' in lines
+        assert 'radiostats_scrape_failed_dates{station="Other \\"FM\\""} 1' in lines
+        assert 'radiostats_scrape_song_cache_hit_ratio 0.75' in lines
+        assert list(tmp_path.iterdir()) == [path]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for scraper.parsing.
+"""
+from datetime import date, datetime
+
+from scraper.parsing import ParserPool
+from scraper.scrapers import FluxFMScraper
+
+FLUXFM_PAGE = u"""
+<table id="songs">
+  <tr><td class="time"><div>12:05</div></td>
+      <td><span class="artist">Artist 1</span><span class="song">- Title 1</span></td></tr>
+  <tr><td class="time"><div>12:09</div></td>
+      <td><span class="artist">Artist 2</span><span class="song">- Title 2</span></td></tr>
+</table>
+"""
+
+
+class TestParserPool(object):
+    """Test cases for ParserPool class."""
+
+    def test_parses_in_worker_process(self):
+        scraper = FluxFMScraper(date(2020, 1, 1))
+        with ParserPool(1) as pool:
+            pool.parse(scraper, [('http://www.fluxfm.de/', FLUXFM_PAGE)])
+
+        expected = FluxFMScraper(date(2020, 1, 1))
+        expected.parse([('http://www.fluxfm.de/', FLUXFM_PAGE)])
+        assert scraper.tracks == expected.tracks
+        assert scraper.tracks[0] == ('Artist 1', 'Title 1', datetime(2020, 1, 1, 12, 5))
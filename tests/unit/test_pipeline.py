@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for scraper.pipeline.
+"""
+import pytest
+import random
+import threading
+import time
+
+from scraper.pipeline import ScrapePipeline
+
+
+def slow_fetch(date):
+    time.sleep(random.random() * 0.01)
+    return date * 10
+
+
+class TestScrapePipeline(object):
+    """Test cases for ScrapePipeline class."""
+
+    def test_yields_in_input_order(self):
+        pipeline = ScrapePipeline(slow_fetch, lambda item: item + 1,
+                                  fetch_workers=4, parse_workers=2, queue_size=2)
+        assert list(pipeline.run(range(30))) == [(i, i * 10 + 1) for i in range(30)]
+
+    def test_empty_input(self):
+        pipeline = ScrapePipeline(slow_fetch, lambda item: item)
+        assert list(pipeline.run([])) == []
+
+    def test_errors_are_raised_in_order(self):
+        def fetch(date):
+            if date == 3:
+                raise ValueError('boom')
+            return date
+
+        pipeline = ScrapePipeline(fetch, lambda item: item, fetch_workers=3)
+        results = pipeline.run(range(10))
+        assert [next(results) for _ in range(3)] == [(0, 0), (1, 1), (2, 2)]
+        with pytest.raises(ValueError):
+            next(results)
+
+    def test_stopping_early_bounds_work(self):
+        fetched = []
+        lock = threading.Lock()
+
+        def fetch(date):
+            with lock:
+                fetched.append(date)
+            return date
+
+        pipeline = ScrapePipeline(fetch, lambda item: item,
+                                  fetch_workers=2, parse_workers=1, queue_size=1)
+        for date, _ in pipeline.run(range(1000)):
+            if date == 5:
+                break
+        assert len(fetched) <= 6 + pipeline.window
+
+    def test_stats(self):
+        pipeline = ScrapePipeline(slow_fetch, lambda item: item,
+                                  fetch_workers=2, parse_workers=1, queue_size=3)
+        list(pipeline.run(range(10)))
+        stats = pipeline.stats()
+
+        assert stats['fetch']['queue']['items'] == 10
+        assert stats['parse']['queue']['items'] == 10
+        assert stats['fetch']['queue']['max_depth'] <= 3
+        assert stats['fetch']['busy'] > 0
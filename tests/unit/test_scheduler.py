@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for scraper.scheduler.
+"""
+import threading
+import time
+try:
+    from unittest import mock
+except ImportError:
+    # Python 2.7
+    import mock
+
+from scraper.scheduler import ScrapeScheduler, scraper_host
+from scraper.scrapers import FluxFMBerlinScraper, KEXPScraper, BBCRadio1Scraper
+
+
+def make_station(name, class_name='FluxFMScraper'):
+    station = mock.MagicMock()
+    station.name = name
+    station.class_name = class_name
+    return station
+
+
+class TrackingRunner(object):
+    """Fake runner which records how many runners are active at once"""
+    lock = threading.Lock()
+
+    def __init__(self, tracker, station):
+        self.tracker = tracker
+        self.station = station
+
+    def run(self):
+        with self.lock:
+            self.tracker['active'] += 1
+            self.tracker['max_active'] = max(self.tracker['max_active'], self.tracker['active'])
+        time.sleep(0.05)
+        with self.lock:
+            self.tracker['active'] -= 1
+        if self.station.name == 'broken':
+            raise ValueError('boom')
+
+
+class TestScraperHost(object):
+    """Test cases for scraper_host function."""
+
+    def test_host_from_base_url(self):
+        assert scraper_host(FluxFMBerlinScraper) == 'www.fluxfm.de'
+        assert scraper_host(KEXPScraper) == 'legacy-api.kexp.org'
+        assert scraper_host(BBCRadio1Scraper) == 'ws.audioscrobbler.com'
+
+    def test_host_fallback_to_class_name(self):
+        class NoURLScraper(object):
+            pass
+        assert scraper_host(NoURLScraper) == 'NoURLScraper'
+
+
+class TestScrapeScheduler(object):
+    """Test cases for ScrapeScheduler class."""
+
+    def run_stations(self, stations, **kwargs):
+        tracker = {'active': 0, 'max_active': 0}
+        scheduler = ScrapeScheduler(
+            lambda station: TrackingRunner(tracker, station), **kwargs)
+        with mock.patch('scraper.scheduler.close_old_connections'):
+            results = scheduler.run(stations)
+        return results, tracker
+
+    def test_runs_every_station(self):
+        stations = [make_station('s{0}'.format(i), 'KEXPScraper') for i in range(5)]
+        stations += [make_station('f{0}'.format(i)) for i in range(5)]
+        results, _ = self.run_stations(stations, concurrency=10, per_host=10)
+
+        assert sorted(r.station.name for r in results) == sorted(s.name for s in stations)
+        assert all(r.ok for r in results)
+
+    def test_global_concurrency_limit(self):
+        stations = [make_station('s{0}'.format(i), class_name) for i, class_name in
+                    enumerate(['KEXPScraper', 'FluxFMScraper', 'SWR1Scraper', 'BBCRadio1Scraper'])]
+        _, tracker = self.run_stations(stations, concurrency=2, per_host=5)
+        assert tracker['max_active'] == 2
+
+    def test_per_host_concurrency_limit(self):
+        stations = [make_station('s{0}'.format(i)) for i in range(4)]
+        _, tracker = self.run_stations(stations, concurrency=4, per_host=1)
+        assert tracker['max_active'] == 1
+
+    def test_failures_are_reported_per_station(self):
+        stations = [make_station('ok'), make_station('broken', 'KEXPScraper')]
+        completed = []
+        results, _ = self.run_stations(stations, on_complete=completed.append)
+
+        by_name = dict((r.station.name, r) for r in results)
+        assert by_name['ok'].ok
+        assert not by_name['broken'].ok
+        assert 'ValueError' in by_name['broken'].error
+        assert len(completed) == 2
@@ -78,7 +78,7 @@ class TestGenericScraper(object):
         assert result.hour == 16
         assert result.minute == 45
 
-    @mock.patch('scraper.scrapers.http_get')
+    @mock.patch('scraper.lib.http_get')
     def test_generic_scraper_scrape(self, mock_http_get):
         """Test GenericScraper.scrape method."""
         mock_response = mock.Mock()
@@ -99,7 +99,7 @@ class TestGenericScraper(object):
         assert len(scraper.tracks) == 1
         assert scraper.tracks[0] == ('Artist', 'Title', datetime(2020, 1, 1, 12, 0, 0))
 
-    @mock.patch('scraper.scrapers.http_get')
+    @mock.patch('scraper.lib.http_get')
     def test_generic_scraper_multiple_urls(self, mock_http_get):
         """Test GenericScraper with multiple URLs."""
         mock_response = mock.Mock()
@@ -121,7 +121,7 @@ class TestGenericScraper(object):
         
         assert mock_http_get.call_count == 3
 
-    @mock.patch('scraper.scrapers.http_get')
+    @mock.patch('scraper.lib.http_get')
     def test_generic_scraper_with_cookies(self, mock_http_get):
         """Test GenericScraper passes cookies to requests."""
         mock_response = mock.Mock()
@@ -170,9 +170,9 @@ class TestGenericLastFMScraper(object):
         # End time should be same date
         assert scraper.end.date() == test_date
 
-    @mock.patch('scraper.scrapers.requests.get')
-    @mock.patch('scraper.scrapers.settings')
-    @mock.patch('scraper.scrapers.time.sleep')
+    @mock.patch('scraper.scrapers.lastfm.http_get')
+    @mock.patch('scraper.scrapers.lastfm.settings')
+    @mock.patch('scraper.scrapers.lastfm.time.sleep')
     def test_lastfm_scraper_single_page(self, mock_sleep, mock_settings, mock_get):
         """Test LastFM scraper with single page of results."""
         mock_settings.LASTFM_API_KEY = 'test-api-key'
@@ -190,7 +190,7 @@ class TestGenericLastFMScraper(object):
         }
         
         mock_response = mock.Mock()
-        mock_response.json.return_value = track_data
+        mock_response.text = json.dumps(track_data)
         mock_get.return_value = mock_response
         
         class TestLastFMScraper(GenericLastFMScraper):
@@ -204,31 +204,59 @@ class TestGenericLastFMScraper(object):
         assert artist == 'The Beatles'
         assert title == 'Let It Be'
 
-    @mock.patch('scraper.scrapers.requests.get')
-    @mock.patch('scraper.scrapers.settings')
-    @mock.patch('scraper.scrapers.time.sleep')
+    @mock.patch('scraper.scrapers.lastfm.http_get')
+    @mock.patch('scraper.scrapers.lastfm.settings')
+    @mock.patch('scraper.scrapers.lastfm.time.sleep')
     def test_lastfm_scraper_multiple_pages(self, mock_sleep, mock_settings, mock_get):
-        """Test LastFM scraper with multiple pages."""
+        """Test LastFM scraper fetches exactly the pages given by totalPages."""
+        mock_settings.LASTFM_API_KEY = 'test-api-key'
+
+        def page(number):
+            return json.dumps({
+                'recenttracks': {
+                    'track': [
+                        {
+                            'artist': {'#text': 'Artist%s' % number},
+                            'name': 'Title%s' % number,
+                            'date': {'uts': str(1577836800 + number)}
+                        }
+                    ],
+                    '@attr': {'page': str(number), 'totalPages': '3'}
+                }
+            })
+
+        mock_get.side_effect = lambda url: mock.Mock(text=page(int(url.rsplit('=', 1)[1])))
+
+        class TestLastFMScraper(GenericLastFMScraper):
+            username = 'testuser'
+
+        scraper = TestLastFMScraper(date(2020, 1, 1))
+        scraper.scrape()
+
+        assert mock_get.call_count == 3
+        assert sorted(call[0][0][-6:] for call in mock_get.call_args_list) == [
+            'page=1', 'page=2', 'page=3']
+        assert [track[0] for track in scraper.tracks] == ['Artist1', 'Artist2', 'Artist3']
+        mock_sleep.assert_not_called()
+
+    @mock.patch('scraper.scrapers.lastfm.http_get')
+    @mock.patch('scraper.scrapers.lastfm.settings')
+    @mock.patch('scraper.scrapers.lastfm.time.sleep')
+    def test_lastfm_scraper_skip_now_playing(self, mock_sleep, mock_settings, mock_get):
+        """Test that currently playing tracks (without date) are skipped."""
         mock_settings.LASTFM_API_KEY = 'test-api-key'
         
-        page1_data = {
+        track_data = {
             'recenttracks': {
                 'track': [
                     {
-                        'artist': {'#text': 'Artist1'},
-                        'name': 'Title1',
-                        'date': {'uts': '1577836800'}
-                    }
-                ]
-            }
-        }
-        
-        page2_data = {
-            'recenttracks': {
-                'track': [
+                        'artist': {'#text': 'Current Artist'},
+                        'name': 'Now Playing',
+                        # No 'date' field for currently playing tracks
+                    },
                     {
-                        'artist': {'#text': 'Artist1'},
-                        'name': 'Title1',
+                        'artist': {'#text': 'Past Artist'},
+                        'name': 'Past Track',
                         'date': {'uts': '1577836800'}
                     }
                 ]
@@ -236,7 +264,7 @@ class TestGenericLastFMScraper(object):
         }
         
         mock_response = mock.Mock()
-        mock_response.json.side_effect = [page1_data, page2_data]
+        mock_response.text = json.dumps(track_data)
         mock_get.return_value = mock_response
         
         class TestLastFMScraper(GenericLastFMScraper):
@@ -245,43 +273,386 @@ class TestGenericLastFMScraper(object):
         scraper = TestLastFMScraper(date(2020, 1, 1))
         scraper.scrape()
         
-        # Should stop after second page (same track as first)
+        # Only the track with date should be included
         assert len(scraper.tracks) == 1
+        assert scraper.tracks[0][0] == 'Past Artist'
 
-    @mock.patch('scraper.scrapers.requests.get')
-    @mock.patch('scraper.scrapers.settings')
-    @mock.patch('scraper.scrapers.time.sleep')
-    def test_lastfm_scraper_skip_now_playing(self, mock_sleep, mock_settings, mock_get):
-        """Test that currently playing tracks (without date) are skipped."""
+    @mock.patch('scraper.scrapers.lastfm.http_get')
+    @mock.patch('scraper.scrapers.lastfm.settings')
+    @mock.patch('scraper.scrapers.lastfm.time.sleep')
+    def test_lastfm_scraper_retries_error_document(self, mock_sleep, mock_settings, mock_get):
+        """Test that a Last.fm error response is retried after a backoff."""
         mock_settings.LASTFM_API_KEY = 'test-api-key'
-        
+
         track_data = {
             'recenttracks': {
                 'track': [
                     {
-                        'artist': {'#text': 'Current Artist'},
-                        'name': 'Now Playing',
-                        # No 'date' field for currently playing tracks
-                    },
-                    {
-                        'artist': {'#text': 'Past Artist'},
-                        'name': 'Past Track',
+                        'artist': {'#text': 'Artist1'},
+                        'name': 'Title1',
                         'date': {'uts': '1577836800'}
                     }
                 ]
             }
         }
-        
+        error_data = {'error': 29, 'message': 'Rate Limit Exceeded'}
+
         mock_response = mock.Mock()
-        mock_response.json.return_value = track_data
+        type(mock_response).text = mock.PropertyMock(
+            side_effect=[json.dumps(error_data), json.dumps(track_data), json.dumps(track_data)])
         mock_get.return_value = mock_response
-        
+
         class TestLastFMScraper(GenericLastFMScraper):
             username = 'testuser'
-        
+
         scraper = TestLastFMScraper(date(2020, 1, 1))
         scraper.scrape()
-        
-        # Only the track with date should be included
+
         assert len(scraper.tracks) == 1
-        assert scraper.tracks[0][0] == 'Past Artist'
+        assert mock_sleep.call_count == 1
+
+
+class TestAsyncFetch(object):
+    """Test cases for the fetch()/fetch_async() pair."""
+
+    def test_scraper_base_needs_a_fetch(self):
+        with pytest.raises(NotImplementedError):
+            ScraperBase(date(2020, 1, 1)).fetch()
+
+    def test_sync_fetch_runs_in_fetch_async(self):
+        from scraper.lib import run_sync
+
+        class SyncScraper(ScraperBase):
+            def fetch(self):
+                return [('http://example.com', 'body')]
+
+        scraper = SyncScraper(date(2020, 1, 1))
+        assert run_sync(scraper.fetch_async()) == [('http://example.com', 'body')]
+
+    @mock.patch('scraper.lib.http_post')
+    def test_swr3_posts_every_hour(self, mock_http_post):
+        from scraper.scrapers import SWR3Scraper
+        mock_http_post.side_effect = lambda url, data, retries=None: mock.Mock(text=data['time'])
+
+        pages = SWR3Scraper(date(2020, 1, 1)).fetch()
+
+        assert mock_http_post.call_count == 24
+        assert [body for _, body in pages] == ['{0:02d}:00'.format(hour) for hour in range(24)]
+        assert pages[5][0] == 'https://www.swr3.de/playlisten/index.html?time=05%3A00&date=2020-01-01'
+
+    @mock.patch('scraper.lib.backoff_delay', return_value=0)
+    @mock.patch('scraper.lib.http_get')
+    def test_failed_hour_retried_on_its_own(self, mock_http_get, mock_delay):
+        """Test an hour failing is fetched again while the others are kept."""
+        import requests
+        from scraper.scrapers import SWR1Scraper
+        failures = [requests.ConnectionError('reset'), mock.Mock(
+            text='down', raise_for_status=mock.Mock(side_effect=requests.HTTPError('503')))]
+
+        def get(url, cookies=None, retries=None):
+            if 'swx_time=05' in url and failures:
+                failure = failures.pop(0)
+                if isinstance(failure, Exception):
+                    raise failure
+                return failure
+            return mock.Mock(text=url[-20:])
+        mock_http_get.side_effect = get
+
+        scraper = SWR1Scraper(date(2020, 1, 1))
+        pages = scraper.fetch()
+
+        assert mock_http_get.call_count == 26
+        assert [url for url, _ in pages] == scraper.tracklist_urls
+        assert all(url.endswith(body) for url, body in pages)
+
+    @mock.patch('scraper.lib.backoff_delay', return_value=0)
+    @mock.patch('scraper.lib.http_get')
+    def test_hour_failing_every_retry_keeps_the_day(self, mock_http_get, mock_delay):
+        """Test an hour which keeps failing is left out of the day's pages."""
+        import requests
+        from scraper.scrapers import Antenne1Scraper
+
+        def get(url, cookies=None, retries=None):
+            assert retries == 0
+            if 'playstunde=5&' in url:
+                raise requests.ConnectionError('reset')
+            return mock.Mock(text=url)
+        mock_http_get.side_effect = get
+
+        scraper = Antenne1Scraper(date(2020, 1, 1))
+        pages = scraper.fetch()
+
+        assert mock_http_get.call_count == 23 + 1 + Antenne1Scraper.page_retries
+        assert [url for url, _ in pages] == [
+            url for url in scraper.tracklist_urls if 'playstunde=5&' not in url]
+
+    @mock.patch('scraper.lib.backoff_delay', return_value=0)
+    @mock.patch('scraper.lib.http_get')
+    def test_missing_hour_not_retried(self, mock_http_get, mock_delay):
+        """Test an hour which isn't found is left out without retrying it."""
+        import requests
+        from scraper.scrapers import SWR1Scraper
+
+        def get(url, cookies=None, retries=None):
+            response = mock.Mock(text=url, status_code=200)
+            if 'swx_time=05' in url:
+                response.status_code = 404
+                response.raise_for_status.side_effect = requests.HTTPError(
+                    '404', response=response)
+            return response
+        mock_http_get.side_effect = get
+
+        pages = SWR1Scraper(date(2020, 1, 1)).fetch()
+
+        assert mock_http_get.call_count == 24
+        assert len(pages) == 23
+
+    @mock.patch('scraper.lib.http_get')
+    def test_unexpected_error_fails_the_day(self, mock_http_get):
+        """Test an error other than a failed request isn't taken for a missing hour."""
+        from scraper.scrapers import SWR1Scraper
+
+        def get(url, cookies=None, retries=None):
+            if 'swx_time=05' in url:
+                raise TypeError('bug')
+            return mock.Mock(text=url)
+        mock_http_get.side_effect = get
+
+        with pytest.raises(TypeError):
+            SWR1Scraper(date(2020, 1, 1)).fetch()
+        assert mock_http_get.call_count == 24
+
+    @mock.patch('scraper.lib.backoff_delay', return_value=0)
+    @mock.patch('scraper.lib.http_get')
+    def test_every_hour_failing_fails_the_day(self, mock_http_get, mock_delay):
+        import requests
+        from scraper.scrapers import SWR1Scraper
+        mock_http_get.side_effect = requests.ConnectionError('down')
+
+        with pytest.raises(requests.ConnectionError):
+            SWR1Scraper(date(2020, 1, 1)).fetch()
+
+    @mock.patch('scraper.lib.http_get')
+    def test_concurrency_per_station(self, mock_http_get):
+        import threading
+        import time
+        from scraper.scrapers import SWR1Scraper
+        lock = threading.Lock()
+        in_flight = []
+        counts = [0]
+
+        def get(url, cookies=None, retries=None):
+            with lock:
+                counts[0] += 1
+                in_flight.append(counts[0])
+            time.sleep(0.01)
+            with lock:
+                counts[0] -= 1
+            return mock.Mock(text='')
+        mock_http_get.side_effect = get
+
+        class SlowStation(SWR1Scraper):
+            concurrency = 2
+
+        SlowStation(date(2020, 1, 1)).fetch()
+        assert max(in_flight) <= 2
+
+    @staticmethod
+    def sunshine_page(day, first, count=25):
+        """A SunshineLive playlist page of count entries, starting with the
+        first-th entry of day at 00:00 and three minutes apart"""
+        entries = []
+        for i in range(first, first + count):
+            minutes = i * 3
+            entry_day = day if minutes < 24 * 60 else '16.01.2020'
+            entries.append(
+                '<article><div class="date">{0}</div><div class="time">{1:02}:{2:02} UHR</div>'
+                '<h4>Titel:Song {3}</h4><h5>Artist:Artist</h5></article>'.format(
+                    entry_day, minutes // 60 % 24, minutes % 60, i))
+        return '<html>{0}</html>'.format(''.join(entries))
+
+    @mock.patch('scraper.lib.http_get')
+    def test_sunshine_live_fetches_windows_of_pages(self, mock_http_get):
+        """Test pages are fetched a window at a time until the day ends."""
+        from scraper.scrapers import SunshineLiveScraper
+        # 480 entries on 15.01.2020, i.e. pages 0-19, page 20 is all 16.01.
+        mock_http_get.side_effect = lambda url, cookies=None, retries=None: mock.Mock(
+            text=self.sunshine_page('15.01.2020', int(url.split('zcmlimitstart=')[1].split('&')[0])))
+
+        scraper = SunshineLiveScraper(date(2020, 1, 15))
+        # Fetching finds the end of the day without parsing the pages
+        with mock.patch.object(SunshineLiveScraper, 'make_soup', side_effect=AssertionError):
+            pages = scraper.fetch()
+        scraper.parse(pages)
+
+        assert mock_http_get.call_count == 24  # three windows of 8
+        assert len(pages) == 20
+        assert len(scraper.tracks) == 480
+        assert scraper.tracks[0] == ('Artist', 'Song 0', datetime(2020, 1, 15, 0, 0))
+
+    @mock.patch('scraper.lib.http_get')
+    def test_sunshine_live_dedupes_overlapping_pages(self, mock_http_get):
+        """Test entries on two pages are kept once and a repeated page ends the day."""
+        from scraper.scrapers import SunshineLiveScraper
+        bodies = {0: self.sunshine_page('15.01.2020', 0), 1: self.sunshine_page('15.01.2020', 20)}
+
+        def get(url, cookies=None, retries=None):
+            page = int(url.split('zcmlimitstart=')[1].split('&')[0]) // 25
+            # The site ignoring the offset from the third page on
+            return mock.Mock(text=bodies.get(page, bodies[1]))
+        mock_http_get.side_effect = get
+
+        scraper = SunshineLiveScraper(date(2020, 1, 15))
+        scraper.scrape()
+
+        assert mock_http_get.call_count == SunshineLiveScraper.page_window
+        assert [track[1] for track in scraper.tracks] == ['Song %s' % i for i in range(45)]
+
+    @mock.patch('scraper.scrapers.lastfm.http_get')
+    @mock.patch('scraper.scrapers.lastfm.settings')
+    def test_lastfm_fetch_window(self, mock_settings, mock_get):
+        """Test a window of dates is fetched at once and split by date."""
+        mock_settings.LASTFM_API_KEY = 'test-api-key'
+        day = 24 * 3600
+        track_data = {
+            'recenttracks': {
+                'track': [
+                    {'artist': {'#text': 'Artist%s' % i}, 'name': 'Title',
+                     'date': {'uts': str(1577880000 + i * day)}}  # 12:00 UTC
+                    for i in range(3)
+                ],
+                '@attr': {'page': '1', 'totalPages': '1'}
+            }
+        }
+        mock_get.return_value = mock.Mock(text=json.dumps(track_data))
+
+        class TestLastFMScraper(GenericLastFMScraper):
+            username = 'testuser'
+
+        dates = (date(2020, 1, 3), date(2020, 1, 2), date(2020, 1, 1))
+        pages = TestLastFMScraper.fetch_window(dates)
+
+        url = mock_get.call_args[0][0]
+        assert 'from=1577836800' in url and 'to=1578095999' in url
+        assert sorted(pages) == sorted(dates)
+        for i, scrape_date in enumerate(reversed(dates)):
+            # Each date's pages only hold its own tracks
+            assert len(json.loads(pages[scrape_date][0][1])['recenttracks']['track']) == 1
+            scraper = TestLastFMScraper(scrape_date)
+            scraper.parse(pages[scrape_date])
+            assert [track[0] for track in scraper.tracks] == ['Artist%s' % i]
+
+
+class TestKEXPScraper(object):
+    """Test cases for KEXPScraper class."""
+
+    def test_parse_media_plays(self):
+        from scraper.scrapers import KEXPScraper
+        body = json.dumps({'next': None, 'results': [
+            {'playtype': {'name': 'Media play'}, 'epoch_airdate': 1577922912000,
+             'artist': {'name': 'Sharon Van Etten'}, 'track': {'name': 'Seventeen'}},
+            {'playtype': {'name': 'Air break'}, 'epoch_airdate': 1577922700000,
+             'artist': None, 'track': None},
+        ]})
+        scraper = KEXPScraper(date(2020, 1, 1))
+        scraper.parse([(scraper.url, body)])
+        assert [track[:2] for track in scraper.tracks] == [('Sharon Van Etten', 'Seventeen')]
+
+    def test_parse_without_results(self):
+        from scraper.scrapers import KEXPScraper
+        scraper = KEXPScraper(date(2020, 1, 1))
+        scraper.parse([(scraper.url, '{"detail": "Not found."}')])
+        assert scraper.tracks == []
+
+
+class TestHtmlParsing(object):
+    """Test cases for the scrapers' parser backends and SoupStrainers."""
+
+    def test_css_class_matches_whole_class_names(self):
+        from scraper.scrapers import css_class
+        pattern = css_class('track')
+        assert pattern.search('track')
+        assert pattern.search('playlist track current')
+        assert not pattern.search('tracks')
+
+    def test_make_soup_keeps_only_strained_elements(self):
+        from scraper.scrapers import SWR1Scraper
+        scraper = SWR1Scraper(date(2020, 1, 1))
+        soup = scraper.make_soup(
+            '<html><nav><div class="teaser">Nav</div></nav>'
+            '<div class="list-playlist-item current"><time datetime="2020-01-01T07:04">07:04</time>'
+            '<dl><dd class="playlist-item-song">Dreams</dd>'
+            '<dd class="playlist-item-artist">Fleetwood Mac</dd></dl></div></html>')
+        assert soup.find('nav') is None
+        assert len(soup.findAll('div', {'class': 'list-playlist-item'})) == 1
+
+    def test_antenne1_parse(self):
+        from scraper.scrapers import Antenne1Scraper
+        html = ('<div class="playlist-head"><h2>Playlist</h2></div>'
+                '<div class="track current"><p class="playtime">07:04 Uhr</p>'
+                '<p class="artist">Nena</p><p class="title">99 Luftballons</p></div>')
+        scraper = Antenne1Scraper(date(2020, 1, 1))
+        scraper.parse([('http://www.antenne1.de/', json.dumps(html))])
+        assert scraper.tracks == [('Nena', '99 Luftballons', datetime(2020, 1, 1, 7, 4))]
+
+    def test_sunshine_live_page_tracks(self):
+        from scraper.scrapers import SunshineLiveScraper
+        body = ('<html><section class="teaser"><div class="date">01.01.2020</div></section>'
+                '<article><div class="date">01.01.2020</div><div class="time">07:04 UHR</div>'
+                '<h4>Titel:Sky and Sand</h4><h5>Artist:Paul Kalkbrenner</h5></article>'
+                '<article><div class="date">01.01.2020</div><div class="time">07:08 UHR</div>'
+                '<h4>Titel:Electronic Music Radio</h4><h5>Artist:Sunshine Live</h5></article>'
+                '<article><div class="date">02.01.2020</div><div class="time">00:01 UHR</div>'
+                '<h4>Titel:Porcelain</h4><h5>Artist:Moby</h5></article></html>')
+        scraper = SunshineLiveScraper(date(2020, 1, 1))
+        assert scraper.page_tracks(body) == [
+            ('Paul Kalkbrenner', 'Sky and Sand', datetime(2020, 1, 1, 7, 4))]
+
+    def test_fluxfm_skips_rows_without_a_track(self):
+        from scraper.scrapers import FluxFMScraper
+        body = ('<table id="songs"><tr><th>Zeit</th><th>Titel</th></tr>'
+                '<tr><td class="time"><div>07:04</div></td><td><span class="artist">Phoenix</span>'
+                ' <span class="song">- 1901</span></td></tr></table>')
+        scraper = FluxFMScraper(date(2020, 1, 1))
+        scraper.parse([('http://www.fluxfm.de/', body)])
+        assert scraper.tracks == [('Phoenix', '1901', datetime(2020, 1, 1, 7, 4))]
+
+    def test_tracklist_urls_from_base_url(self):
+        from scraper.scrapers import Antenne1Scraper, FluxFMScraper
+        assert FluxFMScraper(date(2020, 1, 5)).tracklist_urls == [
+            'http://www.fluxfm.de/fluxfm-playlist/?date=2020-01-05']
+        urls = Antenne1Scraper(date(2020, 1, 5)).tracklist_urls
+        assert len(urls) == 24
+        assert urls[7].endswith('playstunde=7&playdatum=05.01.2020')
+
+
+class TestRegistry(object):
+    """Test cases for the scraper registry of scraper.scrapers."""
+
+    def test_every_scraper_resolves(self):
+        from scraper import scrapers
+        for class_name, module in scrapers.SCRAPERS.items():
+            scraper_cls = scrapers.get_scraper(class_name)
+            assert scraper_cls.__name__ == class_name
+            assert scraper_cls.__module__ == 'scraper.scrapers.' + module
+            assert issubclass(scraper_cls, ScraperBase)
+
+    def test_unknown_scraper(self):
+        from scraper import scrapers
+        with pytest.raises(LookupError):
+            scrapers.get_scraper('GoneScraper')
+        with pytest.raises(AttributeError):
+            scrapers.GoneScraper
+        station = mock.Mock(class_name='GoneScraper')
+        assert [s for s, _ in scrapers.unresolved([station])] == [station]
+
+    def test_modules_imported_when_used(self):
+        """Test looking up a JSON API scraper doesn't import the HTML parsers."""
+        import subprocess
+        import sys
+        code = ('import sys; from scraper import scrapers; '
+                'scrapers.get_scraper("KEXPScraper"); '
+                'print("bs4" in sys.modules, "scraper.scrapers.swr" in sys.modules)')
+        output = subprocess.run([sys.executable, '-c', code], check=True,
+                                capture_output=True, text=True).stdout
+        assert output.split() == ['False', 'False']
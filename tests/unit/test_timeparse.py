@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Unit tests for scraper.timeparse.
+"""
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from scraper.timeparse import parse_clock, parse_datetime, timestamp_parser
+
+DAY = date(2020, 1, 15)
+
+
+class TestParseDatetime(object):
+
+    def test_iso(self):
+        assert parse_datetime('2020-01-15T07:04') == datetime(2020, 1, 15, 7, 4)
+        assert parse_datetime('2020-01-15 07:04:30') == datetime(2020, 1, 15, 7, 4, 30)
+        assert parse_datetime('2020-01-15T07:04:00+01:00') == datetime(
+            2020, 1, 15, 7, 4, tzinfo=timezone(timedelta(hours=1)))
+
+    def test_falls_back_to_dateutil(self):
+        assert parse_datetime('15 Jan 2020 07:04') == datetime(2020, 1, 15, 7, 4)
+
+    def test_unparseable(self):
+        with pytest.raises(ValueError):
+            parse_datetime('soon')
+
+
+class TestParseClock(object):
+
+    def test_clock_times(self):
+        assert parse_clock('07:04', DAY) == datetime(2020, 1, 15, 7, 4)
+        assert parse_clock(' 7:04:30 ', DAY) == datetime(2020, 1, 15, 7, 4, 30)
+        assert parse_clock('16-45', DAY, '-') == datetime(2020, 1, 15, 16, 45)
+
+    def test_falls_back_to_dateutil(self):
+        assert parse_clock('7:04 pm', DAY) == datetime(2020, 1, 15, 19, 4)
+
+    def test_out_of_range(self):
+        with pytest.raises(ValueError):
+            parse_clock('25:00', DAY)
+
+
+class TestTimestampParser(object):
+
+    @pytest.mark.parametrize('format, text, expected', [
+        (None, '2020-01-14T23:58', datetime(2020, 1, 14, 23, 58)),
+        ('%H:%M', '07:04', datetime(2020, 1, 15, 7, 4)),
+        ('%Y-%m-%dT%H:%M', '2020-01-14T23:58', datetime(2020, 1, 14, 23, 58)),
+        ('%d.%m.%Y %H:%M', '14.01.2020 23:58', datetime(2020, 1, 14, 23, 58)),
+        ('%I:%M %p', '07:04 PM', datetime(2020, 1, 15, 19, 4)),
+    ])
+    def test_formats(self, format, text, expected):
+        assert timestamp_parser(format)(text, DAY) == expected
+
+    def test_iso_format_mismatch(self):
+        with pytest.raises(ValueError):
+            timestamp_parser('%Y-%m-%dT%H:%M')('14.01.2020 23:58', DAY)